@@ -5,6 +5,7 @@ from tqdm import tqdm
 import numpy as np
 import renom as rm
 from renom.utility.reinforcement.replaybuffer import ReplayBuffer
+from renom.utility.ema import ParameterEMA
 
 
 class DDPG(object):
@@ -18,6 +19,9 @@ class DDPG(object):
         self._critic = critic
         self._target_actor = copy.deepcopy(actor)
         self._target_critic = copy.deepcopy(critic)
+        # Target networks hold moving averages of the parameters of the networks.
+        self._target_actor_ema = ParameterEMA(actor, 1 - momentm, target=self._target_actor)
+        self._target_critic_ema = ParameterEMA(critic, 1 - momentm, target=self._target_critic)
 
         self._action_size = list(action_size)
         self._state_size = list(state_size)
@@ -33,18 +37,8 @@ class DDPG(object):
         return np.argmax(self._actor(s).as_ndarray(), axis=1)
 
     def update(self):
-        # Check GPU data
-        for ac, target_ac in zip(self._actor.iter_models(), self._target_actor.iter_models()):
-            if hasattr(ac, "params") and hasattr(target_ac, "params"):
-                for k in ac.params.keys():
-                    ac.params[k] = (1 - self._momentum) * ac.params[k] + \
-                        self._momentum * target_ac.params[k]
-
-        for cr, target_cr in zip(self._critic.iter_models(), self._target_critic.iter_models()):
-            if hasattr(cr, "params") and hasattr(target_cr, "params"):
-                for k in cr.params.keys():
-                    cr.params[k] = (1 - self._momentum) * cr.params[k] + \
-                        self._momentum * target_cr.params[k]
+        self._target_actor_ema.update()
+        self._target_critic_ema.update()
 
     def train(self, env, loss_func=rm.ClippedMeanSquaredError(), optimizer_critic=rm.Adam(lr=0.0001),
               optimizer_actor=rm.Adam(lr=0.0001),
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, division
 import collections
+import itertools
 import weakref
 import numpy as np
 from numbers import Number
@@ -12,6 +13,11 @@ if renom.cuda.has_cuda():
     from renom.cuda.gpuvalue.gpuvalue import GPUValue
 
 
+# Versions of nodes are drawn from a single counter, so a pair of the id and
+# the version of a node identifies its contents.
+_versions = itertools.count(1)
+
+
 class GraphAttrs(object):
 
     def __init__(self):
@@ -57,6 +63,8 @@ class Node(np.ndarray):
     _auto_update = False
     _no_backward = False
     _args = ()
+    _version = 0
+    _synced_version = None
 
     SHOWMARK = False
 
@@ -207,9 +215,13 @@ class Node(np.ndarray):
         else:
             return np.ndarray.copy(self)
 
+    def _increment_version(self):
+        self._version = next(_versions)
+
     def copy_from(self, other):
         assert self.shape == other.shape
         assert self.dtype == other.dtype
+        self._increment_version()
         if self._gpu:
             if other._gpu:
                 self._gpu.copy_from(other._gpu)
@@ -236,7 +248,6 @@ class Node(np.ndarray):
             if not self.flags['C_CONTIGUOUS']:
                 self = np.ascontiguousarray(self)
             ret = np.ndarray(shape=self.shape, dtype=self.dtype, buffer=self)
-            ret.setflags(write=True)
             return np.array(ret)
 
     def release_gpu(self):
@@ -605,11 +616,14 @@ class Variable(Node):
     '''
 
     weight_decay = None
+    _prune_mask = None
+    _prune_mask_gpu = None
 
     def __new__(cls, value, auto_update=True, weight_decay=None):
         ret = super(Variable, cls).__new__(cls, value)
         ret._auto_update = auto_update
         ret.weight_decay = weight_decay
+        ret._increment_version()
         return ret
 
     def backward(self, context, dy, **kwargs):
@@ -112,11 +112,25 @@ def broad_cast(hs, dy):
                 if s == 1:
                     axis.append(i)
             if axis:
-                dy = np.sum(dy, axis=tuple(axis))
+                dy = _sum_broadcast(dy, axis)
         dy = dy.reshape(hs.shape)
     return dy
 
 
+def _sum_broadcast(dy, axis):
+    # Summing along an axis whose stride is 0 is a multiplication,
+    # so lazily broadcast gradients are reduced without reading every element.
+    dy = to_value(dy)
+    lazy = [ax for ax in axis if dy.strides[ax] == 0]
+    if lazy:
+        index = tuple(slice(0, 1) if ax in lazy else slice(None) for ax in range(dy.ndim))
+        dy = dy[index] * np.prod([dy.shape[ax] for ax in lazy], dtype=dy.dtype)
+    axis = [ax for ax in axis if ax not in lazy]
+    if axis:
+        dy = np.sum(dy, axis=tuple(axis), keepdims=True)
+    return dy
+
+
 def cu_broad_cast(hs, dy):
     if isinstance(hs, GPUValue):
         shape = list(hs.shape)
@@ -625,6 +639,58 @@ class ROr(Lshift):
         return cls._oper_cpu(lhs, rhs)
 
 
+class SlicedGrad(object):
+    '''Gradient of a sliced array which is not expanded to the shape of its source.
+
+    :class:`Grads` accumulates it into a single buffer of each source node,
+    so slicing an array many times doesn't allocate a zero array for each slice.
+
+    Args:
+        shape (tuple): Shape of the source array.
+        dtype (dtype): Data type of the source array.
+        index (object): Index used for slicing.
+        value (ndarray): Gradient of the sliced array.
+        advanced (bool): True if the index is an advanced index which may contain duplicates.
+    '''
+
+    def __init__(self, shape, dtype, index, value, advanced):
+        self.shape = shape
+        self.dtype = dtype
+        self.index = index
+        self.value = value
+        self.advanced = advanced
+
+    def scatter_add(self, buf):
+        '''Adds the gradient to the buffer which has the shape of the source array.'''
+        buf = np.asarray(buf)
+        if not self.advanced:
+            buf[self.index] += self.value
+            return buf
+
+        index = self.index if isinstance(self.index, tuple) else (self.index, )
+        index = [np.asarray(i) for i in index]
+        if not buf.flags.c_contiguous or \
+                not all(i.dtype.kind in "iu" for i in index) or len(index) > buf.ndim:
+            np.add.at(buf, self.index, self.value)
+            return buf
+
+        # Rows of the leading axes are summed up by sorting instead of np.add.at.
+        leading = buf.shape[:len(index)]
+        rows = np.ravel_multi_index(np.broadcast_arrays(*index), leading, mode="wrap").ravel()
+        if rows.size:
+            value = np.asarray(self.value).reshape(rows.size, -1)
+            order = np.argsort(rows, kind="mergesort")
+            rows = rows[order]
+            starts = np.flatnonzero(np.concatenate([[True], rows[1:] != rows[:-1]]))
+            flat = buf.reshape(int(np.prod(leading)), -1)
+            flat[rows[starts]] += np.add.reduceat(value[order], starts, axis=0)
+        return buf
+
+    def to_dense(self):
+        '''Returns the gradient as an array which has the shape of the source array.'''
+        return self.scatter_add(np.zeros(self.shape, dtype=self.dtype))
+
+
 class GetItem(BinOp):
     @classmethod
     def _oper_cpu(cls, lhs, rhs):
@@ -634,16 +700,19 @@ class GetItem(BinOp):
     def _oper_gpu(cls, lhs, rhs):
         return get_gpu(lhs)[rhs]
 
+    def _sliced_grad(self, dy):
+        lhs = self.attrs._lhs
+        return SlicedGrad(lhs.shape, lhs.dtype, self.attrs._rhs, to_value(dy),
+                          self._is_advanced_indexing(lhs, self.attrs._rhs))
+
     def _backward_cpu(self, context, dy, **kwargs):
         if isinstance(self.attrs._lhs, Node):
-            zero = np.zeros_like(to_value(self.attrs._lhs))
-            np.add.at(zero, self.attrs._rhs, to_value(dy))
-            self.attrs._lhs._update_diff(context, zero, **kwargs)
+            self.attrs._lhs._update_diff(context, self._sliced_grad(dy), **kwargs)
 
     def _backward_gpu(self, context, dy, **kwargs):
         if isinstance(self.attrs._lhs, Node):
             if self._is_advanced_indexing(self.attrs._lhs, self.attrs._rhs):
-                self._backward_cpu(context, to_value(dy), **kwargs)
+                self.attrs._lhs._update_diff(context, self._sliced_grad(dy).to_dense(), **kwargs)
             else:
                 zero = get_gpu(self.attrs._lhs).zeros_like_me()
                 zero[self.attrs._rhs] = dy
@@ -656,7 +725,7 @@ class GetItem(BinOp):
             if all([isinstance(o, (int, slice, type(None), type(Ellipsis))) for o in index]):
                 return False
         elif isinstance(index, np.ndarray):
-            if index.dtype == np.bool:
+            if index.dtype == np.bool_:
                 return False
         return True
 
@@ -1,13 +1,17 @@
 import contextlib
 from renom import precision
 import collections
-from renom.core import Node, Variable
+from renom.core import Node, Variable, SlicedGrad, to_value
 from renom.cuda import is_cuda_active, has_cuda
 if has_cuda():
     from renom.cuda.gpuvalue import GPUValue, get_gpu
 import numpy as np
 
 
+def _is_broadcast(array):
+    return isinstance(array, np.ndarray) and array.size > 1 and 0 in array.strides
+
+
 class Grads:
     '''Grads class. This class contains gradients of each Node object.
 
@@ -37,6 +41,8 @@ class Grads:
         self.variables = {}
         self._auto_updates = []
         self._weight_decay = weight_decay
+        # Ids of gradients which are allocated by this object and can be updated in place.
+        self._owned = set()
 
         if root is not None:
             self._build_refcounts(root)
@@ -65,6 +71,7 @@ class Grads:
             wd = node.weight_decay or self._weight_decay
             if wd is not None and wd != 0:
                 self.variables[id(node)] = wd * node
+                self._owned.add(id(node))
 
     @contextlib.contextmanager
     def unlock_node(self, node):
@@ -85,12 +92,18 @@ class Grads:
 
     def add(self, node, dy, caller=None):
         selfid = id(node)
-        if selfid in self.variables:
+        if isinstance(dy, SlicedGrad):
+            self._add_sliced(node, dy)
+        elif selfid in self.variables:
             v = self.variables[selfid]
             with self.unlock_node(v):
                 if has_cuda() and isinstance(dy, GPUValue):
                     diff = v.get_gpu() + dy
                     v.set_gpu(diff)
+                elif _is_broadcast(v):
+                    # A broadcast view is read only, so the sum is stored in a new buffer.
+                    self.variables[selfid] = np.add(v, to_value(dy))
+                    self._owned.add(selfid)
                 else:
                     v[...] += dy
         else:
@@ -104,6 +117,23 @@ class Grads:
 
         return self._refcounts[selfid] <= self._backwards[selfid]
 
+    def _add_sliced(self, node, dy):
+        # Gradients of slices are accumulated into one buffer per node.
+        selfid = id(node)
+        if selfid in self.variables:
+            v = self.variables[selfid]
+            if selfid not in self._owned:
+                v = np.array(to_value(v))
+                self.variables[selfid] = v
+                self._owned.add(selfid)
+            with self.unlock_node(v):
+                dy.scatter_add(v)
+        else:
+            self.variables[selfid] = dy.to_dense()
+            self._owned.add(selfid)
+            if node._auto_update:
+                self._auto_updates.append(node)
+
     _omit = object()
 
     def get(self, node, default=_omit):
@@ -130,6 +160,7 @@ class Grads:
 
     def set(self, node, diff):
         self.variables[id(node)] = diff
+        self._owned.discard(id(node))
 
     def update_node(self, node, opt=None):
         import time
@@ -147,8 +178,24 @@ class Grads:
                         ngpu -= get_gpu(dy)
                     else:
                         node[...] -= dy
+                if node._prune_mask is not None:
+                    self._apply_prune_mask(node)
+                node._increment_version()
             node.detach_graph()
 
+    @staticmethod
+    def _apply_prune_mask(node):
+        # Pruned weights are kept 0. The mask is copied to the device once.
+        mask = node._prune_mask
+        if is_cuda_active():
+            cached = node._prune_mask_gpu
+            if cached is None or cached[0] is not mask:
+                cached = node._prune_mask_gpu = (mask, get_gpu(mask))
+            ngpu = get_gpu(node)
+            ngpu *= cached[1]
+        else:
+            node[...] *= mask
+
     def update(self, opt=None, models=()):
         '''This function updates variable objects on the computational graph
         using obtained gradients.
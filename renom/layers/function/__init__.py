@@ -5,7 +5,7 @@ from .convnd import ConvNd, Conv3d
 from .batch_normalize import BatchNormalize
 from .layer_normalize import LayerNormalize
 from .weight_normalize import WeightNormalize
-from .peephole_lstm import PeepholeLstm
+from .peephole_lstm import PeepholeLstm, FusedPeepholeLstm
 from .pool2d import MaxPool2d, max_pool2d, AveragePool2d, average_pool2d
 from .poolnd import MaxPoolNd, max_poolnd, AveragePoolNd, average_poolnd
 from .dropout import Dropout, SpatialDropout, dropout, spatial_dropout
@@ -14,9 +14,16 @@ from .deconvnd import DeconvNd
 from .flatten import Flatten, flatten
 from .lrn import Lrn
 from .unpool2d import MaxUnPool2d, max_unpool2d
-from .lstm import Lstm as Lstm, ChainedLSTM
-from .gru import Gru as Gru
+from .lstm import Lstm as Lstm, ChainedLSTM, FusedLstm
+from .gru import Gru as Gru, FusedGru
+from .packed_sequence import PackedSequence, pack_sequence, pack_padded, pad_packed, sequence_mask
 from .embedding import embedding, Embedding
-from .roi_pool2d import roi_pool2d, RoiPool2d
+from .roi_pool2d import roi_pool2d, RoiPool2d, roi_align2d, RoiAlign2d
 from .l2_norm import l2_norm, L2Norm
 from .group_conv2d import GroupConv2d
+from .attention import attention, MultiHeadAttention
+from .ensemble import batched_dot, Ensemble
+from .inference import optimize_for_inference
+from .freeze import freeze, FrozenModel
+from .quantization import QuantizedDense, QuantizedConv2d, quantize, quantization_report
+from .pruning import prune, remove_pruning, sparsify, SparseDense
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import numpy as np
+from renom.core import Node, Variable, to_value
+from renom import precision
+from renom.operation import dot
+from .parameterized import Parametrized
+from renom.utility.initializer import GlorotNormal
+import renom.cuda as cu
+if cu.has_cuda():
+    from renom.cuda.gpuvalue import get_gpu
+
+
+def _heads_first(a):
+    # (N, T, H, D) -> (N, H, T, D)
+    return np.ascontiguousarray(to_value(a).transpose(0, 2, 1, 3), dtype=precision)
+
+
+def _causal_mask(q_start, q_stop, k_start, k_stop):
+    # True where the key comes after the query.
+    return np.arange(q_start, q_stop)[:, None] < np.arange(k_start, k_stop)[None, :]
+
+
+def _key_chunks(q_start, q_stop, Tk, chunk_size, causal):
+    stop = min(Tk, q_stop) if causal else Tk
+    for k_start in range(0, stop, chunk_size):
+        k_stop = min(k_start + chunk_size, stop)
+        mask = _causal_mask(q_start, q_stop, k_start, k_stop) if causal and k_stop > q_start + 1 else None
+        yield k_start, k_stop, mask
+
+
+class attention(Node):
+    """Scaled dot product attention computed in chunks of keys with the online softmax.
+
+    The scores of a chunk of queries against a chunk of keys are the only
+    (chunk_size, chunk_size) temporary. The running maximum and sum of the
+    softmax are carried across the key chunks, and only their log-sum-exp is
+    kept for backward, where the scores are computed again chunk by chunk.
+    """
+
+    def __new__(cls, q, k, v, causal=False, chunk_size=128):
+        assert len(q.shape) == 4 and q.shape[0] == k.shape[0] and q.shape[2:] == k.shape[2:] \
+            and k.shape[:3] == v.shape[:3], \
+            "Shapes of query {}, key {} and value {} must be (N, T, H, D).".format(q.shape, k.shape, v.shape)
+        assert not causal or q.shape[1] == k.shape[1], \
+            "Causal attention needs the same length of query and key."
+        return cls.calc_value(q, k, v, causal, chunk_size)
+
+    @classmethod
+    def _forward(cls, q, k, v, causal, chunk_size):
+        Q, K, V = _heads_first(q), _heads_first(k), _heads_first(v)
+        N, H, Tq, D = Q.shape
+        Tk = K.shape[2]
+        scale = 1 / np.sqrt(D)
+        out = np.empty((N, H, Tq, V.shape[3]), dtype=precision)
+        lse = np.empty((N, H, Tq, 1), dtype=precision)
+
+        for q_start in range(0, Tq, chunk_size):
+            q_stop = min(q_start + chunk_size, Tq)
+            q_chunk = Q[:, :, q_start:q_stop] * scale
+            row_max = np.full((N, H, q_stop - q_start, 1), -np.inf, dtype=precision)
+            row_sum = np.zeros_like(row_max)
+            acc = np.zeros((N, H, q_stop - q_start, V.shape[3]), dtype=precision)
+            for k_start, k_stop, mask in _key_chunks(q_start, q_stop, Tk, chunk_size, causal):
+                s = np.matmul(q_chunk, K[:, :, k_start:k_stop].transpose(0, 1, 3, 2))
+                if mask is not None:
+                    s[:, :, mask] = -np.inf
+                new_max = np.maximum(row_max, np.max(s, axis=-1, keepdims=True))
+                s -= new_max
+                p = np.exp(s, out=s)
+                rescale = np.exp(row_max - new_max)
+                row_sum *= rescale
+                row_sum += np.sum(p, axis=-1, keepdims=True)
+                acc *= rescale
+                acc += np.matmul(p, V[:, :, k_start:k_stop])
+                row_max = new_max
+            np.divide(acc, row_sum, out=out[:, :, q_start:q_stop])
+            lse[:, :, q_start:q_stop] = row_max + np.log(row_sum)
+        return out.transpose(0, 2, 1, 3), (Q, K, V, lse)
+
+    @classmethod
+    def _create(cls, value, q, k, v, causal, chunk_size, saved):
+        ret = cls._create_node(value)
+        ret.attrs._q = q
+        ret.attrs._k = k
+        ret.attrs._v = v
+        ret.attrs._Q, ret.attrs._K, ret.attrs._V, ret.attrs._lse = saved
+        ret.attrs._causal = causal
+        ret.attrs._chunk_size = chunk_size
+        return ret
+
+    @classmethod
+    def _oper_cpu(cls, q, k, v, causal, chunk_size):
+        value, saved = cls._forward(q, k, v, causal, chunk_size)
+        return cls._create(value, q, k, v, causal, chunk_size, saved)
+
+    @classmethod
+    def _oper_gpu(cls, q, k, v, causal, chunk_size):
+        # The chunked kernel is only written for cpu.
+        value, saved = cls._forward(q, k, v, causal, chunk_size)
+        return cls._create(get_gpu(np.ascontiguousarray(value)), q, k, v, causal, chunk_size, saved)
+
+    def _grads(self, dy):
+        Q, K, V, lse = self.attrs._Q, self.attrs._K, self.attrs._V, self.attrs._lse
+        causal, chunk_size = self.attrs._causal, self.attrs._chunk_size
+        Tq, Tk, D = Q.shape[2], K.shape[2], Q.shape[3]
+        scale = 1 / np.sqrt(D)
+        dout = _heads_first(dy)
+        # sum_j p_ij * dp_ij of the softmax gradient is the row sum of dout * out.
+        delta = np.sum(dout * _heads_first(self), axis=-1, keepdims=True)
+        dQ, dK, dV = np.zeros_like(Q), np.zeros_like(K), np.zeros_like(V)
+
+        for q_start in range(0, Tq, chunk_size):
+            q_stop = min(q_start + chunk_size, Tq)
+            q_chunk = Q[:, :, q_start:q_stop] * scale
+            dout_chunk = dout[:, :, q_start:q_stop]
+            for k_start, k_stop, mask in _key_chunks(q_start, q_stop, Tk, chunk_size, causal):
+                s = np.matmul(q_chunk, K[:, :, k_start:k_stop].transpose(0, 1, 3, 2))
+                if mask is not None:
+                    s[:, :, mask] = -np.inf
+                s -= lse[:, :, q_start:q_stop]
+                p = np.exp(s, out=s)
+                dV[:, :, k_start:k_stop] += np.matmul(p.transpose(0, 1, 3, 2), dout_chunk)
+                ds = np.matmul(dout_chunk, V[:, :, k_start:k_stop].transpose(0, 1, 3, 2))
+                ds -= delta[:, :, q_start:q_stop]
+                ds *= p
+                dQ[:, :, q_start:q_stop] += np.matmul(ds, K[:, :, k_start:k_stop])
+                dK[:, :, k_start:k_stop] += np.matmul(ds.transpose(0, 1, 3, 2), q_chunk)
+        dQ *= scale
+        return [g.transpose(0, 2, 1, 3) for g in (dQ, dK, dV)]
+
+    def _backward_cpu(self, context, dy, **kwargs):
+        for arg, grad in zip((self.attrs._q, self.attrs._k, self.attrs._v), self._grads(dy)):
+            if isinstance(arg, Node):
+                arg._update_diff(context, grad, **kwargs)
+
+    def _backward_gpu(self, context, dy, **kwargs):
+        for arg, grad in zip((self.attrs._q, self.attrs._k, self.attrs._v), self._grads(dy)):
+            if isinstance(arg, Node):
+                arg._update_diff(context, get_gpu(np.ascontiguousarray(grad)), **kwargs)
+
+
+class MultiHeadAttention(Parametrized):
+    """Multi-head attention layer [attention]_ .
+
+    .. math::
+        \\text{head}_h = \\text{softmax}(\\frac{Q W^Q_h (K W^K_h)^T}{\\sqrt{d}}) V W^V_h
+
+    The outputs of the heads are concatenated and projected by :math:`W^O`.
+    The attention is computed in chunks of ``chunk_size`` keys with the online softmax,
+    so the (N, T, T) attention matrix is never allocated. Memory grows with
+    :math:`O(Td)` instead of :math:`O(T^2)`. Gradients are computed by
+    recomputing the scores chunk by chunk.
+
+    Args:
+        num_heads (int): Number of the heads. It must divide the input unit size.
+        input_size (tuple): Input size of the query, (T, D).
+        causal (bool): If True, each position attends only to itself and preceding positions.
+        chunk_size (int): Number of queries and keys processed at once.
+        ignore_bias (bool): If True is given, biases will not be added.
+        initializer (Initializer): Initializer object for weight initialization.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> x = np.random.rand(2, 10, 16)
+        >>> layer = rm.MultiHeadAttention(num_heads=4)
+        >>> z = layer(x)
+        >>> z.shape
+        (2, 10, 16)
+        >>> memory = np.random.rand(2, 7, 16)
+        >>> layer(x, memory).shape
+        (2, 10, 16)
+
+    Note:
+        Inputs are batch first, (N, T, D). If only ``query`` is given, self attention is computed.
+        If ``key`` is given and ``value`` is not, ``key`` is also used as ``value``.
+
+    .. [attention] Ashish Vaswani, Noam Shazeer, Niki Parmar, Jakob Uszkoreit, Llion Jones,
+        Aidan N. Gomez, Lukasz Kaiser, Illia Polosukhin. Attention Is All You Need.
+    """
+
+    def __init__(self, num_heads, input_size=None, causal=False, chunk_size=128,
+                 ignore_bias=False, initializer=GlorotNormal(), weight_decay=0):
+        self._num_heads = num_heads
+        self._causal = causal
+        self._chunk_size = chunk_size
+        self._ignore_bias = ignore_bias
+        self._initializer = initializer
+        self._weight_decay = weight_decay
+        super(MultiHeadAttention, self).__init__(input_size)
+
+    def weight_initiallize(self, input_size):
+        size = input_size[-1]
+        assert size % self._num_heads == 0, \
+            "Input size {} must be divisible by the number of heads {}.".format(size, self._num_heads)
+        self.params = {}
+        for name in ("q", "k", "v", "o"):
+            self.params["w" + name] = Variable(self._initializer((size, size)),
+                                               auto_update=True, weight_decay=self._weight_decay)
+            if not self._ignore_bias:
+                self.params["b" + name] = Variable(np.zeros((1, size), dtype=precision), auto_update=True)
+
+    def _project(self, x, name):
+        N, T, size = x.shape
+        z = dot(x.reshape(N * T, size), self.params["w" + name])
+        if self.params.get("b" + name, None) is not None:
+            z += self.params["b" + name]
+        return z
+
+    def forward(self, query, key=None, value=None):
+        key = query if key is None else key
+        value = key if value is None else value
+        assert len(query.shape) == 3, "Input must be (N, T, D). Actual shape is {}".format(query.shape)
+        N, T, size = query.shape
+        heads = (self._num_heads, size // self._num_heads)
+        q = self._project(query, "q").reshape((N, T) + heads)
+        k = self._project(key, "k").reshape(key.shape[:2] + heads)
+        v = self._project(value, "v").reshape(value.shape[:2] + heads)
+        z = attention(q, k, v, self._causal, self._chunk_size)
+        return self._project(z.reshape(N, T, size), "o").reshape(N, T, size)
@@ -7,6 +7,8 @@ from numbers import Number
 from renom.core import Node, Variable, to_value
 from renom import precision
 from renom.layers.function.parameterized import Parametrized
+from renom.layers.function.utils import check_layout, transpose_layout, moments, \
+    sum_of_products, NCHW
 from renom.utility.initializer import GlorotNormal
 import renom.cuda as cu
 if cu.has_cuda():
@@ -20,15 +22,15 @@ mode_dict = {
 
 
 class batch_normalize(Node):
-    def __new__(cls, x, w, b, momentum, mov_m, mov_s, inference, mode, epsilon):
+    def __new__(cls, x, w, b, momentum, mov_m, mov_s, inference, mode, epsilon, layout=NCHW):
         assert inference is True or x.shape[0] > 1, "Batch Normalize expects more than" \
             + " one batch when not in inference mode."
-        return cls.calc_value(x, w, b, momentum, mov_m, mov_s, inference, mode, epsilon)
+        return cls.calc_value(x, w, b, momentum, mov_m, mov_s, inference, mode, epsilon, layout)
 
     @classmethod
-    def _oper_cpu(cls, x, w, b, momentum, mov_m, mov_s, inference, mode, epsilon):
+    def _oper_cpu(cls, x, w, b, momentum, mov_m, mov_s, inference, mode, epsilon, layout):
         if mode == BATCH_NORMALIZE_FEATUREMAP:
-            axs = (0, 2, 3)
+            axs = (0, 2, 3) if layout == NCHW else (0, 1, 2)
         else:
             axs = (0, )
 
@@ -36,11 +38,11 @@ class batch_normalize(Node):
             mean = mov_m
             var = mov_s
         else:
-            mean = np.mean(to_value(x), axis=axs, keepdims=True)
-            var = np.var(to_value(x), axis=axs, keepdims=True)
+            mean, var = moments(x, axs)
 
         sq_var = 1.0 / np.sqrt(var + epsilon)
-        xh = (to_value(x) - mean) * sq_var
+        xh = to_value(x) - mean
+        xh *= sq_var
         z = to_value(w) * xh
         if b is not None:
             z += to_value(b)
@@ -52,6 +54,7 @@ class batch_normalize(Node):
         ret.attrs._b = b
         ret.attrs._m = mean
         ret.attrs._v = sq_var
+        ret.attrs._xh = xh
         if not inference:
             N = np.prod([x.shape[s] for s in axs])
             ret.attrs._mov_m = (1 - momentum) * mov_m + momentum * mean
@@ -59,7 +62,8 @@ class batch_normalize(Node):
         return ret
 
     @classmethod
-    def _oper_gpu(cls, x, w, b, momentum, mov_m, mov_s, inference, mode, epsilon):
+    def _oper_gpu(cls, x, w, b, momentum, mov_m, mov_s, inference, mode, epsilon, layout):
+        assert layout == NCHW, "NHWC layout is only supported on CPU."
         if mode == BATCH_NORMALIZE_FEATUREMAP:
             axs = 1
         else:
@@ -101,21 +105,24 @@ class batch_normalize(Node):
     def _backward_cpu(self, context, dy, **kwargs):
         a = self.attrs._axs
         sq_var = self.attrs._v
-        meaned = self.attrs._x - self.attrs._m
-        N = np.prod([self.attrs._x.shape[s] for s in a])
+        xh = self.attrs._xh
+        N = np.prod([xh.shape[s] for s in a])
+        dy = to_value(dy)
+        db = np.sum(dy, axis=a, keepdims=True)
+        dw = sum_of_products(xh, dy, a)
 
         if isinstance(self.attrs._x, Node):
-            dxh = dy * to_value(self.attrs._w)
-            ds = np.sum(dxh * meaned * -np.power(sq_var, 3) / 2, axis=a, keepdims=True)
-            du = np.sum(-dxh * sq_var, axis=a, keepdims=True)
-            dx = dxh * sq_var + (ds * 2 * meaned + du) / N
+            # dx = w * sq_var * (dy - mean(dy) - xh * mean(dy * xh))
+            dx = xh * (-dw / N)
+            dx += dy
+            dx -= db / N
+            dx *= to_value(self.attrs._w) * sq_var
             self.attrs._x._update_diff(context, dx, **kwargs)
         if isinstance(self.attrs._w, Node):
-            xh = meaned * sq_var
-            self.attrs._w._update_diff(context, np.sum(xh * dy, axis=a, keepdims=True), **kwargs)
+            self.attrs._w._update_diff(context, dw, **kwargs)
 
         if isinstance(self.attrs._b, Node):
-            self.attrs._b._update_diff(context, np.sum(dy, axis=a, keepdims=True), **kwargs)
+            self.attrs._b._update_diff(context, db, **kwargs)
 
     def _backward_gpu(self, context, dy, **kwargs):
         gw, gx, gdy, gm, gv = map(get_gpu, (self.attrs._w, self.attrs._x,
@@ -162,6 +169,8 @@ class BatchNormalize(Parametrized):
         epsilon (float): Small number added to avoid division by zero.
         ignore_bias (bool): If `True` is given, bias will not be added.
         initializer (Initializer): Initializer object for weight initialization.
+        layout (str): Tensor layout of 4d input, 'NCHW' or 'NHWC'.
+            'NHWC' is only available on CPU.
 
     Example:
         >>> import numpy as np
@@ -188,7 +197,8 @@ class BatchNormalize(Parametrized):
                  epsilon=1e-5,
                  ignore_bias=False,
                  initializer=GlorotNormal(),
-                 weight_decay=0):
+                 weight_decay=0,
+                 layout=NCHW):
 
         assert momentum > 0, "The value of momentum must be lager than 0."
         self._mov_mean = 0
@@ -200,14 +210,16 @@ class BatchNormalize(Parametrized):
         self._ignore_bias = ignore_bias
         self._initializer = initializer
         self._weight_decay = weight_decay
+        self._layout = check_layout(layout)
         super(BatchNormalize, self).__init__(input_size)
 
     def weight_initiallize(self, input_size):
         size_i = [1, ]
         size_i.extend(input_size)
         if self._mode == BATCH_NORMALIZE_FEATUREMAP and len(size_i) > 2:
-            size_i[2] = 1
-            size_i[3] = 1
+            spatial = (2, 3) if self._layout == NCHW else (1, 2)
+            for s in spatial:
+                size_i[s] = 1
         self.params = {"w": Variable(self._initializer(size_i).astype(
             precision), auto_update=True, weight_decay=self._weight_decay)}
         if not self._ignore_bias:
@@ -222,8 +234,17 @@ class BatchNormalize(Parametrized):
                               self._mov_std,
                               self.inference,
                               self._mode,
-                              self._epsilon)
+                              self._epsilon,
+                              self._layout)
         self._mov_mean = ret.attrs.get("_mov_m", self._mov_mean)
         self._mov_std = ret.attrs.get("_mov_v", self._mov_std)
 
         return ret
+
+    def _convert_layout(self, layout):
+        check_layout(layout)
+        if self.params:
+            self._transpose_params(self._layout, layout)
+        self._mov_mean = transpose_layout(self._mov_mean, self._layout, layout)
+        self._mov_std = transpose_layout(self._mov_std, self._layout, layout)
+        self._layout = layout
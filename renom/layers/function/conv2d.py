@@ -2,7 +2,8 @@
 # encoding: utf-8
 
 import numpy as np
-from renom.layers.function.utils import im2col, col2im, out_size, tuplize
+from renom.layers.function.utils import im2col, col2im, out_size, tuplize, \
+    im2col_nhwc, col2im_nhwc, check_layout, NCHW, NHWC
 from renom.core import Node, Variable, to_value
 from renom import precision
 from .parameterized import Parametrized
@@ -110,6 +111,59 @@ class conv2d(Node):
             self.attrs._b._update_diff(context, db, **kwargs)
 
 
+class conv2d_nhwc(Node):
+    """2d convolution for channels-last (NHWC) input on CPU.
+    The filter is held as (out_channel, kernel_h, kernel_w, in_channel) and the output
+    is produced in NHWC directly, so no layout transposition is required."""
+
+    def __new__(cls, x, w, b, filter=3, stride=1, padding=0, dilation=1):
+        assert not cu.is_cuda_active(), "NHWC layout is only supported on CPU."
+        filter, stride, padding, dilation = (tuplize(x)
+                                             for x in (filter, stride, padding, dilation))
+
+        in_shape = x.shape[1:]
+        out_shape = list(out_size(x.shape[1:3], filter, stride, padding, dilation))
+        out_shape.append(w.shape[0])
+        return cls.calc_value(x, w, b, in_shape, out_shape, filter, stride, padding, dilation)
+
+    @classmethod
+    def _oper_cpu(cls, x, w, b, in_shape, out_shape, kernel, stride, padding, dilation):
+        col = im2col_nhwc(to_value(x),
+                          out_shape[:2], kernel,
+                          stride, padding, dilation)
+        value = np.tensordot(col, to_value(w), ([3, 4, 5], [1, 2, 3]))
+        if b is not None:
+            value += b
+        ret = cls._create_node(value)
+        ret.attrs._col = col
+        ret.attrs._x = x
+        ret.attrs._w = w
+        ret.attrs._b = b
+        ret.attrs._in_shape = in_shape
+        ret.attrs._out_shape = out_shape
+        ret.attrs._kernel = kernel
+        ret.attrs._stride = stride
+        ret.attrs._padding = padding
+        ret.attrs._dilation = dilation
+        return ret
+
+    def _backward_cpu(self, context, dy, **kwargs):
+        dy = to_value(dy)
+
+        if isinstance(self.attrs._x, Node):
+            dx = np.tensordot(dy, to_value(self.attrs._w), (3, 0))
+            dx = col2im_nhwc(dx, self.attrs._in_shape[:2],
+                             self.attrs._stride, self.attrs._padding, self.attrs._dilation)
+            self.attrs._x._update_diff(context, dx, **kwargs)
+
+        if isinstance(self.attrs._w, Node):
+            self.attrs._w._update_diff(context, np.tensordot(
+                dy, self.attrs._col, ([0, 1, 2], [0, 1, 2])), **kwargs)
+
+        if isinstance(self.attrs._b, Node):
+            self.attrs._b._update_diff(context, np.sum(dy, (0, 1, 2), keepdims=True), **kwargs)
+
+
 class Conv2d(Parametrized):
     """2d convolution layer.
 
@@ -132,6 +186,8 @@ class Conv2d(Parametrized):
         input_size (tuple): Input unit size. This must be a tuple like (Channel, Height, Width).
         ignore_bias (bool): If `True` is given, bias will not be added.
         initializer (Initializer): Initializer object for weight initialization.
+        layout (str): Tensor layout of input and output, 'NCHW' or 'NHWC'.
+            'NHWC' is only available on CPU.
 
     Example:
         >>> import numpy as np
@@ -146,7 +202,9 @@ class Conv2d(Parametrized):
         (10, 32, 30, 30)
 
     Note:
-        Tensor data format is **NCHW**.
+        Tensor data format is **NCHW** by default. If ``layout='NHWC'`` is given,
+        input and output are **NHWC** and the filter is held as
+        (Channel, Height, Width, Input channel).
     """
 
     def __init__(self,
@@ -158,16 +216,20 @@ class Conv2d(Parametrized):
                  input_size=None,
                  ignore_bias=False,
                  initializer=GlorotNormal(),
-                 weight_decay=0):
+                 weight_decay=0,
+                 layout=NCHW):
         self._padding, self._stride, self._kernel, self._dilation = (tuplize(x)
                                                                      for x in (padding, stride, filter, dilation))
         self._channel = channel
         self._ignore_bias = ignore_bias
         self._initializer = initializer
         self._weight_decay = weight_decay
+        self._layout = check_layout(layout)
         super(Conv2d, self).__init__(input_size)
 
     def weight_initiallize(self, input_size):
+        if self._layout == NHWC:
+            input_size = (input_size[2], input_size[0], input_size[1])
         size_f = (self._channel, input_size[0],
                   self._kernel[0], self._kernel[1])
         assert all([s > 0 for s in input_size[1:]]), \
@@ -178,11 +240,20 @@ class Conv2d(Parametrized):
         if not self._ignore_bias:
             self.params["b"] = Variable(
                 np.zeros((1, self._channel, 1, 1), dtype=precision), auto_update=True)
+        if self._layout == NHWC:
+            self._transpose_params(NCHW, NHWC)
+
+    def _convert_layout(self, layout):
+        check_layout(layout)
+        if self.params:
+            self._transpose_params(self._layout, layout)
+        self._layout = layout
 
     def forward(self, x):
         assert len(x.shape) == 4, "The dimension of input array must be 4. Actual dim is {}".format(x.ndim)
-        assert all([s > 0 for s in x.shape[2:]]), \
+        assert all([s > 0 for s in x.shape[1:]]), \
             "The shape of input array {} is small. Please give an array which size is lager than 0.".format(
                 x.shape)
-        return conv2d(x, self.params.w, self.params.get("b", None), self._kernel,
-                      self._stride, self._padding, self._dilation)
+        func = conv2d_nhwc if self._layout == NHWC else conv2d
+        return func(x, self.params.w, self.params.get("b", None), self._kernel,
+                    self._stride, self._padding, self._dilation)
@@ -16,27 +16,56 @@ except ImportError:
     pass
 
 
+MASK_MODES = ("float", "packed", "seed")
+
+
+def _draw_mask(shape, keep_ratio, seed):
+    # 16 bit integers are much cheaper to draw than float64.
+    threshold = int(round(keep_ratio * 2 ** 16))
+    return np.random.RandomState(seed).randint(0, 2 ** 16, size=shape, dtype=np.uint16) < threshold
+
+
 class dropout(Node):
 
-    def __new__(cls, x, dropout_ratio=0.5, inference=False):
+    def __new__(cls, x, dropout_ratio=0.5, inference=False, mask_mode="float"):
+        assert mask_mode in MASK_MODES, \
+            "mask_mode must be one of {}. Actual is {}".format(MASK_MODES, mask_mode)
         if inference:
             return x
-        ret = cls.calc_value(x, 1. - dropout_ratio)
+        ret = cls.calc_value(x, 1. - dropout_ratio, mask_mode)
         ret._ratio = dropout_ratio
         return ret
 
     @classmethod
-    def _oper_cpu(cls, x, dropout_ratio):
-        mask = np.array(np.random.rand(*x.shape) < dropout_ratio, dtype=precision) / dropout_ratio
-        value = x * mask
+    def _mask_shape(cls, x):
+        return x.shape
 
-        ret = cls._create_node(value)
+    @classmethod
+    def _oper_cpu(cls, x, dropout_ratio, mask_mode="float"):
+        shape = cls._mask_shape(x)
+        if mask_mode == "float":
+            mask = np.array(np.random.rand(*shape) < dropout_ratio, dtype=precision) / dropout_ratio
+            ret = cls._create_node(x * mask)
+            ret.attrs._mask = mask
+        else:
+            # The seed of the generator is drawn from np.random, so np.random.seed
+            # still makes the masks reproducible.
+            seed = np.random.randint(np.iinfo(np.int32).max)
+            mask = _draw_mask(shape, dropout_ratio, seed)
+            value = x * mask
+            value *= 1 / dropout_ratio
+            ret = cls._create_node(value)
+            if mask_mode == "packed":
+                ret.attrs._packed_mask = np.packbits(mask)
+            else:
+                ret.attrs._seed = seed
+            ret.attrs._mask_shape = shape
         ret.attrs._x = x
-        ret.attrs._mask = mask
+        ret.attrs._keep_ratio = dropout_ratio
         return ret
 
     @classmethod
-    def _oper_gpu(cls, x, dropout_ratio):
+    def _oper_gpu(cls, x, dropout_ratio, mask_mode="float"):
         mask = get_gpu(x).empty_like_me()
         curand_generator().rand_bernoulli(mask, 1 - dropout_ratio)
         mask = mask / dropout_ratio
@@ -48,7 +77,18 @@ class dropout(Node):
 
     def _backward_cpu(self, context, dy, **kwargs):
         if isinstance(self.attrs._x, Node):
-            dx = self.attrs._mask * dy
+            mask = self.attrs.get("_mask")
+            if mask is not None:
+                dx = mask * dy
+            else:
+                shape = self.attrs._mask_shape
+                if self.attrs.get("_seed") is not None:
+                    mask = _draw_mask(shape, self.attrs._keep_ratio, self.attrs._seed)
+                else:
+                    mask = np.unpackbits(self.attrs._packed_mask)[:int(np.prod(shape))]
+                    mask = mask.reshape(shape).view(bool)
+                dx = np.multiply(dy, mask, dtype=precision)
+                dx *= 1 / self.attrs._keep_ratio
             self.attrs._x._update_diff(context, dx, **kwargs)
 
     def _backward_gpu(self, context, dy, **kwargs):
@@ -59,25 +99,21 @@ class dropout(Node):
 
 class spatial_dropout(dropout):
 
-    def __new__(cls, x, dropout_ratio=0.5, inference=False):
+    def __new__(cls, x, dropout_ratio=0.5, inference=False, mask_mode="float"):
         assert len(x.shape) == 4, "Spatial_dropout only accepts 4d tensors."
+        assert mask_mode in MASK_MODES, \
+            "mask_mode must be one of {}. Actual is {}".format(MASK_MODES, mask_mode)
         if inference:
             return x
         else:
-            return cls.calc_value(x, 1. - dropout_ratio)
+            return cls.calc_value(x, 1. - dropout_ratio, mask_mode)
 
     @classmethod
-    def _oper_cpu(cls, x, dropout_ratio):
-        mask = np.array(np.random.rand(*x.shape[:2]) < dropout_ratio,
-                        dtype=precision)[:, :, None, None] / dropout_ratio
-        value = x * mask
-        ret = cls._create_node(value)
-        ret.attrs._x = x
-        ret.attrs._mask = mask
-        return ret
+    def _mask_shape(cls, x):
+        return x.shape[:2] + (1, 1)
 
     @classmethod
-    def _oper_gpu(cls, x, drop_out_ratio):
+    def _oper_gpu(cls, x, drop_out_ratio, mask_mode="float"):
         shape = (x.shape[0], x.shape[1], 1, 1)
         mask = GPUValue(shape=shape)
         curand_generator().rand_bernoulli(mask, 1 - drop_out_ratio)
@@ -99,6 +135,12 @@ class Dropout(Model):
 
     Args:
         dropout_ratio (float): Dropout ratio.
+        mask_mode (str): How the mask is kept for the backward computation on cpu.
+            'float' keeps the mask as an array of the input size. 'packed' keeps it
+            as bits, 1 bit per element. 'seed' keeps only the seed of the random
+            generator and draws the mask again in backward.
+            'packed' and 'seed' draw the mask from 16 bit random integers, which is
+            faster than 'float'. The mask on gpu is not affected.
 
     Example:
         >>> import numpy as np
@@ -128,8 +170,11 @@ class Dropout(Model):
 
     """
 
-    def __init__(self, dropout_ratio=0.5):
+    def __init__(self, dropout_ratio=0.5, mask_mode="float"):
+        assert mask_mode in MASK_MODES, \
+            "mask_mode must be one of {}. Actual is {}".format(MASK_MODES, mask_mode)
         self._dropout_ratio = dropout_ratio
+        self._mask_mode = mask_mode
         self.inference = False
 
     def __call__(self, x):
@@ -138,7 +183,7 @@ class Dropout(Model):
         return self.forward(x)
 
     def forward(self, x):
-        return dropout(x, self._dropout_ratio, self.inference)
+        return dropout(x, self._dropout_ratio, self.inference, self._mask_mode)
 
 
 class SpatialDropout(Dropout):
@@ -147,6 +192,7 @@ class SpatialDropout(Dropout):
 
     Args:
         dropout_ratio (float): Dropout ratio.
+        mask_mode (str): How the mask is kept on cpu. See :class:`Dropout`.
 
     Raises:
         AssertionError: An assertion error will be raised if the input tensor dimension is not 4.
@@ -182,4 +228,4 @@ class SpatialDropout(Dropout):
     """
 
     def forward(self, x):
-        return spatial_dropout(x, self._dropout_ratio, self.inference)
+        return spatial_dropout(x, self._dropout_ratio, self.inference, self._mask_mode)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import numpy as np
+from renom.core import Node, Variable, to_value
+from renom.operation import concat
+from renom.layers.function.utils import NCHW, NHWC
+from renom.layers.activation import Relu, LeakyRelu, Elu, Selu, Sigmoid, Tanh, Softplus, Softsign, Swish
+from .parameterized import Model, Parametrized, Sequential
+from .dense import Dense
+from .conv2d import Conv2d, conv2d
+from .group_conv2d import group_conv2d
+from .pool2d import MaxPool2d, AveragePool2d
+from .dropout import Dropout
+import renom.cuda as cu
+if cu.has_cuda():
+    from renom.cuda.gpuvalue import get_gpu
+
+
+def _sum_to(g, shape):
+    # Reduces a broadcast gradient to the shape of the operand.
+    g = g.sum(axis=tuple(range(g.ndim - len(shape)))) if g.ndim > len(shape) else g
+    axes = tuple(i for i, s in enumerate(shape) if s == 1 and g.shape[i] != 1)
+    return g.sum(axis=axes, keepdims=True) if axes else g
+
+
+class batched_dot(Node):
+    """Matrix product of stacks of matrices, broadcast over the leading axes like ``np.matmul``.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> x = np.random.rand(5, 3)
+        >>> w = np.random.rand(4, 3, 2)
+        >>> rm.batched_dot(x, w).shape
+        (4, 5, 2)
+    """
+
+    def __new__(cls, a, b):
+        assert len(a.shape) >= 2 and len(b.shape) >= 2 and a.shape[-1] == b.shape[-2], \
+            "Shapes {} and {} are not aligned.".format(a.shape, b.shape)
+        return cls.calc_value(a, b)
+
+    @classmethod
+    def _create(cls, value, a, b):
+        ret = cls._create_node(value)
+        ret.attrs._a = a
+        ret.attrs._b = b
+        return ret
+
+    @classmethod
+    def _oper_cpu(cls, a, b):
+        return cls._create(np.matmul(to_value(a), to_value(b)), a, b)
+
+    @classmethod
+    def _oper_gpu(cls, a, b):
+        # The batched product is only written for cpu.
+        value = np.matmul(to_value(a), to_value(b))
+        return cls._create(get_gpu(np.ascontiguousarray(value)), a, b)
+
+    def _grads(self, dy):
+        a, b, dy = to_value(self.attrs._a), to_value(self.attrs._b), to_value(dy)
+        da = _sum_to(np.matmul(dy, np.swapaxes(b, -1, -2)), a.shape)
+        db = _sum_to(np.matmul(np.swapaxes(a, -1, -2), dy), b.shape)
+        return da, db
+
+    def _backward_cpu(self, context, dy, **kwargs):
+        for arg, grad in zip((self.attrs._a, self.attrs._b), self._grads(dy)):
+            if isinstance(arg, Node):
+                arg._update_diff(context, grad, **kwargs)
+
+    def _backward_gpu(self, context, dy, **kwargs):
+        for arg, grad in zip((self.attrs._a, self.attrs._b), self._grads(dy)):
+            if isinstance(arg, Node):
+                arg._update_diff(context, get_gpu(np.ascontiguousarray(grad)), **kwargs)
+
+
+def _stacked_variable(params, shape=None):
+    value = np.stack([p.as_ndarray() for p in params])
+    if shape is not None:
+        value = value.reshape(shape)
+    return Variable(value, auto_update=params[0]._auto_update, weight_decay=params[0].weight_decay)
+
+
+def _set_param(layer, name, value, param):
+    layer.params[name] = Variable(value, auto_update=param._auto_update, weight_decay=param.weight_decay)
+
+
+# Layouts of the activations between the layers of an ensemble of E members.
+# SHARED: the input of all members, (N, ...).
+# STACKED: members are stacked along a new leading axis, (E, N, ...).
+# CHANNELS: feature maps of the members are concatenated along the channels, (N, E * C, H, W).
+SHARED, STACKED, CHANNELS = range(3)
+
+# Layers computed independently for each channel, which can be applied to the CHANNELS layout.
+_CHANNELWISE = (Relu, LeakyRelu, Elu, Selu, Sigmoid, Tanh, Softplus, Softsign, Swish,
+                MaxPool2d, AveragePool2d, Dropout)
+
+
+def _to_stacked(x, layout, num):
+    if layout == CHANNELS:
+        N, C = x.shape[:2]
+        return x.reshape((N, num, C // num) + tuple(x.shape[2:])).transpose(
+            *((1, 0) + tuple(range(2, len(x.shape) + 1))))
+    elif layout == SHARED:
+        return concat([x.reshape((1, ) + x.shape)] * num, axis=0)
+    return x
+
+
+def _to_channels(x, layout):
+    if layout == STACKED:
+        E, N, C = x.shape[:3]
+        return x.transpose(*((1, 0) + tuple(range(2, len(x.shape))))).reshape((N, E * C) + tuple(x.shape[3:]))
+    return x
+
+
+class _StackedDense(Model):
+    # Dense layers of all members as one batched matrix product.
+
+    def __init__(self, layers):
+        self._layers = layers
+        self.params.w = _stacked_variable([ly.params.w for ly in layers])
+        if layers[0].params.get("b", None) is not None:
+            self.params.b = _stacked_variable([ly.params.b for ly in layers])
+
+    def forward(self, x, layout):
+        if layout != SHARED:
+            x = _to_stacked(x, layout, len(self._layers))
+        z = batched_dot(x, self.params.w)
+        if self.params.get("b", None) is not None:
+            z += self.params.b
+        return z, STACKED
+
+    def unstack(self):
+        for i, ly in enumerate(self._layers):
+            for name in self.params:
+                _set_param(ly, name, self.params[name].as_ndarray()[i], ly.params[name])
+
+
+class _StackedConv2d(Model):
+    # Conv2d layers of all members as one grouped convolution. Filters of the members are
+    # concatenated along the output channels. While the members share the input, it is a
+    # single convolution.
+
+    def __init__(self, layers):
+        self._layers = layers
+        ly = layers[0]
+        self._kernel, self._stride, self._padding, self._dilation = \
+            ly._kernel, ly._stride, ly._padding, ly._dilation
+        w = ly.params.w
+        self.params.w = _stacked_variable([ly.params.w for ly in layers],
+                                          (len(layers) * w.shape[0], ) + w.shape[1:])
+        if ly.params.get("b", None) is not None:
+            self.params.b = _stacked_variable([ly.params.b for ly in layers],
+                                              (1, len(layers) * w.shape[0], 1, 1))
+
+    def forward(self, x, layout):
+        b = self.params.get("b", None)
+        if layout == SHARED:
+            z = conv2d(x, self.params.w, b, self._kernel, self._stride, self._padding, self._dilation)
+        else:
+            z = group_conv2d(_to_channels(x, layout), self.params.w, b, self._kernel, self._stride,
+                             self._padding, self._dilation, groups=len(self._layers))
+        return z, CHANNELS
+
+    def unstack(self):
+        num = len(self._layers)
+        for name in self.params:
+            values = self.params[name].as_ndarray()
+            values = values.reshape((num, -1) + values.shape[1:]) if name == "w" else \
+                values.reshape(num, -1)
+            for ly, value in zip(self._layers, values):
+                _set_param(ly, name, value.reshape(ly.params[name].shape), ly.params[name])
+
+
+class _Shared(Model):
+    # A layer without parameters applied once to the outputs of all members.
+
+    def __init__(self, layer, num):
+        self.layer = layer
+        self._num = num
+        self._channelwise = isinstance(layer, _CHANNELWISE) and getattr(layer, "_layout", NCHW) == NCHW
+
+    def forward(self, x, layout):
+        if layout == SHARED or layout == CHANNELS and self._channelwise:
+            return self.layer(x), layout
+        x = _to_stacked(x, layout, self._num)
+        # (E, N, ...) -> (E * N, ...) -> (E, N, ...)
+        E, N = x.shape[:2]
+        z = self.layer(x.reshape((E * N, ) + tuple(x.shape[2:])))
+        return z.reshape((E, N) + tuple(z.shape[1:])), STACKED
+
+    def unstack(self):
+        pass
+
+
+class _PerMember(Model):
+    # Layers which cannot be stacked are called for each member.
+
+    def __init__(self, layers):
+        self._layers = layers
+        for i, ly in enumerate(layers):
+            setattr(self, "m%d" % i, ly)
+
+    def forward(self, x, layout):
+        if layout != SHARED:
+            x = _to_stacked(x, layout, len(self._layers))
+        outputs = [ly(x if layout == SHARED else x[i]) for i, ly in enumerate(self._layers)]
+        return concat([z.reshape((1, ) + z.shape) for z in outputs], axis=0), STACKED
+
+    def unstack(self):
+        pass
+
+
+def _config(layer):
+    return dict((k, v) for k, v in vars(layer).items() if k != "_parameters")
+
+
+def _stack_layers(layers):
+    # Returns a layer computing all members at once, or None if they cannot be stacked.
+    ly = layers[0]
+    shapes = [sorted((k, v.shape) for k, v in other.params.items() if v is not None)
+              if isinstance(other, Model) else [] for other in layers]
+    if any(s != shapes[0] for s in shapes[1:]):
+        return None
+    if type(ly) is Dense:
+        return _StackedDense(layers)
+    elif type(ly) is Conv2d and ly._layout != NHWC and all(
+            (other._kernel, other._stride, other._padding, other._dilation) ==
+            (ly._kernel, ly._stride, ly._padding, ly._dilation) for other in layers[1:]):
+        return _StackedConv2d(layers)
+    elif not isinstance(ly, Model) or not any(True for _ in ly.named_parameters()):
+        try:
+            if all(_config(other) == _config(ly) for other in layers[1:]):
+                return _Shared(ly, len(layers))
+        except ValueError:
+            # Attributes hold arrays.
+            pass
+    return None
+
+
+class Ensemble(Model):
+    """Runs structurally identical :class:`Sequential` models as one batched model.
+
+    Parameters of the members are stacked along a new leading axis.
+    :class:`Dense` layers are computed by one batched matrix product and
+    :class:`Conv2d` layers by one grouped convolution. Layers without parameters,
+    such as activations, pooling and Flatten, are called once with the members
+    merged into the batch axis. Other layers are called for each member.
+    A batch goes through all the members at the cost of one large model instead of
+    N small ones.
+
+    The ensemble can be trained. Stacked parameters are updated by optimizers, and
+    :meth:`unstack` copies them back to the member models.
+
+    Args:
+        models (list): Initialized Sequential models with the same layers and parameter shapes.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> x = np.random.rand(32, 10)
+        >>> models = [rm.Sequential([rm.Dense(16), rm.Relu(), rm.Dense(2)]) for _ in range(8)]
+        >>> for m in models:
+        ...     _ = m(x)
+        ...
+        >>> ensemble = rm.Ensemble(models)
+        >>> z = ensemble(x)
+        >>> z.shape
+        (8, 32, 2)
+        >>> np.allclose(z[3], models[3](x), atol=1e-5)
+        True
+        >>> prediction = rm.mean(z, axis=0)
+
+    Note:
+        The output is stacked as (number of members, N, ...). The input is shared by all members.
+    """
+
+    def __init__(self, models):
+        models = list(models)
+        assert len(models) > 0, "No model is given."
+        assert all(isinstance(m, Sequential) for m in models), "Members must be Sequential models."
+        num_layers = len(models[0]._layers)
+        assert all(len(m._layers) == num_layers for m in models), "Members must have the same number of layers."
+        for layers in zip(*[m._layers for m in models]):
+            assert all(type(ly) is type(layers[0]) for ly in layers), \
+                "Members must have the same layers. Given are {}.".format(
+                    sorted(set(type(ly).__name__ for ly in layers)))
+            assert all(not isinstance(ly, Parametrized) or ly.params for ly in layers), \
+                "Layers of the members must be initialized by calling them."
+
+        self._models = models
+        self._layers = []
+        for i, layers in enumerate(zip(*[m._layers for m in models])):
+            layer = _stack_layers(list(layers)) or _PerMember(list(layers))
+            setattr(self, "l%d" % i, layer)
+            self._layers.append(layer)
+
+    def __len__(self):
+        return len(self._models)
+
+    def forward(self, x):
+        layout = SHARED
+        for layer in self._layers:
+            x, layout = layer(x, layout)
+        return _to_stacked(x, layout, len(self._models))
+
+    def unstack(self):
+        """Copies the stacked parameters back to the member models."""
+        for layer in self._layers:
+            layer.unstack()
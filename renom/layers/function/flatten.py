@@ -1,5 +1,7 @@
+import numpy as np
 from renom.core import UnaryOp
 from renom.operation import reshape
+from renom.layers.function.utils import check_layout, NCHW, NHWC
 
 
 class flatten(UnaryOp):
@@ -14,6 +16,12 @@ class Flatten:
     """This function flattens an input tensor.
     It does not affect the batch size.
 
+    Args:
+        layout (str): Tensor layout of 4d input, 'NCHW' or 'NHWC'.
+            Flattening is a plain reshape in both layouts. The layout is
+            only used by :meth:`Model.set_layout` for reordering the
+            weight of a Dense layer which follows this layer.
+
     Example:
         >>> x = np.random.rand(3, 3, 32, 32)
         >>> x = rm.Variable(x)
@@ -30,5 +38,30 @@ class Flatten:
         (3, 3072)
     """
 
+    def __init__(self, layout=NCHW):
+        self._layout = check_layout(layout)
+        self._in_shape = None
+
     def __call__(self, x):
+        self._in_shape = tuple(x.shape[1:])
         return flatten(x)
+
+    def _permute_flattened(self, w, layout):
+        # Rows of ``w`` are indexed by the flattened input. Reorders them
+        # so that ``w`` accepts the input flattened in ``layout``.
+        in_shape = getattr(self, "_in_shape", None)
+        if in_shape is None or len(in_shape) != 3 or layout == self._layout:
+            return w
+        if w.ndim != 2 or w.shape[0] != np.prod(in_shape):
+            return w
+        axes = (1, 2, 0, 3) if layout == NHWC else (2, 0, 1, 3)
+        w = w.reshape(in_shape + (-1, )).transpose(axes)
+        return np.ascontiguousarray(w.reshape(-1, w.shape[-1]))
+
+    def _convert_layout(self, layout):
+        check_layout(layout)
+        in_shape = getattr(self, "_in_shape", None)
+        if in_shape is not None and len(in_shape) == 3 and layout != self._layout:
+            axes = (1, 2, 0) if layout == NHWC else (2, 0, 1)
+            self._in_shape = tuple(in_shape[a] for a in axes)
+        self._layout = layout
@@ -0,0 +1,420 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from renom.config import precision
+from renom.core import to_value
+from renom.layers.activation.relu import Relu
+from renom.layers.activation.leaky_relu import LeakyRelu
+from renom.layers.activation.sigmoid import Sigmoid
+from renom.layers.activation.tanh import Tanh
+from renom.layers.activation.softmax import Softmax
+from renom.layers.function.parameterized import Sequential
+from renom.layers.function.dense import Dense
+from renom.layers.function.conv2d import Conv2d
+from renom.layers.function.pool2d import MaxPool2d, AveragePool2d
+from renom.layers.function.batch_normalize import BatchNormalize
+from renom.layers.function.dropout import Dropout
+from renom.layers.function.flatten import Flatten
+from renom.layers.function.inference import _bn_scale_shift
+from renom.layers.function.utils import out_size, NCHW
+
+_ALIGNMENT = 64
+
+
+def _array(value, dtype):
+    return np.ascontiguousarray(np.asarray(to_value(value)), dtype=dtype)
+
+
+def _padded(x, padding, ws):
+    # Copies x into the workspace ws surrounded by zeros. The border is cleared
+    # on every call, because other buffers may share its memory.
+    p_h, p_w = padding
+    if not p_h and not p_w:
+        return lambda: None, x
+    H, W = x.shape[2:]
+
+    def pad():
+        ws[:, :, :p_h] = 0
+        ws[:, :, p_h + H:] = 0
+        ws[:, :, :, :p_w] = 0
+        ws[:, :, :, p_w + W:] = 0
+        ws[:, :, p_h:p_h + H, p_w:p_w + W] = x
+    return pad, ws
+
+
+def _windows(x, out_hw, kernel, stride, dilation=(1, 1)):
+    # View of the (kh, kw) windows of x, (N, C, OH, OW, kh, kw).
+    sN, sC, sH, sW = x.strides
+    shape = x.shape[:2] + tuple(out_hw) + tuple(kernel)
+    strides = (sN, sC, sH * stride[0], sW * stride[1], sH * dilation[0], sW * dilation[1])
+    return as_strided(x, shape=shape, strides=strides, writeable=False)
+
+
+class _Op(object):
+    # An operation of a frozen model. ``shapes`` returns the output shape and the
+    # shapes of the workspaces, ``bind`` returns a function computing y from x.
+    # If ``inplace`` is True, the output is written into the input buffer.
+    inplace = False
+
+    def shapes(self, in_shape):
+        return in_shape, []
+
+    def bind(self, x, y, ws):
+        raise NotImplementedError
+
+
+class _Dense(_Op):
+
+    def __init__(self, layer, dtype):
+        self._w = _array(layer.params["w"], dtype)
+        b = layer.params.get("b", None)
+        self._b = None if b is None else _array(b, dtype)
+
+    def shapes(self, in_shape):
+        assert len(in_shape) == 2 and in_shape[1] == self._w.shape[0], \
+            "Input shape {} does not match the weight {}.".format(in_shape, self._w.shape)
+        return (in_shape[0], self._w.shape[1]), []
+
+    def bind(self, x, y, ws):
+        w, b = self._w, self._b
+
+        def dense():
+            np.dot(x, w, out=y)
+            if b is not None:
+                np.add(y, b, out=y)
+        return dense
+
+
+class _Conv2d(_Op):
+
+    def __init__(self, layer, dtype):
+        assert layer._layout == NCHW, "Only NCHW layout is supported."
+        w = _array(layer.params["w"], dtype)
+        self._channel, self._in_channel = w.shape[:2]
+        # im2col of renom flips the kernel.
+        self._w = np.ascontiguousarray(w[:, :, ::-1, ::-1].reshape(self._channel, -1))
+        b = layer.params.get("b", None)
+        self._b = None if b is None else _array(b, dtype)
+        self._kernel, self._stride = layer._kernel, layer._stride
+        self._padding, self._dilation = layer._padding, layer._dilation
+
+    def shapes(self, in_shape):
+        N, C, H, W = in_shape
+        assert C == self._in_channel, "Input channel {} does not match the weight.".format(C)
+        oh, ow = (int(s) for s in out_size((H, W), self._kernel, self._stride, self._padding, self._dilation))
+        p_h, p_w = self._padding
+        ws = [(N, C) + tuple(self._kernel) + (oh, ow)]
+        if p_h or p_w:
+            ws.append((N, C, H + 2 * p_h, W + 2 * p_w))
+        return (N, self._channel, oh, ow), ws
+
+    def bind(self, x, y, ws):
+        col = ws[0]
+        pad, padded = _padded(x, self._padding, ws[1] if len(ws) > 1 else None)
+        windows = _windows(padded, y.shape[2:], self._kernel, self._stride, self._dilation)
+        # Each tap of the kernel is copied as a (N, C, OH, OW) slice.
+        taps = [(col[:, :, i, j], windows[:, :, :, :, i, j]) for i, j in np.ndindex(*self._kernel)]
+        N, OC, OH, OW = y.shape
+        col3d = col.reshape(N, -1, OH * OW)
+        y3d = y.reshape(N, OC, OH * OW)
+        w, b = self._w, self._b
+
+        def conv2d():
+            pad()
+            for dst, src in taps:
+                np.copyto(dst, src)
+            np.matmul(w, col3d, out=y3d)
+            if b is not None:
+                np.add(y, b, out=y)
+        return conv2d
+
+
+class _Pool2d(_Op):
+
+    def __init__(self, layer, mode):
+        assert layer._layout == NCHW, "Only NCHW layout is supported."
+        self._kernel, self._stride, self._padding = layer._kernel, layer._stride, layer._padding
+        self._mode = mode
+
+    def shapes(self, in_shape):
+        N, C, H, W = in_shape
+        oh, ow = (int(s) for s in out_size((H, W), self._kernel, self._stride, self._padding))
+        p_h, p_w = self._padding
+        ws = [(N, C, H + 2 * p_h, W + 2 * p_w)] if p_h or p_w else []
+        return (N, C, oh, ow), ws
+
+    def bind(self, x, y, ws):
+        pad, padded = _padded(x, self._padding, ws[0] if ws else None)
+        windows = _windows(padded, y.shape[2:], self._kernel, self._stride)
+        # Reducing the taps one by one is much faster than a reduction over the window axes.
+        taps = [windows[:, :, :, :, i, j] for i, j in np.ndindex(*self._kernel)]
+        accumulate = np.maximum if self._mode == "max" else np.add
+        scale = 1 / len(taps)
+
+        def pool2d():
+            pad()
+            np.copyto(y, taps[0])
+            for tap in taps[1:]:
+                accumulate(y, tap, out=y)
+            if self._mode == "average":
+                np.multiply(y, scale, out=y)
+        return pool2d
+
+
+class _Elementwise(_Op):
+    inplace = True
+
+    def __init__(self, func):
+        self._func = func
+
+    def bind(self, x, y, ws):
+        func = self._func
+        return lambda: func(x)
+
+
+def _relu(x):
+    np.maximum(x, 0, out=x)
+
+
+def _sigmoid(x):
+    np.negative(x, out=x)
+    np.exp(x, out=x)
+    np.add(x, 1, out=x)
+    np.reciprocal(x, out=x)
+
+
+def _tanh(x):
+    np.tanh(x, out=x)
+
+
+class _LeakyRelu(_Op):
+    inplace = True
+
+    def __init__(self, layer):
+        self._slope = layer._slope
+
+    def shapes(self, in_shape):
+        return in_shape, [in_shape]
+
+    def bind(self, x, y, ws):
+        slope, tmp = self._slope, ws[0]
+        select = np.maximum if slope <= 1 else np.minimum
+
+        def leaky_relu():
+            np.multiply(x, slope, out=tmp)
+            select(x, tmp, out=x)
+        return leaky_relu
+
+
+class _Softmax(_Op):
+    inplace = True
+
+    def shapes(self, in_shape):
+        return in_shape, [in_shape[:1] + (1, ) + in_shape[2:]]
+
+    def bind(self, x, y, ws):
+        s = ws[0]
+
+        def softmax():
+            np.max(x, axis=1, keepdims=True, out=s)
+            np.subtract(x, s, out=x)
+            np.exp(x, out=x)
+            np.sum(x, axis=1, keepdims=True, out=s)
+            np.add(s, 1e-8, out=s)
+            np.divide(x, s, out=x)
+        return softmax
+
+
+class _Affine(_Op):
+    # Batch normalization in inference mode.
+    inplace = True
+
+    def __init__(self, layer, dtype):
+        scale, shift = _bn_scale_shift(layer)
+        self._scale, self._shift = _array(scale, dtype), _array(shift, dtype)
+
+    def bind(self, x, y, ws):
+        scale, shift = self._scale, self._shift
+
+        def affine():
+            np.multiply(x, scale, out=x)
+            np.add(x, shift, out=x)
+        return affine
+
+
+class _Flatten(_Op):
+    # The output is a view of the input.
+    inplace = True
+
+    def __init__(self, layer):
+        assert layer._layout == NCHW, "Only NCHW layout is supported."
+
+    def shapes(self, in_shape):
+        return (in_shape[0], int(np.prod(in_shape[1:]))), []
+
+    def bind(self, x, y, ws):
+        return None
+
+
+def _convert(layer, dtype):
+    if isinstance(layer, Sequential):
+        return [op for ly in layer._layers for op in _convert(ly, dtype)]
+    if isinstance(layer, Dropout):
+        return []
+    if isinstance(layer, (Dense, Conv2d, BatchNormalize)):
+        assert layer.params, "Weights of {} are not initialized.".format(type(layer).__name__)
+    if isinstance(layer, Dense):
+        return [_Dense(layer, dtype)]
+    if isinstance(layer, Conv2d):
+        return [_Conv2d(layer, dtype)]
+    if isinstance(layer, MaxPool2d):
+        return [_Pool2d(layer, "max")]
+    if isinstance(layer, AveragePool2d):
+        return [_Pool2d(layer, "average")]
+    if isinstance(layer, BatchNormalize):
+        return [_Affine(layer, dtype)]
+    if isinstance(layer, Flatten):
+        return [_Flatten(layer)]
+    if isinstance(layer, LeakyRelu):
+        return [_LeakyRelu(layer)]
+    if isinstance(layer, Softmax):
+        return [_Softmax()]
+    funcs = {Relu: _relu, Sigmoid: _sigmoid, Tanh: _tanh}
+    for cls, func in funcs.items():
+        if isinstance(layer, cls):
+            return [_Elementwise(func)]
+    raise ValueError("{} can not be frozen.".format(type(layer).__name__))
+
+
+def _assign_offsets(buffers):
+    # Buffers are (nbytes, first step, last step). Each buffer is placed at the
+    # lowest offset which is not used by the buffers alive at the same time.
+    offsets = [None] * len(buffers)
+    for i in sorted(range(len(buffers)), key=lambda i: -buffers[i][0]):
+        size, start, end = buffers[i]
+        used = sorted((offsets[j], offsets[j] + buffers[j][0]) for j in range(len(buffers))
+                      if offsets[j] is not None and buffers[j][1] <= end and start <= buffers[j][2])
+        offset = 0
+        for lo, hi in used:
+            if offset + size <= lo:
+                break
+            offset = max(offset, (hi + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT)
+        offsets[i] = offset
+    return offsets
+
+
+class _Plan(object):
+
+    def __init__(self, ops, in_shape, dtype):
+        # Shape propagation. Values are (buffer index, shape).
+        buffers = [[0, -1, 0]]
+        values = [(0, in_shape)]
+        workspaces = []
+        for step, op in enumerate(ops):
+            buf, shape = values[-1]
+            out_shape, ws_shapes = op.shapes(shape)
+            buffers[buf][2] = step
+            if not op.inplace:
+                buf = len(buffers)
+                buffers.append([0, step, step])
+            values.append((buf, out_shape))
+            ws = []
+            for s in ws_shapes:
+                ws.append((len(buffers), s))
+                buffers.append([0, step, step])
+            workspaces.append(ws)
+        buffers[values[-1][0]][2] = len(ops)
+        for b, s in values + [w for ws in workspaces for w in ws]:
+            buffers[b][0] = max(buffers[b][0], int(np.prod(s)) * np.dtype(dtype).itemsize)
+
+        offsets = _assign_offsets([tuple(b) for b in buffers])
+        self.nbytes = max([o + b[0] for o, b in zip(offsets, buffers)] + [0])
+        self.arena = np.empty(self.nbytes, dtype=np.uint8)
+
+        def view(buf, shape):
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            return self.arena[offsets[buf]:offsets[buf] + nbytes].view(dtype).reshape(shape)
+
+        arrays = [view(b, s) for b, s in values]
+        self.input = arrays[0]
+        self.output = arrays[-1]
+        self.steps = []
+        for i, op in enumerate(ops):
+            step = op.bind(arrays[i], arrays[i + 1], [view(b, s) for b, s in workspaces[i]])
+            if step is not None:
+                self.steps.append(step)
+
+
+class FrozenModel(object):
+    """Inference function of a model made by :func:`freeze`.
+
+    Calling it runs a fixed list of NumPy kernels which write into
+    a preallocated buffer. The returned array is a view of the buffer and is
+    overwritten by the next call of the same input shape.
+    """
+
+    def __init__(self, ops, dtype):
+        self._ops = ops
+        self._dtype = dtype
+        self._plans = {}
+
+    def plan(self, input_shape):
+        """Prepares the buffer for inputs of the given shape, and returns its size in bytes."""
+        input_shape = tuple(input_shape)
+        if input_shape not in self._plans:
+            self._plans[input_shape] = _Plan(self._ops, input_shape, self._dtype)
+        return self._plans[input_shape].nbytes
+
+    def __call__(self, x):
+        plan = self._plans.get(x.shape, None)
+        if plan is None:
+            self.plan(x.shape)
+            plan = self._plans[x.shape]
+        np.copyto(plan.input, x, casting="unsafe")
+        for step in plan.steps:
+            step()
+        return plan.output
+
+
+def freeze(model, input_shape):
+    """Converts a trained model into a NumPy function for inference.
+
+    The parameters of the model are copied, and the layers are converted to
+    kernels such as GEMM, im2col convolution, pooling and activations.
+    The shapes of all intermediate results are computed for ``input_shape``,
+    and the buffers are placed in a single preallocated array, in which
+    buffers which are not used at the same time share memory.
+    Calling the returned function with an input of the same shape
+    does not allocate intermediate arrays or create any Node objects.
+
+    Supported layers are :class:`Sequential`, :class:`Dense`, :class:`Conv2d` (NCHW),
+    :class:`MaxPool2d`, :class:`AveragePool2d`, :class:`BatchNormalize` (inference mode),
+    :class:`Flatten`, :class:`Dropout`, :class:`Relu`, :class:`LeakyRelu`,
+    :class:`Sigmoid`, :class:`Tanh` and :class:`Softmax`.
+
+    Args:
+        model (Model): A trained model, usually a :class:`Sequential`.
+        input_shape (tuple): Shape of the input including the batch size.
+            Inputs of other shapes are accepted, and a buffer is prepared at the first
+            call for each shape.
+
+    Returns:
+        (FrozenModel): The inference function. The returned array is overwritten
+        by the next call.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> model = rm.Sequential([rm.Dense(10), rm.Relu(), rm.Dense(2)])
+        >>> x = np.random.rand(8, 5)
+        >>> _ = model(x)
+        >>> f = rm.freeze(model, x.shape)
+        >>> np.allclose(f(x), model(x).as_ndarray(), atol=1e-5)
+        True
+    """
+    frozen = FrozenModel(_convert(model, precision), precision)
+    frozen.plan(input_shape)
+    return frozen
@@ -2,7 +2,8 @@
 # encoding: utf-8
 
 import numpy as np
-from renom.layers.function.utils import im2col, col2im, out_size, tuplize
+from renom.layers.function.utils import im2col, col2im, out_size, tuplize, \
+    im2col_nhwc, col2im_nhwc, check_layout, NCHW, NHWC
 from renom.core import Node, Variable, to_value
 from renom import precision
 from .parameterized import Parametrized
@@ -11,6 +12,9 @@ import renom.cuda as cu
 if cu.has_cuda():
     from renom.cuda.gpuvalue import GPUValue, get_gpu
 
+# Number of output elements processed at once by depthwise_conv2d.
+_DEPTHWISE_BLOCK_SIZE = 1 << 15
+
 
 class group_conv2d(Node):
 
@@ -142,6 +146,232 @@ class group_conv2d(Node):
             self.attrs._b._update_diff(context, db, **kwargs)
 
 
+class group_conv2d_nhwc(Node):
+    """Grouped 2d convolution for channels-last (NHWC) input on CPU.
+    The filter is held as (out_channel, kernel_h, kernel_w, in_channel // groups).
+    Each group is contracted against the im2col buffer in place, so neither
+    the input nor the output is transposed."""
+
+    def __new__(cls, x, w, b, filter=3, stride=1, padding=0, dilation=1, groups=1):
+        assert not cu.is_cuda_active(), "NHWC layout is only supported on CPU."
+        filter, stride, padding, dilation = (tuplize(x)
+                                             for x in (filter, stride, padding, dilation))
+
+        in_shape = x.shape[1:]
+        out_shape = list(out_size(x.shape[1:3], filter, stride, padding, dilation))
+        out_shape.append(w.shape[0])
+        return cls.calc_value(x, w, b, in_shape, out_shape, filter, stride, padding, dilation, groups)
+
+    @classmethod
+    def _oper_cpu(cls, x, w, b, in_shape, out_shape, kernel, stride, padding, dilation, groups):
+        N = x.shape[0]
+        k_h, k_w = kernel
+        out_h, out_w, out_channels = out_shape
+        iCg = in_shape[2] // groups
+        oCg = out_channels // groups
+
+        col = im2col_nhwc(to_value(x), out_shape[:2], kernel, stride, padding, dilation)
+        col = col.reshape(N * out_h * out_w, k_h * k_w, groups, iCg)
+        w_new = to_value(w).reshape(groups, oCg, k_h * k_w, iCg)
+
+        value = np.einsum('mkgi,goki->mgo', col, w_new, optimize=True)
+        value = value.reshape(N, out_h, out_w, out_channels)
+
+        if b is not None:
+            value += to_value(b).reshape(1, 1, 1, b.size)
+
+        ret = cls._create_node(value)
+        ret.attrs._col = col
+        ret.attrs._x = x
+        ret.attrs._w = w
+        ret.attrs._b = b
+        ret.attrs._in_shape = in_shape
+        ret.attrs._out_shape = out_shape
+        ret.attrs._kernel = kernel
+        ret.attrs._stride = stride
+        ret.attrs._padding = padding
+        ret.attrs._dilation = dilation
+        ret.attrs._groups = groups
+        ret.attrs._iCg = iCg
+        ret.attrs._oCg = oCg
+        return ret
+
+    def _backward_cpu(self, context, dy, **kwargs):
+        N = self.attrs._x.shape[0]
+        groups = self.attrs._groups
+        oCg = self.attrs._oCg
+        iCg = self.attrs._iCg
+        out_h, out_w = self.attrs._out_shape[:2]
+        k_h, k_w = self.attrs._kernel
+        dy = to_value(dy).reshape(N * out_h * out_w, groups, oCg)
+
+        if isinstance(self.attrs._x, Node):
+            w_temp = to_value(self.attrs._w).reshape(groups, oCg, k_h * k_w, iCg)
+            dx = np.einsum('mgo,goki->mkgi', dy, w_temp, optimize=True)
+            dx = dx.reshape(N, out_h, out_w, k_h, k_w, groups * iCg)
+            dx = col2im_nhwc(dx, self.attrs._in_shape[:2], self.attrs._stride,
+                             self.attrs._padding, self.attrs._dilation)
+            self.attrs._x._update_diff(context, dx, **kwargs)
+
+        if isinstance(self.attrs._w, Node):
+            dw = np.einsum('mgo,mkgi->goki', dy, self.attrs._col, optimize=True)
+            dw = dw.reshape(groups * oCg, k_h, k_w, iCg)
+            self.attrs._w._update_diff(context, dw, **kwargs)
+
+        if isinstance(self.attrs._b, Node):
+            db = np.sum(dy, axis=0).reshape(self.attrs._b.shape)
+            self.attrs._b._update_diff(context, db, **kwargs)
+
+
+class depthwise_conv2d(Node):
+    """Depthwise 2d convolution on CPU, the case of groups == input channels.
+
+    Each output channel sees a single input channel, so the output is
+    multiplied and accumulated tap by tap from strided windows of the padded input
+    instead of building the im2col buffer. The output is processed in blocks of
+    rows which fit in the cache. The filter of both layouts is read as
+    (in_channel, multiplier, kernel_h, kernel_w)."""
+
+    def __new__(cls, x, w, b, filter=3, stride=1, padding=0, dilation=1, layout=NCHW):
+        assert not cu.is_cuda_active(), "depthwise_conv2d is only supported on CPU."
+        filter, stride, padding, dilation = (tuplize(x)
+                                             for x in (filter, stride, padding, dilation))
+        return cls.calc_value(x, w, b, filter, stride, padding, dilation, layout)
+
+    @staticmethod
+    def _filter(w, C, kernel):
+        # The filter is flipped as in im2col, which computes a convolution, not a correlation.
+        return to_value(w).reshape(C, -1, kernel[0], kernel[1])[:, :, ::-1, ::-1]
+
+    @staticmethod
+    def _block_rows(row_size):
+        return max(1, _DEPTHWISE_BLOCK_SIZE // row_size)
+
+    @classmethod
+    def _blocks(cls, N, out_shape, row_size):
+        rows = cls._block_rows(row_size)
+        for n in range(N):
+            for r in range(0, out_shape[0], rows):
+                yield n, r, min(r + rows, out_shape[0])
+
+    @staticmethod
+    def _views(attrs, xp, y, n, r0, r1, i, j):
+        # Returns the block of the output y of shape (N, C, M, oh, ow) or (N, oh, ow, C, M),
+        # the window of the input xp for the tap (i, j) and the axis of the multiplier.
+        (s_h, s_w), (d_h, d_w) = attrs["stride"], attrs["dilation"]
+        start = i * d_h + r0 * s_h
+        rows = slice(start, start + s_h * (r1 - r0 - 1) + 1, s_h)
+        cols = slice(j * d_w, j * d_w + s_w * (attrs["out_shape"][1] - 1) + 1, s_w)
+        if attrs["layout"] == NCHW:
+            return y[n, :, :, r0:r1], xp[n, :, rows, cols], 1
+        return y[n, r0:r1], xp[n, rows, cols], 3
+
+    @classmethod
+    def _oper_cpu(cls, x, w, b, kernel, stride, padding, dilation, layout):
+        x_value = to_value(x)
+        if layout == NCHW:
+            N, C, in_h, in_w = x_value.shape
+        else:
+            N, in_h, in_w, C = x_value.shape
+        out_shape = tuple(out_size((in_h, in_w), kernel, stride, padding, dilation))
+        w_value = cls._filter(w, C, kernel)
+        M = w_value.shape[1]
+        attrs = {"stride": stride, "dilation": dilation, "out_shape": out_shape, "layout": layout}
+
+        p_h, p_w = padding
+        if layout == NCHW:
+            xp = np.pad(x_value, ((0, 0), (0, 0), (p_h, p_h), (p_w, p_w)), mode="constant")
+            value = np.empty((N, C, M) + out_shape, dtype=precision)
+        else:
+            xp = np.pad(x_value, ((0, 0), (p_h, p_h), (p_w, p_w), (0, 0)), mode="constant")
+            value = np.empty((N, ) + out_shape + (C, M), dtype=precision)
+
+        # Output channel c * M + m is computed from input channel c.
+        row_size = C * M * out_shape[1]
+        tmp = np.empty(row_size * cls._block_rows(row_size), dtype=precision)
+        for n, r0, r1 in cls._blocks(N, out_shape, row_size):
+            for i in range(kernel[0]):
+                for j in range(kernel[1]):
+                    out, win, axis = cls._views(attrs, xp, value, n, r0, r1, i, j)
+                    win = np.expand_dims(win, axis)
+                    tap = w_value[:, :, i, j]
+                    tap = tap[:, :, None, None] if layout == NCHW else tap
+                    if i == 0 and j == 0:
+                        np.multiply(win, tap, out=out)
+                    else:
+                        buf = tmp[:out.size].reshape(out.shape)
+                        np.multiply(win, tap, out=buf)
+                        out += buf
+
+        if layout == NCHW:
+            value = value.reshape((N, C * M) + out_shape)
+            if b is not None:
+                value += to_value(b).reshape(1, -1, 1, 1)
+        else:
+            value = value.reshape((N, ) + out_shape + (C * M, ))
+            if b is not None:
+                value += to_value(b).reshape(1, 1, 1, -1)
+
+        ret = cls._create_node(value)
+        ret.attrs._xp = xp
+        ret.attrs._x = x
+        ret.attrs._w = w
+        ret.attrs._b = b
+        ret.attrs._kernel = kernel
+        ret.attrs._padding = padding
+        ret.attrs._conv = attrs
+        return ret
+
+    def _backward_cpu(self, context, dy, **kwargs):
+        attrs = self.attrs._conv
+        layout, out_shape = attrs["layout"], attrs["out_shape"]
+        kernel, padding = self.attrs._kernel, self.attrs._padding
+        xp = self.attrs._xp
+        N = xp.shape[0]
+        C = xp.shape[1] if layout == NCHW else xp.shape[3]
+        w_value = self._filter(self.attrs._w, C, kernel)
+        M = w_value.shape[1]
+
+        dy = to_value(dy)
+        if layout == NCHW:
+            dy = dy.reshape((N, C, M) + out_shape)
+            reduce_axes = (0, 3, 4)
+        else:
+            dy = dy.reshape((N, ) + out_shape + (C, M))
+            reduce_axes = (0, 1, 2)
+
+        dxp = np.zeros_like(xp) if isinstance(self.attrs._x, Node) else None
+        dw = np.zeros_like(w_value) if isinstance(self.attrs._w, Node) else None
+        spec = "cmhw,chw->cm" if layout == NCHW else "hwcm,hwc->cm"
+        for n, r0, r1 in self._blocks(N, out_shape, C * M * out_shape[1]):
+            for i in range(kernel[0]):
+                for j in range(kernel[1]):
+                    g, win, axis = self._views(attrs, xp, dy, n, r0, r1, i, j)
+                    if dw is not None:
+                        dw[:, :, i, j] += np.einsum(spec, g, win)
+                    if dxp is not None:
+                        tap = w_value[:, :, i, j]
+                        tap = tap[:, :, None, None] if layout == NCHW else tap
+                        _, dwin, _ = self._views(attrs, dxp, dy, n, r0, r1, i, j)
+                        dwin += np.sum(g * tap, axis=axis) if M > 1 else g.squeeze(axis) * tap.squeeze(1)
+
+        if dxp is not None:
+            p_h, p_w = padding
+            if layout == NCHW:
+                dx = dxp[:, :, p_h:xp.shape[2] - p_h, p_w:xp.shape[3] - p_w]
+            else:
+                dx = dxp[:, p_h:xp.shape[1] - p_h, p_w:xp.shape[2] - p_w]
+            self.attrs._x._update_diff(context, dx, **kwargs)
+
+        if dw is not None:
+            dw = dw[:, :, ::-1, ::-1].reshape(self.attrs._w.shape)
+            self.attrs._w._update_diff(context, dw, **kwargs)
+
+        if isinstance(self.attrs._b, Node):
+            db = np.sum(dy, axis=reduce_axes).reshape(self.attrs._b.shape)
+            self.attrs._b._update_diff(context, db, **kwargs)
+
+
 class GroupConv2d(Parametrized):
     """2d grouped convolution layer.
 
@@ -165,6 +395,8 @@ class GroupConv2d(Parametrized):
         ignore_bias (bool): If `True` is given, bias will not be added.
         initializer (Initializer): Initializer object for weight initialization.
         groups (int): Number of groups to split convolution into. Must be divisor of input and output channels.
+        layout (str): Tensor layout of input and output, 'NCHW' or 'NHWC'.
+            'NHWC' is only available on CPU.
 
     Example:
         >>> import numpy as np
@@ -179,7 +411,12 @@ class GroupConv2d(Parametrized):
         (10, 32, 30, 30)
 
     Note:
-        Tensor data format is **NCHW**.
+        Tensor data format is **NCHW** by default. If ``layout='NHWC'`` is given,
+        input and output are **NHWC** and the filter is held as
+        (Channel, Height, Width, Input channel // groups).
+
+        If ``groups`` equals the number of input channels (depthwise convolution),
+        the convolution on CPU is computed without the im2col buffer.
     """
 
     def __init__(self,
@@ -192,7 +429,8 @@ class GroupConv2d(Parametrized):
                  input_size=None,
                  ignore_bias=False,
                  initializer=GlorotNormal(),
-                 weight_decay=0):
+                 weight_decay=0,
+                 layout=NCHW):
         self._padding, self._stride, self._kernel, self._dilation = (tuplize(x)
                                                                      for x in (padding, stride, filter, dilation))
         self._channel = channel
@@ -203,9 +441,12 @@ class GroupConv2d(Parametrized):
         self._ignore_bias = ignore_bias
         self._initializer = initializer
         self._weight_decay = weight_decay
+        self._layout = check_layout(layout)
         super(GroupConv2d, self).__init__(input_size)
 
     def weight_initiallize(self, input_size):
+        if self._layout == NHWC:
+            input_size = (input_size[2], input_size[0], input_size[1])
         assert (input_size[0] % self._groups) == 0, \
             "Input channels ({}) must be divisible by number of GroupConv2d groups ({})".format(
             input_size[0], self._groups)
@@ -223,11 +464,24 @@ class GroupConv2d(Parametrized):
         if not self._ignore_bias:
             self.params["b"] = Variable(
                 np.zeros((1, self._channel, 1, 1), dtype=precision), auto_update=True)
+        if self._layout == NHWC:
+            self._transpose_params(NCHW, NHWC)
+
+    def _convert_layout(self, layout):
+        check_layout(layout)
+        if self.params:
+            self._transpose_params(self._layout, layout)
+        self._layout = layout
 
     def forward(self, x):
         assert len(x.shape) == 4, "The dimension of input array must be 4. Actual dim is {}".format(x.ndim)
-        assert all([s > 0 for s in x.shape[2:]]), \
+        assert all([s > 0 for s in x.shape[1:]]), \
             "The shape of input array {} is small. Please give an array which size is lager than 0.".format(
                 x.shape)
-        return group_conv2d(x, self.params.w, self.params.get("b", None), self._kernel,
-                            self._stride, self._padding, self._dilation, self._groups)
+        in_channels = x.shape[3] if self._layout == NHWC else x.shape[1]
+        if self._groups == in_channels and not cu.is_cuda_active():
+            return depthwise_conv2d(x, self.params.w, self.params.get("b", None), self._kernel,
+                                    self._stride, self._padding, self._dilation, self._layout)
+        func = group_conv2d_nhwc if self._layout == NHWC else group_conv2d
+        return func(x, self.params.w, self.params.get("b", None), self._kernel,
+                    self._stride, self._padding, self._dilation, self._groups)
@@ -5,11 +5,12 @@ from __future__ import division
 import numpy as np
 from renom.layers.activation.sigmoid import sigmoid
 from renom.layers.activation.tanh import tanh
-from renom.core import Node, Variable, GetItem
+from renom.core import Node, Variable, GetItem, to_value
 from renom import precision
 from renom.operation import dot, sum, concat
 from renom.utility.initializer import GlorotNormal
 from .parameterized import Parametrized
+from .packed_sequence import PackedSequence, _forward_padded, _step_offsets, _add_leading
 import renom.cuda as cu
 if cu.has_cuda():
     from renom.cuda.gpuvalue import get_gpu
@@ -260,3 +261,171 @@ class Gru(Parametrized):
     def truncate(self):
         """Truncates temporal connection."""
         self._z = None
+
+
+class fused_gru(Node):
+    """Gru over a whole sequence on CPU.
+
+    The input is either a dense array of shape (T, N, D) or the data of a
+    :class:`PackedSequence` of shape (sum of lengths, D) with its
+    ``batch_sizes``. The input projection of all timesteps is computed
+    with one GEMM and the recurrence runs over preallocated buffers.
+    Backward runs the backpropagation through time inside this node.
+    """
+
+    def __new__(cls, x, w, u, b, pz=None, truncate_steps=None, batch_sizes=None):
+        assert not cu.is_cuda_active(), "fused_gru is only supported on CPU."
+        return cls.calc_value(x, w, u, b, pz, truncate_steps, batch_sizes)
+
+    @classmethod
+    def _oper_cpu(cls, x, w, u, b, pz, truncate_steps, batch_sizes):
+        offsets = _step_offsets(x.shape, batch_sizes)
+        m = w.shape[1] // 3
+        u_z, u_r, u_h = np.split(to_value(u), [m, m * 2], axis=1)
+
+        # Preactivations A, B and C of all timesteps.
+        abc = np.dot(to_value(x).reshape(offsets[-1], -1), to_value(w))
+        if b is not None:
+            abc += to_value(b)
+
+        z = np.empty((len(abc), m), dtype=abc.dtype)
+        # Output which each row received from the previous timestep.
+        pz_rows = np.empty_like(z)
+        h = np.zeros((offsets[1], m), dtype=abc.dtype) if pz is None else to_value(pz)
+
+        for t in range(len(offsets) - 1):
+            s, e = offsets[t], offsets[t + 1]
+            hminus = pz_rows[s:e]
+            hminus[...] = h[:e - s]
+            a = abc[s:e]
+            a[:, :m] += hminus * u_z
+            a[:, m:m * 2] += hminus * u_r
+            a[:, m * 2:] += sigmoid(a[:, m:m * 2]) * u_h * hminus
+            z[s:e] = sigmoid(a[:, :m]) + tanh(a[:, m * 2:])
+            h = z[s:e]
+
+        ret = cls._create_node(z if batch_sizes is not None else z.reshape(x.shape[:2] + (m, )))
+        ret.attrs._x = x
+        ret.attrs._w = w
+        ret.attrs._u = u
+        ret.attrs._b = b
+        ret.attrs._abc = abc
+        ret.attrs._pz_rows = pz_rows
+        ret.attrs._offsets = offsets
+        ret._last = h
+        ret.attrs._truncate_steps = truncate_steps
+        return ret
+
+    def _backward_cpu(self, context, dy, **kwargs):
+        x = self.attrs._x
+        w = self.attrs._w
+        u = self.attrs._u
+        b = self.attrs._b
+        abc = self.attrs._abc
+        hminus = self.attrs._pz_rows
+        offsets = self.attrs._offsets
+        k = self.attrs._truncate_steps
+        m = hminus.shape[1]
+        u_z, u_r, u_h = np.split(to_value(u), [m, m * 2], axis=1)
+        dy = to_value(dy).reshape(-1, m)
+
+        sB = sigmoid(abc[:, m:m * 2])
+        dabc = np.empty_like(abc)
+        dh = None
+        for t in range(len(offsets) - 2, -1, -1):
+            s, e = offsets[t], offsets[t + 1]
+            y = _add_leading(dy[s:e].copy(), dh)
+            dA = y * sigmoid_diff(abc[s:e, :m])
+            dC = y * tanh_diff(abc[s:e, m * 2:])
+            dB = dC * sigmoid_diff(abc[s:e, m:m * 2]) * u_h * hminus[s:e]
+            dabc[s:e, :m] = dA
+            dabc[s:e, m:m * 2] = dB
+            dabc[s:e, m * 2:] = dC
+
+            if k and t % k == 0:
+                dh = None
+            else:
+                dh = dA * u_z + dB * u_r + dC * sB[s:e] * u_h
+
+        if isinstance(u, Node):
+            du = np.concatenate([
+                np.sum(dabc[:, :m] * hminus, axis=0),
+                np.sum(dabc[:, m:m * 2] * hminus, axis=0),
+                np.sum(dabc[:, m * 2:] * sB * hminus, axis=0)]).reshape(u.shape)
+            u._update_diff(context, du, **kwargs)
+
+        if isinstance(x, Node):
+            x._update_diff(context, np.dot(dabc, to_value(w).T).reshape(x.shape), **kwargs)
+
+        if isinstance(w, Node):
+            w._update_diff(context, np.dot(to_value(x).reshape(len(dabc), -1).T, dabc), **kwargs)
+
+        if isinstance(b, Node):
+            b._update_diff(context, np.sum(dabc, axis=0, keepdims=True), **kwargs)
+
+
+class FusedGru(Gru):
+    '''Gated Recurrent Unit which processes a whole sequence at once.
+
+    This layer computes the same function as :class:`Gru` applied to every
+    timestep of an input of shape (T, N, D), and returns the outputs of
+    all timesteps as an array of shape (T, N, output_size).
+
+    The last output is kept and used as the initial state of the next call
+    until :meth:`truncate` is called. The gradient is not propagated to
+    previous calls.
+
+    A :class:`PackedSequence` of variable length sequences is also accepted.
+    Then the active batch shrinks as sequences finish and a PackedSequence
+    of the outputs is returned. Packed sequences always start from zero state.
+
+    Args:
+        output_size (int): Output unit size.
+        input_size (int): Input unit size.
+        ignore_bias (bool): If True is given, bias will not be added.
+        initializer (Initializer): Initializer object for weight initialization.
+        truncate_steps (int): If given, the gradient is propagated
+            through at most this number of timesteps.
+
+    Note:
+        On GPU, this layer runs :class:`Gru` for each timestep and
+        ``truncate_steps`` is not used.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> t, n, d = (4, 2, 3)
+        >>> x = rm.Variable(np.random.rand(t, n, d))
+        >>> layer = rm.FusedGru(2)
+        >>> z = rm.sum(layer(x))
+        >>> grad = z.grad()
+        >>> grad.get(x).shape
+        (4, 2, 3)
+        >>> layer.truncate()
+    '''
+
+    def __init__(self, output_size, input_size=None, ignore_bias=False, initializer=GlorotNormal(),
+                 weight_decay=0, truncate_steps=None):
+        self._truncate_steps = truncate_steps
+        super(FusedGru, self).__init__(output_size, input_size, ignore_bias, initializer, weight_decay)
+
+    def weight_initiallize(self, size_i):
+        super(FusedGru, self).weight_initiallize(size_i[-1:])
+
+    def forward(self, x):
+        if isinstance(x, PackedSequence):
+            if cu.is_cuda_active():
+                return _forward_padded(self, x)
+            return x.with_data(fused_gru(x.data, self.params.w, self.params.u, self.params.get("b", None),
+                                         truncate_steps=self._truncate_steps, batch_sizes=x.batch_sizes))
+
+        assert len(x.shape) == 3, "Input must be 3 dimensional array of shape (T, N, D)."
+        if cu.is_cuda_active():
+            step = super(FusedGru, self).forward
+            return concat([step(x[t]).reshape(1, x.shape[1], self._size_o)
+                           for t in range(x.shape[0])], axis=0)
+
+        ret = fused_gru(x, self.params.w, self.params.u, self.params.get("b", None),
+                        getattr(self, "_z", None), self._truncate_steps)
+        self._z = ret._last
+        return ret
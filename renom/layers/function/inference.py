@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import numpy as np
+from renom.core import Variable, to_value
+from renom.layers.function.parameterized import Sequential
+from renom.layers.function.dense import Dense
+from renom.layers.function.conv2d import Conv2d
+from renom.layers.function.group_conv2d import GroupConv2d
+from renom.layers.function.batch_normalize import BatchNormalize
+from renom.layers.function.dropout import Dropout
+
+
+def _output_axis(layer):
+    # Axis of the output channels of the weight.
+    return 1 if isinstance(layer, Dense) else 0
+
+
+def _bn_scale_shift(bn):
+    # Inference mode batch normalization is z = x * scale + shift.
+    w = bn.params["w"].as_ndarray()
+    b = bn.params["b"].as_ndarray() if "b" in bn.params else 0
+    scale = w / np.sqrt(np.asarray(to_value(bn._mov_std)) + bn._epsilon)
+    shift = b - np.asarray(to_value(bn._mov_mean)) * scale
+    return np.broadcast_to(scale, w.shape), np.broadcast_to(shift, w.shape)
+
+
+def _can_fold(layer, bn):
+    if not isinstance(layer, (Dense, Conv2d, GroupConv2d)) or not isinstance(bn, BatchNormalize):
+        return False
+    if not layer.params or not bn.params:
+        return False
+    if getattr(layer, "_layout", bn._layout) != bn._layout:
+        return False
+    # Only a per channel affine transformation can be folded.
+    return bn.params["w"].size == layer.params["w"].shape[_output_axis(layer)]
+
+
+def _fold_batch_normalize(layer, bn):
+    scale, shift = _bn_scale_shift(bn)
+    w = layer.params["w"]
+    shape = [1] * w.ndim
+    shape[_output_axis(layer)] = -1
+    new_w = w.as_ndarray() * scale.reshape(shape)
+    layer.params["w"] = Variable(new_w.astype(w.dtype), auto_update=w._auto_update,
+                                 weight_decay=w.weight_decay)
+
+    b = layer.params.get("b", None)
+    new_b = shift if b is None else b.as_ndarray().reshape(scale.shape) * scale + shift
+    layer.params["b"] = Variable(new_b.astype(w.dtype), auto_update=True)
+
+
+def _optimize_sequential(seq):
+    layers = []
+    for layer in seq._layers:
+        if isinstance(layer, Dropout):
+            continue
+        if layers and _can_fold(layers[-1], layer):
+            _fold_batch_normalize(layers[-1], layer)
+            continue
+        layers.append(layer)
+
+    for i in range(len(seq._layers)):
+        delattr(seq, "l%d" % i)
+    seq._layers = []
+    for layer in layers:
+        seq.append(layer)
+
+
+def optimize_for_inference(model):
+    """Optimizes a trained model for inference.
+
+    The model is switched to inference mode and then the following
+    transformations are applied to every :class:`Sequential` found in the model.
+
+    * :class:`BatchNormalize` directly following :class:`Dense`, :class:`Conv2d` or
+      :class:`GroupConv2d` is folded into the weight and the bias of the
+      preceding layer, and removed.
+    * :class:`Dropout` and :class:`SpatialDropout` are removed.
+
+    Layers held by user defined models are called from their own ``forward`` method,
+    so they are only switched to inference mode. Dropout is an identity
+    in inference mode.
+
+    The model is modified in place. The optimized model is meant to be used for
+    prediction only. Moving averages of removed BatchNormalize layers are not kept.
+
+    Args:
+        model (Model): A trained model.
+
+    Returns:
+        (Model): The given model.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> model = rm.Sequential([
+        ...     rm.Conv2d(8),
+        ...     rm.BatchNormalize(mode="feature"),
+        ...     rm.Relu(),
+        ...     rm.Dropout(),
+        ...     rm.Flatten(),
+        ...     rm.Dense(10),
+        ... ])
+        >>> x = np.random.rand(4, 3, 8, 8)
+        >>> _ = model(x)
+        >>> model.set_models(inference=True)
+        >>> z1 = model(x)
+        >>> model = rm.optimize_for_inference(model)
+        >>> len(model._layers)
+        4
+        >>> np.allclose(z1, model(x), atol=1e-5)
+        True
+    """
+    model.set_models(inference=True)
+    for m in list(model.iter_models()):
+        if isinstance(m, Sequential):
+            _optimize_sequential(m)
+    return model
@@ -6,6 +6,7 @@ import renom.cuda as cu
 if cu.has_cuda():
     from renom.cuda.gpuvalue import get_gpu
 from renom.layers.function.parameterized import Parametrized
+from renom.layers.function.utils import sum_of_products
 import renom as rm
 
 
@@ -15,10 +16,12 @@ class l2_norm(Node):
 
     @classmethod
     def _oper_cpu(cls, x, w):
-        norm = np.sqrt(np.sum(x * x, axis=1, keepdims=True)) + 1e-5
-        z = (x / norm) * w
+        norm = np.sqrt(sum_of_products(x, x, axis=1)) + 1e-5
+        normalized = to_value(x) / norm
+        z = normalized * to_value(w)
         ret = cls._create_node(z)
         ret.attrs._norm = norm
+        ret.attrs._normalized = normalized
         ret.attrs._x = x
         ret.attrs._w = w
         return ret
@@ -35,14 +38,21 @@ class l2_norm(Node):
 
     def _backward_cpu(self, context, dy, **kwargs):
         norm = self.attrs._norm
+        normalized = self.attrs._normalized
+        dy = to_value(dy)
         if isinstance(self.attrs._x, Node):
-            dx = dy * norm - (np.sum(self.attrs._x * dy, axis=1,
-                                     keepdims=True) * self.attrs._x) / norm
-            dx = dx / (norm * norm)
-            self.attrs._x._update_diff(context, dx * self.attrs._w, **kwargs)
+            # dx = (g - normalized * sum(g * normalized) * norm / l2) / norm,
+            # where g = dy * w and l2 = norm - 1e-5.
+            l2 = norm - 1e-5
+            scale = np.divide(norm, l2, out=np.ones_like(norm), where=l2 > 0)
+            g = dy * to_value(self.attrs._w)
+            dx = normalized * (-sum_of_products(g, normalized, axis=1) * scale)
+            dx += g
+            dx /= norm
+            self.attrs._x._update_diff(context, dx, **kwargs)
         if isinstance(self.attrs._w, Node):
-            dl = dy * (self.attrs._x / norm)
-            self.attrs._w._update_diff(context, np.sum(dl, axis=(0, 2, 3), keepdims=True), **kwargs)
+            self.attrs._w._update_diff(context, sum_of_products(
+                dy, normalized, axis=(0, 2, 3)), **kwargs)
 
     def _backward_gpu(self, context, dy, **kwargs):
         norm = self.attrs._norm
@@ -4,9 +4,10 @@ import numpy as np
 import renom.cuda as cu
 if cu.has_cuda():
     from renom.cuda.gpuvalue import get_gpu
-from renom.core import Node, Variable
+from renom.core import Node, Variable, to_value
 import renom.operation as op
 from .parameterized import Parametrized
+from .utils import moments, sum_of_products
 
 
 def get_std_distribution(x):
@@ -59,11 +60,14 @@ class layer_normalize(Node):
     def _oper_cpu(cls, x, gain, bias):
         assert len(x.shape) is 2 or len(x.shape) is 4, \
             "Currently only normalizes for dense and 2d convolutional networks."
-        mu = get_mu(x)
-        sigma = get_sigma(x, mu) + 1e-5
-        normalized = (x - mu) / sigma
-        # ret = cls._create_node(normalized)# * gain + bias)
-        ret = cls._create_node(normalized * gain + bias)
+        _ax = tuple(range(1, len(x.shape)))
+        mu, var = moments(x, _ax)
+        sigma = np.sqrt(var) + 1e-5
+        normalized = to_value(x) - mu
+        normalized /= sigma
+        z = normalized * to_value(gain)
+        z += to_value(bias)
+        ret = cls._create_node(z)
         ret.attrs._x = x
         ret.attrs._mu = mu
         ret.attrs._normalized = normalized
@@ -94,25 +98,27 @@ class layer_normalize(Node):
         return ret
 
     def _backward_cpu(self, context, dy, **kwargs):
-        x = self.attrs._x
-        mu = self.attrs._mu
+        normalized = self.attrs._normalized
         sigma = self.attrs._sigma
-        gain = self.attrs._gain
-        sigma_diff = get_sigma_diff(x)
-        mu_diff = get_mu_diff(x)
-        _ax = tuple([r for r in range(1, len(x.shape[1:]) + 1)])
-        dx = dy / sigma \
-            - sigma_diff * np.sum(x * dy, axis=_ax, keepdims=True) / np.power(sigma, 2) \
-            - np.sum(mu_diff * dy, axis=_ax, keepdims=True) / sigma \
-            + sigma_diff * np.sum(dy, axis=_ax, keepdims=True) * mu / np.power(sigma, 2)
-        dx *= gain
+        dy = to_value(dy)
 
         if isinstance(self.attrs._x, Node):
+            # dx = (g - mean(g) - normalized * mean(g * normalized) * sigma / std) / sigma,
+            # where g = dy * gain and std = sigma - 1e-5.
+            _ax = tuple(range(1, dy.ndim))
+            H = np.prod(dy.shape[1:])
+            std = sigma - 1e-5
+            scale = np.divide(sigma, std, out=np.ones_like(sigma), where=std > 0)
+            g = dy * to_value(self.attrs._gain)
+            dx = normalized * (-sum_of_products(g, normalized, _ax) * scale / H)
+            dx += g
+            dx -= np.sum(g, axis=_ax, keepdims=True) / H
+            dx /= sigma
             self.attrs._x._update_diff(context, dx, **kwargs)
 
         if isinstance(self.attrs._gain, Node):
-            self.attrs._gain._update_diff(context, np.sum(
-                self.attrs._normalized * dy, axis=0, keepdims=True), **kwargs)
+            self.attrs._gain._update_diff(context, sum_of_products(
+                normalized, dy, axis=0), **kwargs)
 
         if isinstance(self.attrs._bias, Node):
             self.attrs._bias._update_diff(context, np.sum(dy, axis=0, keepdims=True), **kwargs)
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import numpy as np
+from renom.core import Node, to_value
+from renom.operation import concat
+
+
+def _padded_index(lengths, sorted_indices):
+    # Row of the flattened (T * N) padded array for each packed row.
+    sorted_lengths = lengths[sorted_indices]
+    T = sorted_lengths[0]
+    mask = np.arange(T)[:, None] < sorted_lengths[None, :]
+    return (np.arange(T)[:, None] * len(lengths) + sorted_indices[None, :])[mask]
+
+
+class PackedSequence(object):
+    """Batch of variable length sequences without padding.
+
+    Sequences are sorted by their length in descending order and stored
+    time-major, so the rows of timestep ``t`` are
+    ``data[offsets[t]:offsets[t] + batch_sizes[t]]`` and the active batch
+    shrinks as sequences finish.
+
+    Use :func:`pack_sequence` or :func:`pack_padded` for creating an instance.
+    :class:`FusedLstm`, :class:`FusedGru` and :class:`FusedPeepholeLstm`
+    accept a PackedSequence and return a PackedSequence of their outputs.
+
+    Args:
+        data (Node, ndarray): Packed array of shape (sum of lengths, D).
+        lengths (ndarray): Length of each sequence in original order.
+        sorted_indices (ndarray): Original index of each sorted sequence.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> x = [np.random.rand(l, 3) for l in (2, 4, 3)]
+        >>> packed = rm.pack_sequence(x)
+        >>> packed.batch_sizes
+        array([3, 3, 2, 1])
+        >>> packed.data.shape
+        (9, 3)
+        >>> rm.pad_packed(packed).shape
+        (4, 3, 3)
+    """
+
+    def __init__(self, data, lengths, sorted_indices):
+        self.data = data
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.sorted_indices = np.asarray(sorted_indices, dtype=np.int64)
+        sorted_lengths = self.lengths[self.sorted_indices]
+        self.batch_sizes = np.sum(
+            np.arange(sorted_lengths[0])[:, None] < sorted_lengths[None, :], axis=1)
+        assert len(data) == np.sum(self.lengths), \
+            "The length of data {} must be sum of lengths {}.".format(len(data), np.sum(self.lengths))
+
+    @property
+    def shape(self):
+        """Shape of ``data``."""
+        return self.data.shape
+
+    @property
+    def ndim(self):
+        return self.data.ndim
+
+    @property
+    def offsets(self):
+        """Start row of each timestep in ``data``."""
+        return np.concatenate([[0], np.cumsum(self.batch_sizes)[:-1]])
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def with_data(self, data):
+        """Returns a PackedSequence which has the same structure and the given data."""
+        return PackedSequence(data, self.lengths, self.sorted_indices)
+
+    def last_step(self):
+        """Returns the data of the last timestep of each sequence in original order.
+
+        Returns:
+            (Node, ndarray): Array of shape (N, D).
+        """
+        rank = np.empty_like(self.sorted_indices)
+        rank[self.sorted_indices] = np.arange(len(self.sorted_indices))
+        return self.data[self.offsets[self.lengths - 1] + rank]
+
+
+def pack_padded(x, lengths):
+    """Packs a padded time-major batch of sequences.
+
+    Args:
+        x (Node, ndarray): Padded array of shape (T, N, D).
+        lengths (ndarray): Length of each sequence.
+
+    Returns:
+        (PackedSequence): Packed sequences. Gradient is propagated to ``x``.
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    assert x.ndim >= 2 and x.shape[1] == len(lengths), \
+        "The shape of x {} does not match the number of lengths {}.".format(x.shape, len(lengths))
+    assert np.max(lengths) <= x.shape[0] and np.min(lengths) > 0, \
+        "Lengths must be in the range of [1, {}].".format(x.shape[0])
+    sorted_indices = np.argsort(-lengths, kind="mergesort")
+    T = int(np.max(lengths))
+    if T < x.shape[0]:
+        x = x[:T]
+    flat = x.reshape(T * x.shape[1], *x.shape[2:])
+    return PackedSequence(flat[_padded_index(lengths, sorted_indices)], lengths, sorted_indices)
+
+
+def pack_sequence(sequences):
+    """Packs a list of sequences which have different lengths.
+
+    Args:
+        sequences (list): List of arrays of shape (L_i, D).
+
+    Returns:
+        (PackedSequence): Packed sequences.
+    """
+    lengths = np.array([len(s) for s in sequences], dtype=np.int64)
+    first = to_value(sequences[0])
+    padded = np.zeros((np.max(lengths), len(sequences)) + first.shape[1:], dtype=first.dtype)
+    for i, s in enumerate(sequences):
+        padded[:len(s), i] = to_value(s)
+    return pack_padded(padded, lengths)
+
+
+def pad_packed(packed, total_length=None):
+    """Converts a PackedSequence into a padded time-major array.
+
+    Padded positions are filled with 0.
+
+    Args:
+        packed (PackedSequence): Packed sequences.
+        total_length (int): Length of the time axis. The longest length is used if None.
+
+    Returns:
+        (Node, ndarray): Array of shape (T, N, D) in original order.
+            Gradient is propagated to ``packed.data``.
+    """
+    T = int(np.max(packed.lengths)) if total_length is None else total_length
+    assert T >= np.max(packed.lengths), "total_length must not be less than the longest length."
+    N = len(packed.lengths)
+    data = packed.data
+    total = len(data)
+    index = np.full(T * N, total, dtype=np.int64)
+    index[_padded_index(packed.lengths, packed.sorted_indices)] = np.arange(total)
+    zero = np.zeros((1, ) + data.shape[1:], dtype=data.dtype)
+    if isinstance(data, Node):
+        flat = concat(data, zero, axis=0)[index]
+    else:
+        flat = np.concatenate([data, zero], axis=0)[index]
+    return flat.reshape(T, N, *data.shape[1:])
+
+
+def sequence_mask(lengths, total_length=None, dtype=np.float32):
+    """Returns a mask of valid timesteps for a padded time-major batch.
+
+    Args:
+        lengths (ndarray): Length of each sequence.
+        total_length (int): Length of the time axis. The longest length is used if None.
+
+    Returns:
+        (ndarray): Mask of shape (T, N). Valid positions are 1 and padded positions are 0.
+
+    Example:
+        >>> import renom as rm
+        >>> rm.sequence_mask([2, 3])
+        array([[1., 1.],
+               [1., 1.],
+               [0., 1.]], dtype=float32)
+    """
+    lengths = np.asarray(lengths)
+    T = int(np.max(lengths)) if total_length is None else total_length
+    return (np.arange(T)[:, None] < lengths[None, :]).astype(dtype)
+
+
+def _step_offsets(shape, batch_sizes=None):
+    # Start rows of each timestep in time-major flattened rows. A dense
+    # (T, N, D) input is a packed input whose batch sizes are all N.
+    if batch_sizes is None:
+        batch_sizes = np.full(shape[0], shape[1], dtype=np.int64)
+    return np.concatenate([[0], np.cumsum(batch_sizes)])
+
+
+def _add_leading(x, y):
+    # The batch of a timestep is never larger than the batch of the
+    # previous timestep, so y is added to the leading rows of x.
+    if y is not None:
+        x[:len(y)] += y
+    return x
+
+
+def _forward_padded(layer, x):
+    # Runs the dense forward of a recurrent layer on a padded PackedSequence.
+    # Like the packed kernels, it starts from zero state and keeps the state
+    # carried by the layer.
+    saved = dict((k, layer.__dict__.pop(k)) for k in ("_z", "_state") if k in layer.__dict__)
+    try:
+        return pack_padded(layer.forward(pad_packed(x)), x.lengths)
+    finally:
+        layer.__dict__.pop("_z", None)
+        layer.__dict__.pop("_state", None)
+        layer.__dict__.update(saved)
@@ -5,10 +5,12 @@ from __future__ import print_function
 from abc import ABCMeta, abstractmethod
 from contextlib import contextmanager
 import inspect
+import itertools
 import weakref
 import copy
 import numpy as np
 from renom.core import Node, Variable
+from renom.layers.function.utils import check_layout, transpose_layout
 import renom.cuda
 
 if renom.cuda.has_cuda():
@@ -27,6 +29,7 @@ class ModelParams(dict):
 
     def update(self, map):
         super(ModelParams, self).update(map)
+        Model._invalidate_registry()
         for v in map.values():
             if isinstance(v, Node):
                 v.set_model(self.model)
@@ -36,6 +39,7 @@ class ModelParams(dict):
 
     def __setattr__(self, name, value):
         super(ModelParams, self).__setitem__(name, value)
+        Model._invalidate_registry()
         if isinstance(value, Node):
             value.set_model(self.model)
         else:
@@ -48,6 +52,30 @@ class ModelParams(dict):
             raise AttributeError('%r has no attribute %r' % (self, name))
 
 
+class _ParameterRegistry(object):
+    """Flattened models and parameters of a model tree.
+
+    Models are keyed by the tuple of attribute names from the root, parameters
+    by their dotted names. The root model itself is not held, so the registry
+    can be cached in a weak dictionary keyed by the root.
+    """
+
+    def __init__(self, model):
+        self.version = Model._registry_version
+        self.children = []
+        self.params = []
+        for name, m in model.get_models('root'):
+            names = tuple(name.split('.'))
+            if m is not model:
+                self.children.append((names, m))
+            if m.params:
+                prefix = '.'.join(names[1:] + ('', ))
+                self.params.extend((prefix + k, v) for k, v in m.params.items())
+
+
+_registries = weakref.WeakKeyDictionary()
+
+
 class Model(with_metaclass(ABCMeta, object)):
     """Abstract class of neural network model."""
 
@@ -59,10 +87,59 @@ class Model(with_metaclass(ABCMeta, object)):
 
     _model_hook = None
 
+    # Incremented whenever a child model or a parameter of any model is replaced.
+    _registry_version = 0
+
     @classmethod
     def set_hook(cls, context):
         cls._model_hook = context
 
+    @staticmethod
+    def _invalidate_registry():
+        Model._registry_version += 1
+
+    def __setattr__(self, name, value):
+        if isinstance(value, Model) or isinstance(self.__dict__.get(name, None), Model):
+            Model._invalidate_registry()
+        super(Model, self).__setattr__(name, value)
+
+    def __delattr__(self, name):
+        if isinstance(self.__dict__.get(name, None), Model):
+            Model._invalidate_registry()
+        super(Model, self).__delattr__(name)
+
+    def _registry(self):
+        registry = _registries.get(self, None)
+        if registry is None or registry.version != Model._registry_version:
+            registry = _ParameterRegistry(self)
+            _registries[self] = registry
+        return registry
+
+    def _named_models(self):
+        yield ('root', ), self
+        for c in self._registry().children:
+            yield c
+
+    def named_parameters(self):
+        """Iterates over the parameters of this model and its child models.
+
+        The flattened list of parameters is cached, and rebuilt only after
+        a child model or a parameter has been replaced, for example when the weights are
+        initialized at the first call.
+
+        Yields:
+            (str, Node): Dotted name of the parameter, such as 'layer1.w', and the parameter.
+
+        Example:
+            >>> import numpy as np
+            >>> import renom as rm
+            >>> model = rm.Sequential([rm.Dense(3), rm.Dense(2)])
+            >>> _ = model(np.random.rand(1, 4))
+            >>> [name for name, p in model.named_parameters()]
+            ['l0.w', 'l0.b', 'l1.w', 'l1.b']
+        """
+        return iter(self._registry().params)
+
     @property
     def params(self):
         if not self._parameters:
@@ -113,20 +190,31 @@ class Model(with_metaclass(ABCMeta, object)):
         pass
 
     def copy_params(self, model):
-        value_list = model.flatten_values()
-        with use_device(self._device_id):
-            for names, values, attrs in value_list:
-                layer = self
-                for name in names[1:]:
-                    layer = getattr(layer, name)
-
-                for k, v in values.items():
-                    if k in layer.params:
-                        layer.params[k].copy_from(v)
-                    else:
-                        layer.params[k] = v.copy()
+        """Copies parameters of the given model, which has the same structure, to this model.
 
-                    layer.params[k]._auto_update = v._auto_update
+        Parameters record a version which is changed whenever they are updated
+        by :meth:`Grads.update <renom.core.Grads.update>` or ``copy_from``. Only parameters
+        updated in either model since they were last copied to this model are transferred,
+        so parameters of frozen or prevent_update models are copied only once.
+
+        Args:
+            model (Model): Source model.
+        """
+        layers = dict(self._named_models())
+        with use_device(self._device_id):
+            for names, src in model._named_models():
+                if not src.params:
+                    continue
+                layer = layers[names]
+                for k, v in list(src.params.items()):
+                    dst = layer.params.get(k, None)
+                    if dst is None:
+                        dst = layer.params[k] = v.copy()
+                    elif not v._version or dst._synced_version != (id(v), v._version, dst._version):
+                        dst.copy_from(v)
+                    # Versions of both sides, so that an update of this model is also overwritten.
+                    dst._synced_version = (id(v), v._version, dst._version)
+                    dst._auto_update = v._auto_update
 
     def sync(self):
         if is_cuda_active():
@@ -302,28 +390,20 @@ class Model(with_metaclass(ABCMeta, object)):
         return ret
 
     def flatten_values(self):
-        values = self.values()
         value_list = []
-
-        def flatten(names, values):
-            value_list.append((names, values[1], values[2]))
-
-            for name, child_values in values[0].items():
-                flatten(names + (name,), child_values)
-
-        flatten(('root',), values)
+        for names, m in self._named_models():
+            params = dict(m.params) if m.params else {}
+            attrs = {name: getattr(m, name) for name in getattr(m, "SERIALIZED", ()) if hasattr(m, name)}
+            value_list.append((names, params, attrs))
         return value_list
 
     def _get_grads(self, grads):
         "Get gradients of attribute of this model"
-        value_list = self.flatten_values()
-
         d = {}
-        for name, values, attrs in value_list:
-            for k, v in values.items():
-                diff = grads.get(v, None)
-                if diff is not None:
-                    d[(name, k)] = diff
+        for name, v in self.named_parameters():
+            diff = grads.get(v, None)
+            if diff is not None:
+                d[name] = diff
         return d
 
     def join_grads(self, grads, others):
@@ -331,12 +411,12 @@ class Model(with_metaclass(ABCMeta, object)):
         Others is a list of tuple of (model, grads) to be merged.
         Models listed in the others should have same structure with self."""
 
-        values = {name: params for name, params, attrs in self.flatten_values()}
+        values = dict(self.named_parameters())
         for model, _grads in others:
             o = model._get_grads(_grads)
 
-            for (name, attrname), diff in o.items():
-                obj = values[name][attrname]
+            for name, diff in o.items():
+                obj = values[name]
                 curdiff = grads.get(obj, None)
                 if curdiff is not None:
                     if not isinstance(curdiff, Node):
@@ -353,11 +433,51 @@ class Model(with_metaclass(ABCMeta, object)):
 
                 grads.set(obj, newdiff)
 
-    def save(self, filename):
+    def summary(self, input_shape, batch_size=1, verbose=True):
+        """Prints and returns a summary of the model for an input shape.
+
+        One forward pass is traced in training mode with random input. For each call of
+        this model, its child models and the layers of :class:`Sequential` which are not
+        models, the output shape, the number and bytes of the parameters, the bytes of
+        activations kept for backward and estimated forward and backward FLOPs are given.
+        Numbers of a model do not include those of its child models. Attributes replaced
+        while tracing, such as moving averages of :class:`BatchNormalize`, are restored.
+
+        Args:
+            input_shape (tuple): Shape of an input sample without the batch axis.
+            batch_size (int): Batch size of the traced input. Layers such as
+                :class:`BatchNormalize` need more than one sample in training mode, so
+                for a batch of 1 the numbers are extrapolated from batches of 2 and 4.
+            verbose (bool): If True, the summary is printed as a table.
+
+        Returns:
+            (ModelSummary): Per layer values in ``layers`` and their sums in ``total``.
+            See :class:`renom.utility.summary.ModelSummary`.
+
+        Example:
+            >>> import renom as rm
+            >>> model = rm.Sequential([rm.Dense(100), rm.Relu(), rm.Dense(10)])
+            >>> summary = model.summary((50, ), batch_size=32, verbose=False)
+            >>> summary.total["params"]
+            6110
+            >>> [layer["output_shape"] for layer in summary.layers]
+            [(32, 10), (32, 100), (32, 100), (32, 10)]
+        """
+        from renom.utility.summary import summarize
+        summary = summarize(self, input_shape, batch_size)
+        if verbose:
+            print(summary)
+        return summary
+
+    def save(self, filename, format="hdf5"):
         """Save model attributes.
         For save attributes, please register attributes to the dictionary
         which is named as 'SERIALIZED'.
 
+        If format is 'flat', the model is saved in the flat checkpoint format of
+        :mod:`renom.utility.checkpoint`. All arrays are written in a single aligned
+        blob indexed by a JSON header, so the file can be loaded with ``mmap=True``.
+
         Following example shows how to do it.
 
         Example:
@@ -390,8 +510,15 @@ class Model(with_metaclass(ABCMeta, object)):
 
         Args:
             filename (str): File name to save model.
+            format (str): 'hdf5' or 'flat'.
 
         """
+        assert format in ("hdf5", "flat"), "Format must be 'hdf5' or 'flat'. Actual is {}".format(format)
+        if format == "flat":
+            from renom.utility.checkpoint import save_checkpoint
+            save_checkpoint(self, filename)
+            return
+
         import h5py
 
         value_list = self.flatten_values()
@@ -421,16 +548,27 @@ class Model(with_metaclass(ABCMeta, object)):
                     else:
                         g['__dict__.' + propname] = propvalue
 
-    def load(self, filename):
+    def load(self, filename, mmap=False):
         """Load saved weights to model.
 
+        Both of hdf5 files and flat checkpoint files are loaded. The format is
+        detected from the file.
+
         Args:
             filename (str): File name of saved model.
+            mmap (bool): If True, a flat checkpoint file is memory mapped and
+                the parameters are loaded lazily when they are accessed.
+                Ignored for hdf5 files.
 
         Example:
             >>> model = rm.Dense(2)
             >>> model.load("model.hd5")
         """
+        from renom.utility.checkpoint import is_checkpoint, load_checkpoint
+        if is_checkpoint(filename):
+            load_checkpoint(self, filename, mmap=mmap)
+            return
+
         import h5py
         f = h5py.File(filename, 'r')
         values = f['values']
@@ -453,12 +591,17 @@ class Model(with_metaclass(ABCMeta, object)):
             types_grp = types[name]
 
             for k, v in values_grp.items():
-                v = v.value
+                v = v[()]
+                if isinstance(v, bytes):
+                    v = v.decode()
                 if isinstance(v, np.ndarray):
                     type = types_grp.get(k, None)
                     if type:
-                        if type.value == 'renom.Variable':
-                            auto_update = types_grp[k + '._auto_update'].value
+                        type = type[()]
+                        if isinstance(type, bytes):
+                            type = type.decode()
+                        if type == 'renom.Variable':
+                            auto_update = types_grp[k + '._auto_update'][()]
                             v = Variable(v, auto_update=auto_update)
                         else:
                             v = Node(v)
@@ -495,6 +638,41 @@ class Model(with_metaclass(ABCMeta, object)):
             if isinstance(c, Parametrized):
                 c.truncate()
 
+    def set_layout(self, layout):
+        """Switches the tensor layout of the image layers of this model.
+
+        Conv2d, GroupConv2d, BatchNormalize, MaxPool2d, AveragePool2d and Flatten
+        found in this model are switched to the given layout and already initialized
+        weights are transposed accordingly, so a whole network can run
+        in channels-last layout without transposing activations between layers.
+
+        Args:
+            layout (str): 'NCHW' or 'NHWC'. 'NHWC' is only available on CPU.
+
+        Example:
+            >>> import numpy as np
+            >>> import renom as rm
+            >>> model = rm.Sequential([
+            ...     rm.Conv2d(8),
+            ...     rm.MaxPool2d(filter=2, stride=2),
+            ...     rm.Flatten(),
+            ...     rm.Dense(10),
+            ... ])
+            >>> x = np.random.rand(4, 3, 32, 32)
+            >>> z1 = model(x)
+            >>> model.set_layout("NHWC")
+            >>> z2 = model(x.transpose(0, 2, 3, 1))
+            >>> np.allclose(z1, z2)
+            True
+        """
+        check_layout(layout)
+        done = set()
+        for c in self.iter_models():
+            for obj in itertools.chain((c, ), c.__dict__.values(), getattr(c, "_layers", ())):
+                if id(obj) not in done and hasattr(obj, "_convert_layout"):
+                    done.add(id(obj))
+                    obj._convert_layout(layout)
+
 
 class Sequential(Model):
     """Sequential model.
@@ -530,9 +708,16 @@ class Sequential(Model):
         setattr(self, "l%d" % (len(self._layers)), layer)
         self._layers.append(layer)
 
-    def summary(self):
-        print("---------------------------------")
-        print("summary will be printed out soon.")
+    def _convert_layout(self, layout):
+        # Rows of a dense weight following Flatten are indexed by the
+        # flattened element order, which depends on the layout.
+        for prev, layer in zip(self._layers[:-1], self._layers[1:]):
+            permute = getattr(prev, "_permute_flattened", None)
+            if permute is None or not isinstance(layer, Parametrized) or "w" not in layer.params:
+                continue
+            w = layer.params.w
+            layer.params.w = Variable(permute(w.as_ndarray(), layout),
+                                      auto_update=w._auto_update, weight_decay=w.weight_decay)
 
     def forward(self, x):
         t = x
@@ -562,3 +747,8 @@ class Parametrized(Model):
 
     def truncate(self):
         pass
+
+    def _transpose_params(self, src, dst):
+        for k, v in list(self.params.items()):
+            self.params[k] = Variable(transpose_layout(v.as_ndarray(), src, dst),
+                                      auto_update=v._auto_update, weight_decay=v.weight_decay)
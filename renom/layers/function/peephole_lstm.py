@@ -10,6 +10,7 @@ from renom import precision
 import renom.operation as op
 from renom.utility.initializer import GlorotNormal
 from .parameterized import Parametrized
+from .packed_sequence import PackedSequence, _forward_padded, _step_offsets, _add_leading
 import renom.cuda as cu
 if cu.has_cuda():
     from renom.cuda.gpuvalue import GPUValue, get_gpu
@@ -296,3 +297,199 @@ class PeepholeLstm(Parametrized):
         """Truncates temporal connection."""
         self._z = None
         self._state = None
+
+
+class fused_peephole_lstm(Node):
+    """PeepholeLstm over a whole sequence on CPU.
+
+    The input is either a dense array of shape (T, N, D) or the data of a
+    :class:`PackedSequence` of shape (sum of lengths, D) with its
+    ``batch_sizes``. The input projection of all timesteps is computed
+    with one GEMM and the recurrence runs over preallocated buffers.
+    Backward runs the backpropagation through time inside this node and
+    computes the weight gradients with one GEMM each.
+    """
+
+    def __new__(cls, x, w, wr, wc, b, pz=None, ps=None, truncate_steps=None, batch_sizes=None):
+        assert not cu.is_cuda_active(), "fused_peephole_lstm is only supported on CPU."
+        return cls.calc_value(x, w, wr, wc, b, pz, ps, truncate_steps, batch_sizes)
+
+    @classmethod
+    def _oper_cpu(cls, x, w, wr, wc, b, pz, ps, truncate_steps, batch_sizes):
+        offsets = _step_offsets(x.shape, batch_sizes)
+        m = w.shape[1] // 4
+        wr_ = to_value(wr)
+        wc_ = to_value(wc)
+
+        # Preactivations of all timesteps. Activations are written back in place.
+        act = np.dot(to_value(x).reshape(offsets[-1], -1), to_value(w))
+        if b is not None:
+            act += to_value(b)
+
+        z = np.empty((len(act), m), dtype=act.dtype)
+        state = np.empty_like(z)
+        # Output and state which each row received from the previous timestep.
+        pz_rows = np.empty_like(z)
+        ps_rows = np.empty_like(z)
+        h = np.zeros((offsets[1], m), dtype=act.dtype) if pz is None else to_value(pz)
+        c = np.zeros((offsets[1], m), dtype=act.dtype) if ps is None else to_value(ps)
+
+        for t in range(len(offsets) - 1):
+            s, e = offsets[t], offsets[t + 1]
+            pz_rows[s:e] = h[:e - s]
+            ps_rows[s:e] = c[:e - s]
+            a = act[s:e]
+            a += np.dot(pz_rows[s:e], wr_)
+            np.tanh(a[:, :m], out=a[:, :m])
+            a[:, m:m * 3] = gate(a[:, m:m * 3] + np.tile(ps_rows[s:e], 2) * wc_[:, :m * 2])
+            state[s:e] = a[:, m * 2:m * 3] * a[:, :m] + a[:, m:m * 2] * ps_rows[s:e]
+            a[:, m * 3:] = gate(state[s:e] * wc_[:, m * 2:] + a[:, m * 3:])
+            z[s:e] = activation(state[s:e]) * a[:, m * 3:]
+            h = z[s:e]
+            c = state[s:e]
+
+        ret = cls._create_node(z if batch_sizes is not None else z.reshape(x.shape[:2] + (m, )))
+        ret.attrs._x = x
+        ret.attrs._w = w
+        ret.attrs._wr = wr
+        ret.attrs._wc = wc
+        ret.attrs._b = b
+        ret.attrs._act = act
+        ret.attrs._state = state
+        ret.attrs._pz_rows = pz_rows
+        ret.attrs._ps_rows = ps_rows
+        ret.attrs._offsets = offsets
+        ret._last = (h, c)
+        ret.attrs._truncate_steps = truncate_steps
+        return ret
+
+    def _backward_cpu(self, context, dy, **kwargs):
+        x = self.attrs._x
+        w = self.attrs._w
+        wr = self.attrs._wr
+        wc = self.attrs._wc
+        b = self.attrs._b
+        act = self.attrs._act
+        state = self.attrs._state
+        ps_rows = self.attrs._ps_rows
+        offsets = self.attrs._offsets
+        k = self.attrs._truncate_steps
+        m = state.shape[1]
+        wr_ = to_value(wr)
+        wc_ = to_value(wc)
+        dy = to_value(dy).reshape(-1, m)
+
+        dr = np.empty_like(act)
+        dh = None
+        dc = None
+        for t in range(len(offsets) - 2, -1, -1):
+            s, e = offsets[t], offsets[t + 1]
+            u = act[s:e, :m]
+            fg = act[s:e, m:m * 2]
+            ig = act[s:e, m * 2:m * 3]
+            og = act[s:e, m * 3:]
+            st = activation(state[s:e])
+
+            de = _add_leading(dy[s:e].copy(), dh)
+            do = de * st * gate_diff(og)
+            dc = _add_leading(de * og * activation_diff(st) + do * wc_[:, m * 2:], dc)
+            df = dc * gate_diff(fg) * ps_rows[s:e]
+            di = dc * gate_diff(ig) * u
+            dr[s:e, :m] = dc * activation_diff(u) * ig
+            dr[s:e, m:m * 2] = df
+            dr[s:e, m * 2:m * 3] = di
+            dr[s:e, m * 3:] = do
+
+            if k and t % k == 0:
+                dh = None
+                dc = None
+            else:
+                dh = np.dot(dr[s:e], wr_.T)
+                dc = dc * fg + df * wc_[:, :m] + di * wc_[:, m:m * 2]
+
+        if isinstance(wc, Node):
+            dwc = np.concatenate([
+                np.sum(dr[:, m:m * 3] * np.tile(ps_rows, 2), axis=0),
+                np.sum(dr[:, m * 3:] * state, axis=0)]).reshape(wc.shape)
+            wc._update_diff(context, dwc, **kwargs)
+
+        if isinstance(x, Node):
+            x._update_diff(context, np.dot(dr, to_value(w).T).reshape(x.shape), **kwargs)
+
+        if isinstance(w, Node):
+            w._update_diff(context, np.dot(to_value(x).reshape(len(dr), -1).T, dr), **kwargs)
+
+        if isinstance(wr, Node):
+            wr._update_diff(context, np.dot(self.attrs._pz_rows.T, dr), **kwargs)
+
+        if isinstance(b, Node):
+            b._update_diff(context, np.sum(dr, axis=0, keepdims=True), **kwargs)
+
+
+class FusedPeepholeLstm(PeepholeLstm):
+    '''Long short time memory with peephole which processes a whole sequence at once.
+
+    This layer computes the same function as :class:`PeepholeLstm` applied to
+    every timestep of an input of shape (T, N, D), and returns the outputs
+    of all timesteps as an array of shape (T, N, output_size).
+
+    The last output and state are kept and used as the initial state of the
+    next call until :meth:`truncate` is called. The gradient is not
+    propagated to previous calls.
+
+    A :class:`PackedSequence` of variable length sequences is also accepted.
+    Then the active batch shrinks as sequences finish and a PackedSequence
+    of the outputs is returned. Packed sequences always start from zero state.
+
+    Args:
+        output_size (int): Output unit size.
+        input_size (int): Input unit size.
+        truncate_steps (int): If given, the gradient is propagated
+            through at most this number of timesteps.
+
+    Note:
+        On GPU, this layer runs :class:`PeepholeLstm` for each timestep and
+        ``truncate_steps`` is not used.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>>
+        >>> t, n, d = (4, 2, 3)
+        >>> x = rm.Variable(np.random.rand(t, n, d))
+        >>> layer = rm.FusedPeepholeLstm(2)
+        >>> z = rm.sum(layer(x))
+        >>> grad = z.grad()
+        >>> grad.get(x).shape
+        (4, 2, 3)
+        >>> layer.truncate()
+    '''
+
+    def __init__(self, output_size, input_size=None, ignore_bias=False, initializer=GlorotNormal(),
+                 weight_decay=0, truncate_steps=None):
+        self._truncate_steps = truncate_steps
+        super(FusedPeepholeLstm, self).__init__(output_size, input_size, ignore_bias, initializer, weight_decay)
+
+    def weight_initiallize(self, size_i):
+        super(FusedPeepholeLstm, self).weight_initiallize(size_i[-1:])
+
+    def forward(self, x):
+        if isinstance(x, PackedSequence):
+            if cu.is_cuda_active():
+                return _forward_padded(self, x)
+            return x.with_data(fused_peephole_lstm(x.data, self.params.w, self.params.wr, self.params.wc,
+                                                   self.params.get("b", None),
+                                                   truncate_steps=self._truncate_steps,
+                                                   batch_sizes=x.batch_sizes))
+
+        assert len(x.shape) == 3, "Input must be 3 dimensional array of shape (T, N, D)."
+        if cu.is_cuda_active():
+            step = super(FusedPeepholeLstm, self).forward
+            return op.concat([step(x[t]).reshape(1, x.shape[1], self._size_o)
+                              for t in range(x.shape[0])], axis=0)
+
+        ret = fused_peephole_lstm(x, self.params.w, self.params.wr, self.params.wc,
+                                  self.params.get("b", None), self.__dict__.get("_z", None),
+                                  self.__dict__.get("_state", None), self._truncate_steps)
+        self._z, self._state = ret._last
+        return ret
@@ -3,8 +3,9 @@
 
 from __future__ import division
 import numpy as np
-from renom.core import Node
-from renom.layers.function.utils import im2col, col2im, out_size, tuplize
+from renom.core import Node, to_value
+from renom.layers.function.utils import im2col, col2im, out_size, tuplize, \
+    im2col_nhwc, col2im_nhwc, check_layout, NCHW, NHWC
 import renom.cuda as cu
 if cu.has_cuda():
     from renom.cuda.gpuvalue import GPUValue, get_gpu
@@ -123,19 +124,93 @@ class average_pool2d(pool_base):
             self.attrs._x._update_diff(context, dx, **kwargs)
 
 
+class pool_base_nhwc(Node):
+
+    def __new__(cls, x, filter=3, stride=1, padding=0, ceil_mode=False):
+        assert not cu.is_cuda_active(), "NHWC layout is only supported on CPU."
+        filter, stride, padding = (tuplize(x) for x in (filter, stride, padding))
+        in_shape = x.shape[1:]
+        out_shape = list(out_size(x.shape[1:3], filter, stride, padding, ceil_mode=ceil_mode))
+        out_shape.append(x.shape[3])
+        return cls.calc_value(x, in_shape, out_shape, filter, stride, padding)
+
+    @classmethod
+    def _col(cls, x, out_shape, karnel, stride, padding):
+        col = im2col_nhwc(to_value(x), out_shape[:2], karnel, stride, padding)
+        n, oh, ow, kh, kw, c = col.shape
+        return col.reshape(n, oh, ow, kh * kw, c)
+
+    def _create_attrs(self, x, in_shape, out_shape, karnel, stride, padding):
+        self.attrs._x = x
+        self.attrs._in_shape = in_shape
+        self.attrs._out_shape = out_shape
+        self.attrs._kernel = karnel
+        self.attrs._stride = stride
+        self.attrs._padding = padding
+
+    def _col2im(self, col):
+        n, oh, ow, _, c = col.shape
+        col = col.reshape(n, oh, ow, self.attrs._kernel[0], self.attrs._kernel[1], c)
+        return col2im_nhwc(col, self.attrs._in_shape[:2], self.attrs._stride, self.attrs._padding)
+
+
+class max_pool2d_nhwc(pool_base_nhwc):
+
+    @classmethod
+    def _oper_cpu(cls, x, in_shape, out_shape, karnel, stride, padding):
+        col = cls._col(x, out_shape, karnel, stride, padding)
+        index = np.argmax(col, axis=3)
+        value = np.take_along_axis(col, index[:, :, :, None], axis=3)[:, :, :, 0]
+        ret = cls._create_node(value)
+        ret._create_attrs(x, in_shape, out_shape, karnel, stride, padding)
+        ret.attrs._index = index
+        return ret
+
+    def _backward_cpu(self, context, dy, **kwargs):
+        if isinstance(self.attrs._x, Node):
+            n, oh, ow, c = dy.shape
+            col = np.zeros((n, oh, ow, self.attrs._kernel[0] * self.attrs._kernel[1], c),
+                           dtype=dy.dtype)
+            np.put_along_axis(col, self.attrs._index[:, :, :, None],
+                              to_value(dy)[:, :, :, None], axis=3)
+            self.attrs._x._update_diff(context, self._col2im(col), **kwargs)
+
+
+class average_pool2d_nhwc(pool_base_nhwc):
+
+    @classmethod
+    def _oper_cpu(cls, x, in_shape, out_shape, karnel, stride, padding):
+        col = cls._col(x, out_shape, karnel, stride, padding)
+        value = np.mean(col, axis=3)
+        ret = cls._create_node(value)
+        ret._create_attrs(x, in_shape, out_shape, karnel, stride, padding)
+        return ret
+
+    def _backward_cpu(self, context, dy, **kwargs):
+        if isinstance(self.attrs._x, Node):
+            n, oh, ow, c = dy.shape
+            k = self.attrs._kernel[0] * self.attrs._kernel[1]
+            col = np.broadcast_to(to_value(dy)[:, :, :, None] / float(k), (n, oh, ow, k, c))
+            self.attrs._x._update_diff(context, self._col2im(col), **kwargs)
+
+
 class PoolBase(object):
 
     def __init__(self, filter=3,
-                 padding=0, stride=1):
+                 padding=0, stride=1, layout=NCHW):
         self._padding, self._stride, self._kernel = (tuplize(x) for x in (padding, stride, filter))
+        self._layout = check_layout(layout)
 
     def __call__(self, x):
         assert len(x.shape) == 4, "The dimension of input array must be 4. Actual dim is {}".format(x.ndim)
-        assert all([s > 0 for s in x.shape[2:]]), \
+        assert all([s > 0 for s in x.shape[1:]]), \
             "The shape of input array {} is too small. Please give an array which size is lager than 0.".format(
                 x.shape)
         return self.forward(x)
 
+    def _convert_layout(self, layout):
+        self._layout = check_layout(layout)
+
 
 class MaxPool2d(PoolBase):
     '''Max pooling function.
@@ -145,6 +220,8 @@ class MaxPool2d(PoolBase):
         filter (tuple,int): Filter size of the convolution kernel.
         padding (tuple,int): Size of the zero-padding around the image.
         stride (tuple,int): Stride-size of the convolution.
+        layout (str): Tensor layout of input and output, 'NCHW' or 'NHWC'.
+            'NHWC' is only available on CPU.
 
     Example:
         >>> import numpy as np
@@ -162,7 +239,8 @@ class MaxPool2d(PoolBase):
     '''
 
     def forward(self, x):
-        return max_pool2d(x, self._kernel, self._stride, self._padding)
+        func = max_pool2d_nhwc if self._layout == NHWC else max_pool2d
+        return func(x, self._kernel, self._stride, self._padding)
 
 
 class AveragePool2d(PoolBase):
@@ -173,6 +251,8 @@ class AveragePool2d(PoolBase):
         filter (tuple,int): Filter size of the convolution kernel.
         padding (tuple,int): Size of the zero-padding around the image.
         stride (tuple,int): Stride-size of the convolution.
+        layout (str): Tensor layout of input and output, 'NCHW' or 'NHWC'.
+            'NHWC' is only available on CPU.
 
     Example:
         >>> import numpy as np
@@ -190,4 +270,5 @@ class AveragePool2d(PoolBase):
     '''
 
     def forward(self, x):
-        return average_pool2d(x, self._kernel, self._stride, self._padding)
+        func = average_pool2d_nhwc if self._layout == NHWC else average_pool2d
+        return func(x, self._kernel, self._stride, self._padding)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import copy
+import numpy as np
+import scipy.sparse
+from renom.core import Node, Variable, to_value
+from renom.layers.function.parameterized import Model, Sequential
+from renom.layers.function.dense import Dense
+import renom.cuda as cu
+if cu.has_cuda():
+    from renom.cuda.gpuvalue import get_gpu
+
+
+def _prunable(model, layer_types):
+    return [m for m in model.iter_models()
+            if isinstance(m, layer_types) and m.params and "w" in m.params]
+
+
+def prune(model, sparsity, scope="global", layer_types=(Dense, )):
+    """Magnitude pruning of weights.
+
+    The weights ``w`` of the layers of ``layer_types`` whose absolute values are the smallest
+    are set to 0. A mask is attached to each pruned weight, and the optimizer
+    update keeps the pruned weights 0 while the model is fine-tuned.
+    Pruning an already pruned model increases its sparsity, so
+    sparsity can be raised gradually between fine-tuning epochs.
+
+    Args:
+        model (Model): A trained model.
+        sparsity (float): Ratio of weights to be pruned, in the range of [0, 1).
+        scope (str): If 'global', a single threshold is computed over the weights of all
+            layers. If 'layer', each layer is pruned to the given sparsity.
+        layer_types (tuple): Classes of layers to be pruned.
+
+    Returns:
+        (Model): The given model.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> model = rm.Sequential([rm.Dense(100), rm.Relu(), rm.Dense(10)])
+        >>> _ = model(np.random.rand(2, 50))
+        >>> _ = rm.prune(model, 0.9)
+        >>> float(np.mean(model[0].params.w.as_ndarray() == 0)) > 0.85
+        True
+    """
+    assert 0 <= sparsity < 1, "Sparsity must be in the range of [0, 1). Actual is {}".format(sparsity)
+    assert scope in ("global", "layer"), "Scope must be 'global' or 'layer'. Actual is {}".format(scope)
+    layers = _prunable(model, layer_types)
+    if not layers:
+        return model
+
+    # The k smallest absolute values are below the k-th value of the partitioned weights.
+    weights = [np.abs(ly.params["w"].as_ndarray()) for ly in layers]
+    if scope == "global":
+        values = np.concatenate([w.ravel() for w in weights])
+        k = int(len(values) * sparsity)
+        thresholds = [np.partition(values, k)[k]] * len(layers)
+    else:
+        thresholds = [np.partition(w.ravel(), int(w.size * sparsity))[int(w.size * sparsity)]
+                      for w in weights]
+
+    for ly, w, threshold in zip(layers, weights, thresholds):
+        param = ly.params["w"]
+        mask = w >= threshold
+        if param._prune_mask is not None:
+            mask &= param._prune_mask.astype(bool)
+        param._prune_mask = mask.astype(param.dtype)
+        param.to_cpu()
+        param.release_gpu()
+        param.copy_from(param.as_ndarray() * param._prune_mask)
+    return model
+
+
+def remove_pruning(model):
+    """Removes the masks attached by :func:`prune`. Pruned weights are kept 0
+    until they are updated."""
+    for m in model.iter_models():
+        for v in m.params.values():
+            if isinstance(v, Variable):
+                v._prune_mask = None
+                v._prune_mask_gpu = None
+    return model
+
+
+class sparse_dense(Node):
+
+    def __new__(cls, x, w, b):
+        return cls.calc_value(x, w, b)
+
+    @classmethod
+    def _oper_cpu(cls, x, w, b):
+        # w is the transposed weight in csr format, so each output unit is a row.
+        z = w.dot(np.ascontiguousarray(to_value(x).T)).T
+        if b is not None:
+            z = z + to_value(b)
+        return cls._create_node(z)
+
+    @classmethod
+    def _oper_gpu(cls, x, w, b):
+        # There is no sparse kernel for gpu, so it is computed on cpu.
+        return cls._create_node(get_gpu(to_value(cls._oper_cpu(x, w, b))))
+
+    def _backward_cpu(self, context, dy, **kwargs):
+        # Sparse ops are for inference only. Gradients are not propagated.
+        pass
+
+    def _backward_gpu(self, context, dy, **kwargs):
+        pass
+
+
+class SparseDense(Model):
+    """Dense layer for inference whose weight is held in CSR format.
+
+    Zero weights are skipped in the matrix product, so a pruned
+    dense layer runs faster and uses less memory.
+
+    Args:
+        layer (Dense): A dense layer. Usually it has been pruned by :func:`prune`.
+    """
+
+    def __init__(self, layer):
+        self._w = scipy.sparse.csr_matrix(layer.params["w"].as_ndarray().T)
+        if "b" in layer.params:
+            self.params = {"b": Variable(layer.params["b"].as_ndarray(), auto_update=False)}
+
+    @property
+    def sparsity(self):
+        """Ratio of zero weights."""
+        return 1 - self._w.nnz / np.prod(self._w.shape)
+
+    def forward(self, x):
+        return sparse_dense(x, self._w, self.params.get("b", None))
+
+
+def sparsify(model, min_sparsity=0.5):
+    """Converts pruned Dense layers into :class:`SparseDense` for inference.
+
+    Args:
+        model (Model): A pruned model.
+        min_sparsity (float): Dense layers whose ratio of zero weights is at least this value
+            are converted. Dense matrix products are faster at low sparsity.
+
+    Returns:
+        (Model): Converted copy of the model. The given model is not modified.
+    """
+    converted = copy.deepcopy(model)
+    for parent in list(converted.iter_models()):
+        for name, child in list(parent.get_model_children()):
+            if type(child) is not Dense or not child.params:
+                continue
+            if np.mean(child.params["w"].as_ndarray() == 0) < min_sparsity:
+                continue
+            layer = SparseDense(child)
+            setattr(parent, name, layer)
+            if isinstance(parent, Sequential):
+                parent._layers = [layer if ly is child else ly for ly in parent._layers]
+    return converted
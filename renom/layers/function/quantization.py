@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import copy
+import numpy as np
+from renom.core import Node, Variable, to_value
+from renom.layers.function.parameterized import Model, Sequential
+from renom.layers.function.dense import Dense
+from renom.layers.function.conv2d import Conv2d
+from renom.layers.function.utils import im2col, im2col_nhwc, out_size, NHWC
+import renom.cuda as cu
+if cu.has_cuda():
+    from renom.cuda.gpuvalue import get_gpu
+
+_QMAX = 127
+
+# Number of elements of the float32 buffer a chunk of int8 weight is expanded to.
+_CHUNK_SIZE = 1 << 18
+
+
+def quantize_per_channel(w, axis=0):
+    """Quantizes an array into int8 symmetrically for each channel of ``axis``.
+
+    Args:
+        w (ndarray): Array to be quantized.
+        axis (int): Channel axis. Each channel has its own scale.
+
+    Returns:
+        (tuple): int8 array and float32 scale which keeps the dimensions of ``w``.
+        ``w`` is approximated by ``q * scale``.
+    """
+    w = to_value(w)
+    reduce = tuple(i for i in range(w.ndim) if i != axis % w.ndim)
+    amax = np.max(np.abs(w), axis=reduce, keepdims=True)
+    scale = np.where(amax > 0, amax / _QMAX, 1).astype(np.float32)
+    q = np.clip(np.rint(w / scale), -_QMAX, _QMAX).astype(np.int8)
+    return q, scale
+
+
+def _quantize_input(x, scale):
+    # Integer valued float32 array in the range of int8.
+    xq = np.asarray(to_value(x), dtype=np.float32) / scale
+    np.rint(xq, out=xq)
+    return np.clip(xq, -_QMAX, _QMAX, out=xq)
+
+
+def _expanded_chunks(wq):
+    # numpy has no int8 gemm, so chunks of output channels of wq are expanded
+    # into a small float32 buffer and multiplied by BLAS. Products of int8 values
+    # are exact in float32, but sums are accumulated in float32 too. They are exact
+    # only below 2 ** 24, which K > 2 ** 24 / 127 ** 2 (about 1040) can exceed, so
+    # large sums have float32 rounding unlike an int32 accumulator. The rounding
+    # is much smaller than the quantization error.
+    O, K = wq.shape
+    chunk = max(1, _CHUNK_SIZE // K)
+    buf = np.empty((min(chunk, O), K), dtype=np.float32)
+    for i in range(0, O, chunk):
+        w = buf[:len(wq[i:i + chunk])]
+        w[...] = wq[i:i + chunk]
+        yield slice(i, i + chunk), w
+
+
+def _int8_dot(xq, wq):
+    # np.dot(xq, wq.T) for xq of shape (M, K) and wq of shape (O, K).
+    out = np.empty((len(xq), len(wq)), dtype=np.float32)
+    for s, w in _expanded_chunks(wq):
+        out[:, s] = np.dot(xq, w.T)
+    return out
+
+
+class _quantized_op(Node):
+
+    @classmethod
+    def _oper_gpu(cls, *args):
+        # There is no int8 kernel for gpu, so it is computed on cpu.
+        return cls._create_node(get_gpu(to_value(cls._oper_cpu(*args))))
+
+    def _backward_cpu(self, context, dy, **kwargs):
+        # Quantized ops are for inference only. Gradients are not propagated.
+        pass
+
+    def _backward_gpu(self, context, dy, **kwargs):
+        pass
+
+
+class quantized_dense(_quantized_op):
+
+    def __new__(cls, x, wq, w_scale, x_scale, b):
+        return cls.calc_value(x, wq, w_scale, x_scale, b)
+
+    @classmethod
+    def _oper_cpu(cls, x, wq, w_scale, x_scale, b):
+        xq = _quantize_input(x, x_scale)
+        z = _int8_dot(xq, wq)
+        z *= (w_scale * x_scale).reshape(1, -1)
+        if b is not None:
+            z += to_value(b)
+        return cls._create_node(z)
+
+
+class quantized_conv2d(_quantized_op):
+
+    def __new__(cls, x, wq, w_scale, x_scale, b, kernel, stride, padding, dilation, layout):
+        return cls.calc_value(x, wq, w_scale, x_scale, b, kernel, stride, padding, dilation, layout)
+
+    @classmethod
+    def _oper_cpu(cls, x, wq, w_scale, x_scale, b, kernel, stride, padding, dilation, layout):
+        xq = _quantize_input(x, x_scale)
+        N = x.shape[0]
+        if layout == NHWC:
+            size = out_size(x.shape[1:3], kernel, stride, padding, dilation)
+            col = im2col_nhwc(xq, size, kernel, stride, padding, dilation)
+            z = _int8_dot(col.reshape(-1, wq.shape[1]), wq)
+            z = z.reshape(N, size[0], size[1], -1)
+            z *= (w_scale * x_scale).reshape(1, 1, 1, -1)
+        else:
+            size = out_size(x.shape[2:], kernel, stride, padding, dilation)
+            col = im2col(xq, size, kernel, stride, padding, dilation)
+            col = col.reshape(N, wq.shape[1], -1)
+            z = np.empty((N, len(wq), col.shape[2]), dtype=np.float32)
+            for s, w in _expanded_chunks(wq):
+                z[:, s] = np.matmul(w, col)
+            z = z.reshape(N, -1, size[0], size[1])
+            z *= (w_scale * x_scale).reshape(1, -1, 1, 1)
+        if b is not None:
+            z += to_value(b)
+        return cls._create_node(z)
+
+
+class QuantizedDense(Model):
+    """Dense layer for inference whose weight is quantized into int8.
+
+    The weight is quantized per output unit and the input is quantized
+    with a single scale calibrated by :func:`quantize`. The product is
+    computed on the int8 values and dequantized at the output.
+
+    Args:
+        layer (Dense): A trained dense layer.
+        input_scale (float): Scale of the input. Inputs are quantized into
+            ``round(x / input_scale)`` clipped to [-127, 127].
+    """
+
+    SERIALIZED = ("_wq", "_w_scale", "_x_scale")
+
+    def __init__(self, layer, input_scale):
+        w = layer.params["w"].as_ndarray()
+        wq, w_scale = quantize_per_channel(w, axis=1)
+        # Held as (output, input) so that a chunk of output units is contiguous.
+        self._wq = np.ascontiguousarray(wq.T)
+        self._w_scale = w_scale.ravel()
+        self._x_scale = np.float32(input_scale)
+        if "b" in layer.params:
+            self.params = {"b": Variable(layer.params["b"].as_ndarray(), auto_update=False)}
+
+    def forward(self, x):
+        return quantized_dense(x, self._wq, self._w_scale, self._x_scale, self.params.get("b", None))
+
+
+class QuantizedConv2d(Model):
+    """2d convolution layer for inference whose filter is quantized into int8.
+
+    The filter is quantized per output channel. See :class:`QuantizedDense`.
+
+    Args:
+        layer (Conv2d): A trained convolution layer.
+        input_scale (float): Scale of the input.
+    """
+
+    SERIALIZED = ("_wq", "_w_scale", "_x_scale")
+
+    def __init__(self, layer, input_scale):
+        wq, w_scale = quantize_per_channel(layer.params["w"].as_ndarray(), axis=0)
+        self._wq = wq.reshape(len(wq), -1)
+        self._w_scale = w_scale.ravel()
+        self._x_scale = np.float32(input_scale)
+        self._kernel = layer._kernel
+        self._stride = layer._stride
+        self._padding = layer._padding
+        self._dilation = layer._dilation
+        self._layout = layer._layout
+        if "b" in layer.params:
+            self.params = {"b": Variable(layer.params["b"].as_ndarray(), auto_update=False)}
+
+    def forward(self, x):
+        return quantized_conv2d(x, self._wq, self._w_scale, self._x_scale, self.params.get("b", None),
+                                self._kernel, self._stride, self._padding, self._dilation, self._layout)
+
+
+_QUANTIZED = {Dense: QuantizedDense, Conv2d: QuantizedConv2d}
+
+
+class _CalibrationHook(object):
+    # Records the largest absolute input of quantizable layers.
+
+    def __init__(self):
+        self.ranges = {}
+
+    def call_enter(self, model, x, args, kwargs):
+        if type(model) in _QUANTIZED:
+            amax = float(np.max(np.abs(to_value(x))))
+            self.ranges[id(model)] = max(self.ranges.get(id(model), 0.), amax)
+        return x, args, kwargs
+
+    def call_leave(self, model, ret, x, args, kwargs):
+        return ret
+
+    def on_forward(self, model, forward, x, args, kwargs):
+        return forward(x, *args, **kwargs)
+
+
+def _calibration_batches(distributor, batch_size, steps):
+    for i, (x, _) in enumerate(distributor.batch(batch_size, shuffle=False)):
+        if steps is not None and i >= steps:
+            break
+        yield x
+
+
+def quantize(model, distributor, batch_size=64, steps=None):
+    """Post training quantization of Dense and Conv2d layers.
+
+    The input range of every :class:`Dense` and :class:`Conv2d` layer is
+    calibrated by running the model on the data of ``distributor``.
+    Then a copy of the model is made and these layers are replaced with
+    :class:`QuantizedDense` and :class:`QuantizedConv2d`, which hold int8
+    weights with a float32 scale per output channel.
+
+    Calibration runs the model in inference mode. It is recommended to apply
+    :func:`optimize_for_inference` beforehand, so BatchNormalize is folded
+    into the weights before they are quantized.
+
+    Args:
+        model (Model): A trained model.
+        distributor (Distributor): Calibration data, for example :class:`NdarrayDistributor`.
+        batch_size (int): Batch size of calibration.
+        steps (int): Number of calibration batches. All data is used if None.
+
+    Returns:
+        (Model): Quantized copy of the model. The given model is not modified.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> x = np.random.rand(100, 10)
+        >>> y = np.random.rand(100, 1)
+        >>> model = rm.Sequential([rm.Dense(32), rm.Relu(), rm.Dense(1)])
+        >>> _ = model(x)
+        >>> qmodel = rm.quantize(model, rm.NdarrayDistributor(x, y))
+        >>> qmodel[0]
+        <renom.layers.function.quantization.QuantizedDense object at ...>
+        >>> report = rm.quantization_report(model, qmodel, rm.NdarrayDistributor(x, y))
+    """
+    model.set_models(inference=True)
+    hook = _CalibrationHook()
+    prev_hook = Model._model_hook
+    Model.set_hook(hook)
+    try:
+        for x in _calibration_batches(distributor, batch_size, steps):
+            model(x)
+    finally:
+        Model.set_hook(prev_hook)
+
+    quantized = copy.deepcopy(model)
+    for parent, copied in list(zip(model.iter_models(), quantized.iter_models())):
+        for name, child in list(copied.get_model_children()):
+            orig = getattr(parent, name)
+            if type(child) not in _QUANTIZED or id(orig) not in hook.ranges:
+                continue
+            scale = max(hook.ranges[id(orig)], np.finfo(np.float32).tiny) / _QMAX
+            qlayer = _QUANTIZED[type(child)](child, scale)
+            setattr(copied, name, qlayer)
+            if isinstance(copied, Sequential):
+                copied._layers = [qlayer if ly is child else ly for ly in copied._layers]
+    return quantized
+
+
+def quantization_report(model, quantized, distributor, batch_size=64, steps=None):
+    """Compares outputs of a model and its quantized copy.
+
+    Args:
+        model (Model): The original model.
+        quantized (Model): The model returned by :func:`quantize`.
+        distributor (Distributor): Evaluation data.
+        batch_size (int): Batch size.
+        steps (int): Number of batches. All data is used if None.
+
+    Returns:
+        (dict): ``max_abs_error`` and ``mean_abs_error`` of the outputs,
+        ``relative_error`` which is the ratio of the norm of the error
+        to the norm of the outputs, and ``top1_agreement`` which is the
+        ratio of samples whose argmax over the last axis agree.
+    """
+    model.set_models(inference=True)
+    quantized.set_models(inference=True)
+    max_err = sum_err = sq_err = sq_ref = 0.
+    count = agree = samples = 0
+    for x in _calibration_batches(distributor, batch_size, steps):
+        ref = to_value(model(x)).astype(np.float64)
+        out = to_value(quantized(x))
+        diff = np.abs(out - ref)
+        max_err = max(max_err, float(np.max(diff)))
+        sum_err += float(np.sum(diff))
+        sq_err += float(np.sum(diff * diff))
+        sq_ref += float(np.sum(ref * ref))
+        count += diff.size
+        agree += int(np.sum(np.argmax(ref, axis=-1) == np.argmax(out, axis=-1)))
+        samples += int(np.prod(ref.shape[:-1]))
+    return {"max_abs_error": max_err,
+            "mean_abs_error": sum_err / max(count, 1),
+            "relative_error": np.sqrt(sq_err / max(sq_ref, np.finfo(np.float64).tiny)),
+            "top1_agreement": agree / max(samples, 1)}
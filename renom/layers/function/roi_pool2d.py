@@ -3,47 +3,112 @@
 
 import numpy as np
 from renom.core import Node, to_value
-from renom.layers.function.utils import roi_pooling_slice, region_cordinates, roi_pooling_slice_decode
 import renom.cuda as cu
 if cu.has_cuda():
     from renom.cuda.gpuvalue import GPUValue, get_gpu
 
+# Maximum number of gathered elements per chunk of RoIs.
+_CHUNK_SIZE = 1 << 20
+
+
+def _flatten_feature(x):
+    # (N, C, H, W) -> (N * H * W, C), so that a spatial position is a row.
+    x = to_value(x)
+    return np.ascontiguousarray(x.transpose(0, 2, 3, 1)).reshape(-1, x.shape[1])
+
+
+def _unflatten_feature(dx, shape):
+    n, ch, h, w = shape
+    return np.ascontiguousarray(dx.reshape(n, h, w, ch).transpose(0, 3, 1, 2))
+
+
+def _chunks(n_rois, n_elements):
+    step = max(_CHUNK_SIZE // max(n_elements, 1), 1)
+    for start in range(0, n_rois, step):
+        yield slice(start, start + step)
+
+
+def roi_pool_bounds(rois, spatial_scale, outh, outw, h, w):
+    '''Returns the bin boundaries of all RoIs.
+
+    Boundaries are same as :func:`roi_pooling_slice`.
+
+    Returns:
+        (tuple): Image indices of shape (n_rois, ), start and end rows of shape
+        (n_rois, outh), and start and end columns of shape (n_rois, outw).
+    '''
+    rois = np.asarray(to_value(rois))
+    idx = rois[:, 0].astype(np.int64)
+    xmin, ymin, xmax, ymax = [np.round(rois[:, i] * spatial_scale).astype(np.int64)
+                              for i in range(1, 5)]
+
+    def bounds(start, end, out_size, max_size):
+        stride = np.maximum(end - start + 1, 1).astype(np.float64) / out_size
+        p = np.arange(out_size)[None]
+        lower = np.floor(p * stride[:, None]).astype(np.int64) + start[:, None]
+        upper = np.ceil((p + 1) * stride[:, None]).astype(np.int64) + start[:, None]
+        return np.clip(lower, 0, max_size), np.clip(upper, 0, max_size)
+
+    hstart, hend = bounds(ymin, ymax, outh, h)
+    wstart, wend = bounds(xmin, xmax, outw, w)
+    return idx, hstart, hend, wstart, wend
+
+
+def _bin_positions(idx, hstart, hend, wstart, wend, kh, kw, h, w):
+    # Rows of the channel last input for every bin, padded to kh * kw with -1.
+    rows = hstart[:, :, None] + np.arange(kh)
+    cols = wstart[:, :, None] + np.arange(kw)
+    valid = (rows < hend[:, :, None])[:, :, None, :, None] & \
+        (cols < wend[:, :, None])[:, None, :, None, :]
+    pos = idx[:, None, None, None, None] * h * w + \
+        rows[:, :, None, :, None] * w + cols[:, None, :, None, :]
+    return np.where(valid, pos, -1).reshape(len(idx), hstart.shape[1], wstart.shape[1], kh * kw)
+
 
 class roi_pool2d(Node):
 
     def __new__(cls, x, rois, outh=7, outw=7, spatial_scale=1 / 16.):
         ch, h, w = x.shape[1:]
         n_rois = rois.shape[0]
-        return cls.calc_value(x, rois, ch, h, w, n_rois, outh, outw, spatial_scale=1 / 16.)
+        return cls.calc_value(x, rois, ch, h, w, n_rois, outh, outw, spatial_scale=spatial_scale)
 
     @classmethod
     def _oper_cpu(cls, x, rois, ch, h, w, n_rois, outh, outw, spatial_scale):
-        z = np.zeros((n_rois, ch, outh, outw), np.float64)
-        index = np.zeros(z.shape, np.int32)
-
-        for i_roi in range(n_rois):
-            idx, xmin, ymin, xmax, ymax = region_cordinates(rois[i_roi], spatial_scale)
-            roi_height = max(ymax - ymin + 1, 1)
-            roi_width = max(xmax - xmin + 1, 1)
-            strideh = float(roi_height) / float(outh)
-            stridew = float(roi_width) / float(outw)
-
-            for idx_h in range(outh):
-                sliceh, lenh = roi_pooling_slice(idx_h, strideh, h, ymin)
-                if lenh <= 0:
-                    continue
-                for idx_w in range(outw):
-                    slicew, lenw = roi_pooling_slice(idx_w, stridew, w, xmin)
-                    if lenw <= 0:
-                        continue
-                    roi_data = x[int(idx), :, sliceh, slicew].reshape(ch, -1)
-                    z[i_roi, :, idx_h, idx_w] = np.max(roi_data, axis=1)
-                    max_idx_slice = np.unravel_index(np.argmax(roi_data, axis=1), (lenh, lenw))
-                    max_idx_slice_h = max_idx_slice[0] + sliceh.start
-                    max_idx_slice_w = max_idx_slice[1] + slicew.start
-                    max_idx_slice = max_idx_slice_h * w + max_idx_slice_w
-                    index[i_roi, :, idx_h, idx_w] = max_idx_slice
-        ret = cls._create_node(z)
+        # Bins of all RoIs are gathered from the channel last input.
+        # Empty bins gather the padding row only.
+        x_flat = _flatten_feature(x)
+        size = len(x_flat)
+        x_flat = np.concatenate([x_flat, np.full((1, ch), -np.inf, dtype=x_flat.dtype)])
+        idx, hstart, hend, wstart, wend = roi_pool_bounds(rois, spatial_scale, outh, outw, h, w)
+
+        # RoIs are grouped by their largest bin, so that little of the gathered data is padding.
+        # Max of bins is taken over positions in bins, keeping the first argmax.
+        kh = np.max(hend - hstart, axis=1)
+        kw = np.max(wend - wstart, axis=1)
+        z = np.full((n_rois, outh, outw, ch), -np.inf, dtype=x_flat.dtype)
+        index = np.full((n_rois, outh, outw, ch), size, dtype=np.int64)
+        for bin_h, bin_w in set(zip(kh, kw)):
+            if bin_h <= 0 or bin_w <= 0:
+                continue
+            group = np.flatnonzero((kh == bin_h) & (kw == bin_w))
+            for s in _chunks(len(group), outh * outw * ch):
+                g = group[s]
+                pos = _bin_positions(idx[g], hstart[g], hend[g], wstart[g], wend[g],
+                                     bin_h, bin_w, h, w)
+                pos[pos < 0] = size
+                best = z[g]
+                arg = np.zeros(best.shape, dtype=np.int32)
+                for k in range(pos.shape[-1]):
+                    value = x_flat[pos[..., k]]
+                    update = np.greater(value, best)
+                    np.copyto(best, value, where=update)
+                    np.copyto(arg, k, where=update)
+                z[g] = best
+                index[g] = np.take_along_axis(pos, arg, axis=3)
+        empty = index == size
+        z[empty] = 0
+
+        ret = cls._create_node(z.transpose(0, 3, 1, 2))
         ret.attrs._index = index
         ret.attrs._x = x
         ret.attrs._rois = rois
@@ -70,33 +135,15 @@ class roi_pool2d(Node):
 
     def _backward_cpu(self, context, dy, **kwargs):
         if isinstance(self.attrs._x, Node):
-            ch, h, w = self.attrs._x.shape[1:]
-            n_rois = self.attrs._rois.shape[0]
-            dx = np.zeros_like(self.attrs._x)
-
-            for i_roi in range(n_rois):
-                idx, xmin, ymin, xmax, ymax = region_cordinates(self.attrs._rois[i_roi],
-                                                                self.attrs._spatial_scale)
-                roi_height = max(ymax - ymin + 1, 1)
-                roi_width = max(xmax - xmin + 1, 1)
-
-                stride_h = float(roi_height) / float(self.attrs._outh)
-                stride_w = float(roi_width) / float(self.attrs._outw)
-                for idx_h in range(ymin, ymax + 1):
-                    for idx_w in range(xmin, xmax + 1):
-                        start_w, end_w = roi_pooling_slice_decode(
-                            idx_w, stride_w, self.attrs._outw, xmin)
-                        start_h, end_h = roi_pooling_slice_decode(
-                            idx_h, stride_h, self.attrs._outh, ymin)
-
-                        for ph in range(start_h, end_h):
-                            for pw in range(start_w, end_w):
-                                max_idx_tmp = self.attrs._index[i_roi, :, ph, pw]
-                                for c in range(ch):
-                                    if max_idx_tmp[c] == (idx_h * w + idx_w):
-                                        dx[idx, c, idx_h, idx_w] += dy[i_roi, c, ph, pw]
-
-        self.attrs._x._update_diff(context, dx, **kwargs)
+            n, ch, h, w = self.attrs._x.shape
+            size = n * h * w
+            # Gradients are scattered to the stored argmax of each channel.
+            # Positions of empty bins point to the padding row which is dropped.
+            index = self.attrs._index * ch + np.arange(ch)
+            dy = to_value(dy).transpose(0, 2, 3, 1)
+            dx = np.bincount(index.ravel(), weights=dy.ravel(), minlength=(size + 1) * ch)
+            dx = _unflatten_feature(dx[:size * ch].astype(self.attrs._x.dtype), (n, ch, h, w))
+            self.attrs._x._update_diff(context, dx, **kwargs)
 
     def _backward_gpu(self, context, dy, **kwargs):
         if isinstance(self.attrs._x, Node):
@@ -107,6 +154,124 @@ class roi_pool2d(Node):
             self.attrs._x._update_diff(context, dx, **kwargs)
 
 
+def _bilinear_axis(coord, size):
+    # Lower and upper neighbours of sampling points and their weights.
+    # Points further than 1 pixel outside of the input are ignored.
+    valid = (coord >= -1.0) & (coord <= size)
+    coord = np.maximum(coord, 0)
+    low = np.floor(coord).astype(np.int64)
+    edge = low >= size - 1
+    low = np.where(edge, size - 1, low)
+    high = np.where(edge, size - 1, low + 1)
+    frac = np.where(edge, 0, coord - low)
+    return low, high, (1 - frac) * valid, frac * valid
+
+
+def roi_align_weights(rois, spatial_scale, outh, outw, h, w, sampling_ratio):
+    '''Returns the interpolation matrices of all RoIs for RoIAlign.
+
+    Bilinear interpolation is separable, so the average of the sampling points
+    of the bin ``(p, q)`` of a RoI is ``wy[p] @ x[c] @ wx[q]``.
+
+    Returns:
+        (tuple): Image indices of shape (n_rois, ), row weights of shape
+        (n_rois, outh, h) and column weights of shape (n_rois, outw, w).
+    '''
+    rois = np.asarray(to_value(rois), dtype=np.float64)
+    n_rois = len(rois)
+    s = sampling_ratio
+    idx = rois[:, 0].astype(np.int64)
+    xmin, ymin, xmax, ymax = [rois[:, i] * spatial_scale for i in range(1, 5)]
+
+    def weights(start, end, out_size, max_size):
+        bin_size = np.maximum(end - start, 1.) / out_size
+        p = (np.arange(out_size)[:, None] + (np.arange(s) + .5) / s).ravel()
+        low, high, wl, wh = _bilinear_axis(start[:, None] + p[None] * bin_size[:, None], max_size)
+        ret = np.zeros((n_rois, out_size * s, max_size))
+        r, i = np.indices(low.shape)
+        np.add.at(ret, (r, i, low), wl)
+        np.add.at(ret, (r, i, high), wh)
+        return ret.reshape(n_rois, out_size, s, max_size).mean(axis=2)
+
+    return idx, weights(ymin, ymax, outh, h), weights(xmin, xmax, outw, w)
+
+
+def _image_chunks(idx, n_elements):
+    # RoIs of each image in chunks.
+    for n in np.unique(idx):
+        group = np.flatnonzero(idx == n)
+        for s in _chunks(len(group), n_elements):
+            yield n, group[s]
+
+
+class roi_align2d(Node):
+
+    def __new__(cls, x, rois, outh=7, outw=7, spatial_scale=1 / 16., sampling_ratio=2):
+        return cls.calc_value(x, rois, outh, outw, spatial_scale, sampling_ratio)
+
+    @classmethod
+    def _forward(cls, x, rois, outh, outw, spatial_scale, sampling_ratio):
+        x = to_value(x)
+        n, ch, h, w = x.shape
+        idx, wy, wx = roi_align_weights(rois, spatial_scale, outh, outw, h, w, sampling_ratio)
+        wy = wy.astype(x.dtype)
+        wx = wx.astype(x.dtype)
+
+        # Columns of all RoIs of an image are interpolated by one matrix product,
+        # and then rows are interpolated by a batched matrix product.
+        z = np.empty((len(idx), ch, outh, outw), dtype=x.dtype)
+        for i, g in _image_chunks(idx, ch * h * outw):
+            r = len(g)
+            u = np.dot(x[i].reshape(ch * h, w), wx[g].reshape(r * outw, w).T)
+            u = u.reshape(ch, h, r, outw).transpose(2, 1, 0, 3).reshape(r, h, ch * outw)
+            z[g] = np.matmul(wy[g], u).reshape(r, outh, ch, outw).transpose(0, 2, 1, 3)
+        return z, wy, wx, idx
+
+    @classmethod
+    def _oper_cpu(cls, x, rois, outh, outw, spatial_scale, sampling_ratio):
+        z, wy, wx, idx = cls._forward(x, rois, outh, outw, spatial_scale, sampling_ratio)
+        ret = cls._create_node(z)
+        ret.attrs._x = x
+        ret.attrs._wy = wy
+        ret.attrs._wx = wx
+        ret.attrs._idx = idx
+        return ret
+
+    @classmethod
+    def _oper_gpu(cls, x, rois, outh, outw, spatial_scale, sampling_ratio):
+        # There is no cuda kernel for RoIAlign, so it is computed on cpu.
+        z, wy, wx, idx = cls._forward(x, rois, outh, outw, spatial_scale, sampling_ratio)
+        ret = cls._create_node(get_gpu(z))
+        ret.attrs._x = x
+        ret.attrs._wy = wy
+        ret.attrs._wx = wx
+        ret.attrs._idx = idx
+        return ret
+
+    def _get_dx(self, dy):
+        n, ch, h, w = self.attrs._x.shape
+        wy, wx, idx = self.attrs._wy, self.attrs._wx, self.attrs._idx
+        outh, outw = wy.shape[1], wx.shape[1]
+        dy = to_value(dy)
+        dx = np.zeros((n, ch * h, w), dtype=wy.dtype)
+        # Transposed products of forward. Gradients of overlapping RoIs are
+        # summed up by the matrix product instead of scattering.
+        for i, g in _image_chunks(idx, ch * h * outw):
+            r = len(g)
+            v = np.matmul(wy[g].transpose(0, 2, 1), dy[g].transpose(0, 2, 1, 3).reshape(r, outh, ch * outw))
+            v = v.reshape(r, h, ch, outw).transpose(2, 1, 0, 3).reshape(ch * h, r * outw)
+            dx[i] += np.dot(v, wx[g].reshape(r * outw, w))
+        return dx.reshape(n, ch, h, w)
+
+    def _backward_cpu(self, context, dy, **kwargs):
+        if isinstance(self.attrs._x, Node):
+            self.attrs._x._update_diff(context, self._get_dx(dy), **kwargs)
+
+    def _backward_gpu(self, context, dy, **kwargs):
+        if isinstance(self.attrs._x, Node):
+            self.attrs._x._update_diff(context, get_gpu(self._get_dx(dy)), **kwargs)
+
+
 class RoiPoolBase(object):
     def __init__(self, outh=7, outw=7, spatial_scale=1 / 16.):
         self.outw = outw
@@ -118,5 +283,62 @@ class RoiPoolBase(object):
 
 
 class RoiPool2d(RoiPoolBase):
+    '''RoI max pooling layer of Fast R-CNN [roi]_.
+
+    Each region of interest is divided into ``outh`` x ``outw`` bins and
+    each bin is reduced with max.
+
+    Args:
+        outh (int): Height of output.
+        outw (int): Width of output.
+        spatial_scale (float): Scale which converts the coordinates of RoIs
+            to the coordinates of the input feature map.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> x = np.random.rand(2, 3, 16, 16)
+        >>> rois = np.array([[0, 0, 0, 64, 64], [1, 32, 16, 128, 96]])
+        >>> layer = rm.RoiPool2d(outh=7, outw=7, spatial_scale=1 / 8.)
+        >>> layer(x, rois).shape
+        (2, 3, 7, 7)
+
+    .. [roi] Ross Girshick. Fast R-CNN. ICCV 2015.
+    '''
+
     def forward(self, x, rois):
         return roi_pool2d(x, rois, self.outh, self.outw, self.spatial_scale)
+
+
+class RoiAlign2d(RoiPoolBase):
+    '''RoIAlign layer of Mask R-CNN [align]_.
+
+    Unlike :class:`RoiPool2d`, coordinates of RoIs are not rounded. Each bin is
+    the average of ``sampling_ratio`` x ``sampling_ratio`` points which are
+    sampled by bilinear interpolation.
+
+    Args:
+        outh (int): Height of output.
+        outw (int): Width of output.
+        spatial_scale (float): Scale which converts the coordinates of RoIs
+            to the coordinates of the input feature map.
+        sampling_ratio (int): Number of sampling points along each axis of a bin.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> x = np.random.rand(2, 3, 16, 16)
+        >>> rois = np.array([[0, 0, 0, 64, 64], [1, 32, 16, 128, 96]])
+        >>> layer = rm.RoiAlign2d(outh=7, outw=7, spatial_scale=1 / 8.)
+        >>> layer(x, rois).shape
+        (2, 3, 7, 7)
+
+    .. [align] Kaiming He, Georgia Gkioxari, Piotr Dollar, Ross Girshick. Mask R-CNN. ICCV 2017.
+    '''
+
+    def __init__(self, outh=7, outw=7, spatial_scale=1 / 16., sampling_ratio=2):
+        super(RoiAlign2d, self).__init__(outh, outw, spatial_scale)
+        self.sampling_ratio = sampling_ratio
+
+    def forward(self, x, rois):
+        return roi_align2d(x, rois, self.outh, self.outw, self.spatial_scale, self.sampling_ratio)
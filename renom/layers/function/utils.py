@@ -3,6 +3,13 @@ import numpy as np
 from renom.core import to_value
 from renom import precision
 
+NCHW = "NCHW"
+NHWC = "NHWC"
+_LAYOUT_AXES = {
+    (NCHW, NHWC): (0, 2, 3, 1),
+    (NHWC, NCHW): (0, 3, 1, 2),
+}
+
 
 def out_size(size, k, s, p, d=(1, 1), ceil_mode=False):
     size = np.array(size)
@@ -44,6 +51,27 @@ def im2col(img, size, kernel, stride, padding, dilation=(1, 1), padWith=0.):
     return col
 
 
+def im2col_nhwc(img, size, kernel, stride, padding, dilation=(1, 1), padWith=0.):
+    N, in_h, in_w, channel = img.shape
+    out_h, out_w = size
+    k_h, k_w = kernel
+    s_h, s_w = stride
+    p_h, p_w = padding
+    d_h, d_w = dilation
+    img_n = np.pad(img, ((0, 0), (p_h, p_h + s_h - 1),
+                         (p_w, p_w + s_w - 1), (0, 0)), mode="constant", constant_values=padWith)
+    col = np.ndarray((N, out_h, out_w, k_h, k_w, channel), dtype=precision)
+    for i in range(k_h):
+        idh = i * d_h
+        iu = idh + s_h * out_h
+
+        for j in range(k_w):
+            jdw = j * d_w
+            ju = jdw + s_w * out_w
+            col[:, :, :, k_h - 1 - i, k_w - 1 - j, :] = img_n[:, idh:iu:s_h, jdw:ju:s_w, :]
+    return col
+
+
 def pad_image(img, padding, stride, padWith=0.):
     dims = img.shape[2:]
     dimensionality = len(dims)
@@ -338,6 +366,81 @@ def col2im(col, size, stride, padding, dilation=(1, 1)):
                p_w:im_shape[3] - (p_w + s_w - 1)]
 
 
+def col2im_nhwc(col, size, stride, padding, dilation=(1, 1)):
+    in_h, in_w = size
+    s_h, s_w = stride
+    p_h, p_w = padding
+    d_h, d_w = dilation
+    N, out_h, out_w, k_h, k_w, channel = col.shape
+    img = np.zeros((N, in_h + 2 * p_h + s_h - 1,
+                    in_w + 2 * p_w + s_w - 1, channel), dtype=precision)
+    for i in range(k_h):
+        idh = i * d_h
+        iu = idh + s_h * out_h
+
+        for j in range(k_w):
+            jdw = j * d_w
+            ju = jdw + s_w * out_w
+            img[:, idh:iu:s_h, jdw:ju:s_w, :] += col[:, :, :, k_h - 1 - i, k_w - 1 - j, :]
+
+    im_shape = img.shape
+    return img[:, p_h:im_shape[1] - (p_h + s_h - 1),
+               p_w:im_shape[2] - (p_w + s_w - 1), :]
+
+
+def check_layout(layout):
+    assert layout in (NCHW, NHWC), \
+        "Tensor layout must be '{}' or '{}'. Actual is {}".format(NCHW, NHWC, layout)
+    return layout
+
+
+def transpose_layout(value, src, dst):
+    """Transposes a 4d array from layout ``src`` to layout ``dst``.
+    Arrays which are not 4d are returned as they are."""
+    if src == dst or np.ndim(value) != 4:
+        return value
+    return np.ascontiguousarray(np.asarray(value).transpose(_LAYOUT_AXES[(src, dst)]))
+
+
+def _reduce_subscripts(ndim, axis):
+    # Einsum subscripts which reduce ``axis`` of an ndim array.
+    axis = range(ndim) if axis is None else [a % ndim for a in np.atleast_1d(axis)]
+    src = "abcdefghijklmnopqrstuvwxyz"[:ndim]
+    dst = "".join(s for i, s in enumerate(src) if i not in axis)
+    keep = [1 if i in axis else None for i in range(ndim)]
+    return src, dst, keep
+
+
+def _keep_dims(value, shape, keep):
+    return np.reshape(value, [k or s for k, s in zip(keep, shape)])
+
+
+def sum_of_products(a, b, axis=None, dtype=None):
+    """Returns ``np.sum(a * b, axis, keepdims=True)`` without allocating ``a * b``."""
+    a = to_value(a)
+    b = to_value(b)
+    src, dst, keep = _reduce_subscripts(a.ndim, axis)
+    value = np.einsum("{0},{0}->{1}".format(src, dst), a, b, dtype=dtype)
+    return _keep_dims(value, a.shape, keep)
+
+
+def moments(x, axis=None):
+    """Returns the mean and the biased variance of ``x`` reduced along ``axis``.
+
+    Both are computed in a single pass over ``x`` from the sum and the sum of
+    squares, which are accumulated in float64 to avoid cancellation.
+    The results keep the reduced dimensions and have the dtype of ``x``.
+    """
+    x = to_value(x)
+    src, dst, keep = _reduce_subscripts(x.ndim, axis)
+    N = np.prod([s for k, s in zip(keep, x.shape) if k is not None])
+    mean = np.einsum("{}->{}".format(src, dst), x, dtype=np.float64) / N
+    var = np.einsum("{0},{0}->{1}".format(src, dst), x, x, dtype=np.float64) / N
+    var = np.maximum(var - mean * mean, 0)
+    return (_keep_dims(mean, x.shape, keep).astype(x.dtype, copy=False),
+            _keep_dims(var, x.shape, keep).astype(x.dtype, copy=False))
+
+
 def tuplize(x):
     return x if isinstance(x, tuple) else (x, x)
 
@@ -4,10 +4,11 @@ import numpy as np
 import renom.cuda as cu
 if cu.has_cuda():
     from renom.cuda.gpuvalue import get_gpu
-from renom.core import Node, Variable, Pow
+from renom.core import Node, Variable, Pow, to_value
 import renom.operation as op
 import renom.utility.initializer as init
 from .parameterized import Parametrized
+from .utils import sum_of_products
 
 
 def normalized_form(x):
@@ -22,10 +23,14 @@ class weight_normalize(Node):
     def _oper_cpu(cls, x, weight, gain, bias):
         assert len(x.shape) is 2, \
             "Currently only normalizes for dense networks."
-        w = weight / normalized_form(weight) * gain
-        ret = cls._create_node(op.dot(x, w) + bias)
+        norm = np.sqrt(sum_of_products(weight, weight))
+        w = to_value(weight) * (to_value(gain) / norm)
+        z = np.dot(to_value(x), w)
+        z += to_value(bias)
+        ret = cls._create_node(z)
         ret.attrs._x = x
         ret.attrs._w = w
+        ret.attrs._norm = norm
         ret.attrs._weight = weight
         ret.attrs._gain = gain
         ret.attrs._bias = bias
@@ -45,31 +50,32 @@ class weight_normalize(Node):
         return ret
 
     def _backward_cpu(self, context, dy, **kwargs):
-        x = self.attrs._x
+        x = to_value(self.attrs._x)
         w = self.attrs._w
-        gain = self.attrs._gain
-        weight = self.attrs._weight
-        dx = op.dot(dy, w.T)
-        normal_dw = op.dot(x.T, dy)
-
-        dgain = normal_dw * w / gain
-        dw = w / weight * (normal_dw - np.sum(w * normal_dw / gain, keepdims=True) * w / gain)
-        db = np.ones_like(dy) * dy
+        norm = self.attrs._norm
+        gain = to_value(self.attrs._gain)
+        weight = to_value(self.attrs._weight)
+        dy = to_value(dy)
 
         if isinstance(self.attrs._x, Node):
-            self.attrs._x._update_diff(context, dx, **kwargs)
+            self.attrs._x._update_diff(context, np.dot(dy, w.T), **kwargs)
+
+        normal_dw = np.dot(x.T, dy)
+        dgain = sum_of_products(normal_dw, weight, axis=0) / norm
 
         if isinstance(self.attrs._gain, Node):
-            self.attrs._gain._update_diff(context,
-                                          np.sum(dgain, axis=0, keepdims=True), **kwargs)
+            self.attrs._gain._update_diff(context, dgain, **kwargs)
 
         if isinstance(self.attrs._weight, Node):
+            # dw = (normal_dw * gain - weight * sum(dgain * gain) / norm) / norm
+            dw = weight * (-np.sum(dgain * gain) / norm)
+            dw += normal_dw * gain
+            dw /= norm
             self.attrs._weight._update_diff(context, dw, **kwargs)
 
         if isinstance(self.attrs._bias, Node):
-            db = dy
             self.attrs._bias._update_diff(context,
-                                          np.sum(db, axis=0, keepdims=True), **kwargs)
+                                          np.sum(dy, axis=0, keepdims=True), **kwargs)
 
     def _backward_gpu(self, context, dy, **kwargs):
         x = get_gpu(self.attrs._x)
@@ -2,6 +2,7 @@ from .mean_squared_error import MeanSquaredError, mean_squared_error
 from .mean_squared_error import mean_squared_error as mse
 from .softmax_cross_entropy import SoftmaxCrossEntropy, softmax_cross_entropy
 from .softmax_cross_entropy import softmax_cross_entropy as smce
+from .softmax_cross_entropy import SparseSoftmaxCrossEntropy, sparse_softmax_cross_entropy
 from .sigmoid_cross_entropy import SigmoidCrossEntropy, sigmoid_cross_entropy
 from .sigmoid_cross_entropy import sigmoid_cross_entropy as sgce
 from .clipped_mean_squared_error import ClippedMeanSquaredError, clipped_mean_squared_error
@@ -3,6 +3,7 @@
 from __future__ import print_function, division
 import numpy as np
 from renom.core import BinOp, Node
+from .softmax_cross_entropy import broadcast_mask
 import renom.cuda as cu
 if cu.has_cuda():
     from renom.cuda.gpuvalue import get_gpu
@@ -10,34 +11,54 @@ if cu.has_cuda():
 
 class mean_squared_error(BinOp):
 
+    def __new__(cls, lhs, rhs, reduce_sum=True, mask=None):
+        if mask is not None:
+            mask, N = broadcast_mask(mask, lhs)
+        else:
+            N = len(lhs)
+        ret = super(mean_squared_error, cls).__new__(cls, lhs, rhs, reduce_sum=reduce_sum, mask=mask, N=N)
+        ret.attrs._mask = mask
+        ret.attrs._N = N
+        return ret
+
     @classmethod
-    def _oper_cpu(cls, lhs, rhs, reduce_sum=True):
+    def _oper_cpu(cls, lhs, rhs, reduce_sum=True, mask=None, N=None):
         assert len(rhs.shape) > 1, "Input arrays must have no less than 2 dimension."
-        N = len(lhs)
+        N = len(lhs) if N is None else N
+        loss = (lhs - rhs) ** 2
+        if mask is not None:
+            loss = loss * mask
         if reduce_sum:
-            return np.sum((lhs - rhs) ** 2) / (N * 2)
+            return np.sum(loss) / (N * 2)
         else:
-            return (lhs - rhs) ** 2 / (N * 2)
+            return loss / (N * 2)
 
     @classmethod
-    def _oper_gpu(cls, lhs, rhs, reduce_sum=True):
+    def _oper_gpu(cls, lhs, rhs, reduce_sum=True, mask=None, N=None):
         assert len(rhs.shape) > 1, "Input arrays must have no less than 2 dimension."
-        N = len(lhs)
+        N = len(lhs) if N is None else N
+        loss = (get_gpu(lhs) - get_gpu(rhs)) ** 2
+        if mask is not None:
+            loss = loss * get_gpu(mask)
         if reduce_sum:
-            return cu.cusum((get_gpu(lhs) - get_gpu(rhs)) ** 2) / (N * 2)
+            return cu.cusum(loss) / (N * 2)
         else:
-            return ((get_gpu(lhs) - get_gpu(rhs)) ** 2) / (N * 2)
+            return loss / (N * 2)
 
     def _backward_cpu(self, context, dy, **kwargs):
         if isinstance(self.attrs._lhs, Node):
             sub = self.attrs._lhs - self.attrs._rhs
-            N = len(self.attrs._lhs)
+            if self.attrs._mask is not None:
+                sub = sub * self.attrs._mask
+            N = self.attrs._N
             self.attrs._lhs._update_diff(context, sub * dy / N, **kwargs)
 
     def _backward_gpu(self, context, dy, **kwargs):
         if isinstance(self.attrs._lhs, Node):
-            N = len(self.attrs._lhs)
+            N = self.attrs._N
             sub = get_gpu(self.attrs._lhs) - get_gpu(self.attrs._rhs)
+            if self.attrs._mask is not None:
+                sub = sub * get_gpu(self.attrs._mask)
             self.attrs._lhs._update_diff(context, sub * get_gpu(dy) / N, **kwargs)
 
 
@@ -60,6 +81,8 @@ class MeanSquaredError(object):
         x (ndarray,Node): Input array.
         y (ndarray,Node): Target array.
         reduce_sum (bool): If True is given, the result array will be summed up and returns scalar value.
+        mask (ndarray): Array of shape (N, ). Samples whose mask is 0 do not contribute
+            to the loss and the gradient, and :math:`N` is replaced by the sum of the mask.
 
     Returns:
         (Node, ndarray): Mean squared error.
@@ -84,5 +107,5 @@ class MeanSquaredError(object):
 
     """
 
-    def __call__(self, x, y, reduce_sum=True):
-        return mean_squared_error(x, y, reduce_sum=reduce_sum)
+    def __call__(self, x, y, reduce_sum=True, mask=None):
+        return mean_squared_error(x, y, reduce_sum=reduce_sum, mask=mask)
@@ -2,7 +2,8 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function, division
 import numpy as np
-from renom.core import Node
+from renom.core import Node, to_value
+from renom.config import precision
 from renom.layers.activation import softmax
 import renom.cuda as cu
 if cu.has_cuda():
@@ -10,32 +11,52 @@ if cu.has_cuda():
 import renom as rm
 
 
+def broadcast_mask(mask, lhs):
+    """Broadcasts a mask of shape (N, ) to the shape of ``lhs``.
+    Returns the mask and the number of valid samples."""
+    mask = np.asarray(mask, dtype=precision)
+    assert mask.shape == (len(lhs), ), \
+        "The shape of mask {} must be ({}, ).".format(mask.shape, len(lhs))
+    N = max(float(np.sum(mask)), 1.)
+    mask = np.broadcast_to(mask.reshape((-1, ) + (1, ) * (len(lhs.shape) - 1)), lhs.shape)
+    return np.ascontiguousarray(mask), N
+
+
 class softmax_cross_entropy(Node):
 
-    def __new__(cls, lhs, rhs, reduce_sum=True):
+    def __new__(cls, lhs, rhs, reduce_sum=True, mask=None):
         assert len(rhs.shape) > 1, "Input arrays must have no less than 2 dimension."
-        return cls.calc_value(lhs, rhs, reduce_sum=reduce_sum)
+        return cls.calc_value(lhs, rhs, reduce_sum=reduce_sum, mask=mask)
 
     @classmethod
-    def _oper_cpu(cls, lhs, rhs, reduce_sum):
+    def _oper_cpu(cls, lhs, rhs, reduce_sum, mask):
         N = len(lhs)
         z = softmax(lhs)
+        loss = -rhs * np.log(z + 1e-8)
+        if mask is not None:
+            mask, N = broadcast_mask(mask, lhs)
+            loss = loss * mask
         if reduce_sum:
-            loss = -np.sum(rhs * np.log(z + 1e-8)) / N
+            loss = np.sum(loss) / N
         else:
-            loss = -rhs * np.log(z + 1e-8) / N
+            loss = loss / N
         ret = cls._create_node(loss)
         ret.attrs._z = z
         ret.attrs._lhs = lhs
         ret.attrs._rhs = rhs
+        ret.attrs._mask = mask
+        ret.attrs._N = N
         return ret
 
     @classmethod
-    def _oper_gpu(cls, lhs, rhs, reduce_sum):
+    def _oper_gpu(cls, lhs, rhs, reduce_sum, mask):
         N = lhs.shape[0]
         z = softmax(lhs)
         tmp1 = get_gpu(lhs).empty_like_me()
         cu.cucross_entropy(get_gpu(z), get_gpu(rhs), get_gpu(tmp1))
+        if mask is not None:
+            mask, N = broadcast_mask(mask, lhs)
+            tmp1 = get_gpu(tmp1) * get_gpu(mask)
         if reduce_sum:
             loss = -cu.cusum(get_gpu(tmp1))
         else:
@@ -44,18 +65,24 @@ class softmax_cross_entropy(Node):
         ret.attrs._z = z
         ret.attrs._lhs = lhs
         ret.attrs._rhs = rhs
+        ret.attrs._mask = mask
+        ret.attrs._N = N
         return ret
 
     def _backward_cpu(self, context, dy, **kwargs):
         if isinstance(self.attrs._lhs, Node):
-            N = len(self.attrs._lhs)
+            N = self.attrs._N
             sub = self.attrs._z - self.attrs._rhs
+            if self.attrs._mask is not None:
+                sub = sub * self.attrs._mask
             self.attrs._lhs._update_diff(context, sub * dy / N, **kwargs)
 
     def _backward_gpu(self, context, dy, **kwargs):
         if isinstance(self.attrs._lhs, Node):
-            N = len(self.attrs._lhs)
+            N = self.attrs._N
             sub = get_gpu(self.attrs._z) - get_gpu(self.attrs._rhs)
+            if self.attrs._mask is not None:
+                sub = sub * get_gpu(self.attrs._mask)
             self.attrs._lhs._update_diff(context, sub * get_gpu(dy) / N, **kwargs)
 
 
@@ -71,10 +98,125 @@ class SoftmaxCrossEntropy(object):
         x (ndarray,Node): Input array.
         y (ndarray,Node): Target array.
         reduce_sum (bool): If True is given, the result array will be summed up and returns scalar value.
+        mask (ndarray): Array of shape (N, ). Samples whose mask is 0 do not contribute
+            to the loss and the gradient, and :math:`N` is replaced by the sum of the mask.
+            This is useful for ignoring the padded timesteps of variable length sequences.
+
+    Raises:
+        AssertionError: An assertion error will be raised if the given tensor dimension is less than 2.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> # Outputs of padded sequences of shape (T, N, K) and their lengths.
+        >>> x = np.random.rand(4, 2, 3)
+        >>> y = np.eye(3)[np.random.randint(3, size=(4, 2))]
+        >>> mask = rm.sequence_mask([4, 2]).reshape(-1)
+        >>> loss = rm.softmax_cross_entropy(x.reshape(-1, 3), y.reshape(-1, 3), mask=mask)
+    """
+
+    def __call__(self, lhs, rhs, reduce_sum=True, mask=None):
+        return softmax_cross_entropy(lhs, rhs, reduce_sum=reduce_sum, mask=mask)
+
+
+class sparse_softmax_cross_entropy(Node):
+
+    def __new__(cls, lhs, rhs, reduce_sum=True, mask=None):
+        assert len(lhs.shape) > 1, "Input arrays must have no less than 2 dimension."
+        rhs = np.asarray(to_value(rhs))
+        assert rhs.shape == lhs.shape[:1] + lhs.shape[2:], \
+            "The shape of target {} must be {}.".format(rhs.shape, lhs.shape[:1] + lhs.shape[2:])
+        return cls.calc_value(lhs, rhs.astype(np.int64), reduce_sum=reduce_sum, mask=mask)
+
+    @classmethod
+    def _oper_cpu(cls, lhs, rhs, reduce_sum, mask):
+        x = to_value(lhs)
+        N = len(x)
+        index = np.expand_dims(rhs, 1)
+        # log(softmax(x)) at the target is x_t - max(x) - log(sum(exp(x - max(x)))).
+        z = np.subtract(x, np.max(x, axis=1, keepdims=True), dtype=precision)
+        loss = -np.take_along_axis(z, index, axis=1)
+        np.exp(z, out=z)
+        total = np.sum(z, axis=1, keepdims=True)
+        loss += np.log(total)
+        z /= total
+        loss = loss.reshape(rhs.shape)
+        if mask is not None:
+            mask, N = broadcast_mask(mask, loss)
+            loss = loss * mask
+        if reduce_sum:
+            loss = np.sum(loss) / N
+        else:
+            loss = loss / N
+        ret = cls._create_node(loss)
+        ret.attrs._z = z
+        ret.attrs._lhs = lhs
+        ret.attrs._rhs = rhs
+        ret.attrs._mask = mask
+        ret.attrs._N = N
+        return ret
+
+    @classmethod
+    def _oper_gpu(cls, lhs, rhs, reduce_sum, mask):
+        # There is no gpu kernel gathering the targets, so it is computed on cpu.
+        ret = cls._oper_cpu(lhs, rhs, reduce_sum, mask)
+        ret = cls._create_node(get_gpu(to_value(ret)))
+        return ret
+
+    def _grad(self, dy):
+        # softmax - onehot is formed in place of the scaled softmax.
+        g = np.broadcast_to(to_value(dy) / self.attrs._N, self.attrs._rhs.shape)
+        if self.attrs._mask is not None:
+            g = g * self.attrs._mask
+        g = np.expand_dims(g, 1)
+        index = np.expand_dims(self.attrs._rhs, 1)
+        dx = self.attrs._z * g
+        np.put_along_axis(dx, index, np.take_along_axis(dx, index, axis=1) - g, axis=1)
+        return dx
+
+    def _backward_cpu(self, context, dy, **kwargs):
+        if isinstance(self.attrs._lhs, Node):
+            self.attrs._lhs._update_diff(context, self._grad(dy), **kwargs)
+
+    def _backward_gpu(self, context, dy, **kwargs):
+        if isinstance(self.attrs._lhs, Node):
+            self.attrs._lhs._update_diff(context, get_gpu(self._grad(dy)), **kwargs)
+
+
+class SparseSoftmaxCrossEntropy(object):
+    """Softmax cross entropy whose targets are given as class indices.
+
+    This function is the same as :class:`SoftmaxCrossEntropy` except that
+    the target ``y`` is an integer array of the class indices instead of one-hot vectors.
+    The memory for the targets becomes :math:`O(N)` instead of :math:`O(NK)`,
+    which matters for a large number of classes.
+
+    .. math::
+        E(x) = -\\frac{1}{N}\sum_{n}^{N}(x_{ny_n} - \log\sum_{k=1}^{K}\exp(x_{nk}))
+
+    The log of the softmax is computed with the log-sum-exp of the input, so it is
+    numerically stable and no small constant is added.
+
+    Args:
+        x (ndarray,Node): Input array of shape (N, K) or (N, K, ...).
+        y (ndarray): Integer array of the class indices of shape (N, ) or (N, ...).
+        reduce_sum (bool): If True is given, the result array will be summed up and returns scalar value.
+            Otherwise the loss of each sample of shape (N, ...) is returned.
+        mask (ndarray): Array of shape (N, ). Samples whose mask is 0 do not contribute
+            to the loss and the gradient, and :math:`N` is replaced by the sum of the mask.
 
     Raises:
         AssertionError: An assertion error will be raised if the given tensor dimension is less than 2.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> x = np.random.rand(4, 3)
+        >>> y = np.array([0, 2, 1, 2])
+        >>> loss = rm.sparse_softmax_cross_entropy(x, y)
+        >>> np.allclose(loss, rm.softmax_cross_entropy(x, np.eye(3)[y]), atol=1e-5)
+        True
     """
 
-    def __call__(self, lhs, rhs, reduce_sum=True):
-        return softmax_cross_entropy(lhs, rhs, reduce_sum=reduce_sum)
+    def __call__(self, lhs, rhs, reduce_sum=True, mask=None):
+        return sparse_softmax_cross_entropy(lhs, rhs, reduce_sum=reduce_sum, mask=mask)
@@ -203,6 +203,16 @@ def reshape(array, shape):
     return Reshape(array, shape)
 
 
+def _broadcast_grad(arg, dy, axis, keepdims):
+    # Gradient of a reduction is returned as a read only broadcast view of dy,
+    # so no array of the input size is allocated until it is really needed.
+    dy = np.asarray(to_value(dy))
+    if axis is not None and not keepdims:
+        for ax in sorted(np.atleast_1d(axis) % len(arg.shape)):
+            dy = np.expand_dims(dy, ax)
+    return np.broadcast_to(dy, arg.shape)
+
+
 class sum(Node):
     '''
     This function sums up matrix elements.
@@ -246,20 +256,7 @@ class sum(Node):
     def _backward_cpu(self, context, dy, **kwargs):
         if isinstance(self.attrs._arg, Node):
             arg = self.attrs._arg
-            axis = self.attrs._axis
-            if axis is None or axis == 0:
-                dx = np.ones_like(arg) * dy
-            else:
-                if not self.attrs._keep:
-                    if isinstance(axis, int):
-                        expanded = np.expand_dims(dy, axis)
-                    else:
-                        expanded = dy
-                        for ax in axis:
-                            expanded = np.expand_dims(expanded, ax)
-                    dx = np.ones_like(arg) * expanded
-                else:
-                    dx = np.ones_like(arg) * dy
+            dx = _broadcast_grad(arg, dy, self.attrs._axis, self.attrs._keep)
             arg._update_diff(context, dx, **kwargs)
 
     def _backward_gpu(self, context, dy, **kwargs):
@@ -764,15 +761,10 @@ class mean(Node):
             arg = self.attrs._arg
             axis = self.attrs._axis
             if axis is None:
-                dx = np.ones_like(arg) * dy / np.size(arg)
+                size = np.size(arg)
             else:
-                if not self.attrs._keep:
-                    if isinstance(axis, int):
-                        expanded = np.expand_dims(dy, axis)
-                        dx = np.ones_like(arg) * expanded / np.size(arg, axis)
-                else:
-                    if isinstance(axis, int):
-                        dx = np.ones_like(arg) * dy / np.size(arg, axis)
+                size = np.prod([arg.shape[ax] for ax in np.atleast_1d(axis)])
+            dx = _broadcast_grad(arg, to_value(dy) / size, axis, self.attrs._keep)
             arg._update_diff(context, dx, **kwargs)
 
     def _backward_gpu(self, context, dy, **kwargs):
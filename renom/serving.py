@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Utilities for serving trained models."""
+
+from __future__ import division
+import collections
+import threading
+import time
+import queue
+from concurrent.futures import Future
+import numpy as np
+from renom.core import Node
+
+
+class BatchingPredictor(object):
+    """Predictor which merges requests of single samples into batches.
+
+    Requests submitted from any number of threads are queued. A scheduler thread
+    takes the first waiting request, collects following requests until
+    ``max_batch`` samples are gathered or ``max_wait_ms`` milliseconds have passed
+    since the first one arrived, and runs the model once for all of them.
+    Each request gets its row of the output through a
+    :class:`concurrent.futures.Future`. Samples of different shapes are run as separate batches.
+
+    The model is switched to inference mode. Any callable which maps a batch to
+    a batch, for example a function made by :func:`renom.freeze`, can be given as the model.
+
+    Args:
+        model (Model, callable): Model to be served.
+        max_batch (int): Maximum number of samples in a batch.
+        max_wait_ms (float): Maximum time in milliseconds a request waits for other requests.
+        max_latencies (int): Number of the latest requests kept for latency percentiles.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> from renom.serving import BatchingPredictor
+        >>> model = rm.Sequential([rm.Dense(10), rm.Relu(), rm.Dense(2)])
+        >>> _ = model(np.random.rand(1, 5))
+        >>> with BatchingPredictor(model, max_batch=16, max_wait_ms=2) as predictor:
+        ...     futures = [predictor.submit(np.random.rand(5)) for _ in range(4)]
+        ...     results = [f.result() for f in futures]
+        >>> results[0].shape
+        (2,)
+
+        With asyncio, ``await asyncio.wrap_future(predictor.submit(x))`` waits for the result.
+    """
+
+    def __init__(self, model, max_batch=32, max_wait_ms=5, max_latencies=10000):
+        assert max_batch > 0, "max_batch must be positive. Actual is {}".format(max_batch)
+        self._model = model
+        self._max_batch = max_batch
+        self._max_wait = max_wait_ms / 1000.
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=max_latencies)
+        self._batch_sizes = collections.Counter()
+        self._num_requests = 0
+        self._closed = False
+        if hasattr(model, "set_models"):
+            model.set_models(inference=True)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, x):
+        """Queues a sample without the batch axis.
+
+        Args:
+            x (ndarray): A sample.
+
+        Returns:
+            (Future): Future whose result is the output of the sample.
+        """
+        future = Future()
+        # Nothing is queued after the sentinel put by close.
+        with self._lock:
+            assert not self._closed, "The predictor is closed."
+            self._queue.put((np.asarray(x), future, time.time()))
+        return future
+
+    def predict(self, x, timeout=None):
+        """Predicts a sample and waits for the result."""
+        return self.submit(x).result(timeout)
+
+    def _collect(self, first):
+        requests = [first]
+        deadline = first[2] + self._max_wait
+        while len(requests) < self._max_batch:
+            wait = deadline - time.time()
+            try:
+                item = self._queue.get(timeout=wait) if wait > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            requests.append(item)
+        return requests
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            requests = self._collect(first)
+            groups = collections.OrderedDict()
+            for request in requests:
+                groups.setdefault(request[0].shape, []).append(request)
+            for group in groups.values():
+                self._run_batch(group)
+
+    def _run_batch(self, requests):
+        try:
+            z = self._model(np.stack([x for x, _, _ in requests]))
+            if isinstance(z, Node):
+                z = z.as_ndarray()
+            results = [np.array(z[i]) for i in range(len(requests))]
+        except Exception as e:
+            for _, future, _ in requests:
+                future.set_exception(e)
+            return
+
+        now = time.time()
+        with self._lock:
+            self._batch_sizes[len(requests)] += 1
+            self._num_requests += len(requests)
+            self._latencies.extend(now - start for _, _, start in requests)
+        for (_, future, _), result in zip(requests, results):
+            future.set_result(result)
+
+    def metrics(self):
+        """Returns statistics of the served requests.
+
+        Returns:
+            (dict): 'queue_depth' is the number of waiting requests, 'requests' and 'batches'
+            are the numbers of served requests and batches, 'batch_sizes' maps a batch size
+            to the number of batches of that size, and 'latency_p50_ms' and 'latency_p99_ms'
+            are percentiles of the time from submission to the result over the latest requests.
+        """
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000
+            batch_sizes = dict(sorted(self._batch_sizes.items()))
+            num_requests = self._num_requests
+        p50, p99 = np.percentile(latencies, [50, 99]) if len(latencies) else (None, None)
+        return {
+            "queue_depth": self._queue.qsize(),
+            "requests": num_requests,
+            "batches": sum(batch_sizes.values()),
+            "batch_sizes": batch_sizes,
+            "latency_p50_ms": p50,
+            "latency_p99_ms": p99,
+        }
+
+    def close(self):
+        """Serves the queued requests and stops the scheduler thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
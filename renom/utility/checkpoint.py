@@ -0,0 +1,413 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Flat checkpoint format.
+
+A checkpoint consists of a magic string, the length of a JSON index,
+the index itself and a single data blob. Every array is stored in the blob
+at an offset aligned to ``ALIGNMENT`` bytes. The index holds the model path,
+name, type, dtype, shape and offset of each parameter and ``SERIALIZED``
+attribute, so the blob can be memory mapped and parameters can be created
+as views into it without reading or copying the data.
+
+.. code-block:: text
+
+    | b"RENOMCKP" | uint64 index length | JSON index | padding | data blob |
+"""
+
+from __future__ import division
+import os
+import json
+import atexit
+import struct
+import tempfile
+import threading
+import queue
+import numpy as np
+from renom.core import Node, Variable
+from renom.core.basic_node import GraphAttrs
+from renom.config import precision
+import renom.cuda
+
+if renom.cuda.has_cuda():
+    from renom.cuda.gpuvalue import GPUValue
+else:
+    GPUValue = None
+
+MAGIC = b"RENOMCKP"
+VERSION = 1
+ALIGNMENT = 64
+
+_JSON_TYPES = (bool, int, float, str, type(None))
+
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _to_array(value):
+    if isinstance(value, Node):
+        value.to_cpu()
+        return np.asarray(value.view(np.ndarray))
+    if GPUValue is not None and isinstance(value, GPUValue):
+        return value.new_array()
+    return np.asarray(value)
+
+
+def _entries(model):
+    for names, params, attrs in model.flatten_values():
+        path = '.'.join(names)
+        for name, value in params.items():
+            entry = {"model": path, "name": name}
+            if isinstance(value, Variable):
+                entry["type"] = "renom.Variable"
+                entry["auto_update"] = bool(value._auto_update)
+                entry["weight_decay"] = None if value.weight_decay is None else float(value.weight_decay)
+            else:
+                entry["type"] = "renom.Node"
+            yield entry, _to_array(value)
+
+        for name, value in attrs.items():
+            entry = {"model": path, "name": "__dict__." + name}
+            if isinstance(value, _JSON_TYPES) or \
+                    isinstance(value, (list, tuple)) and all(isinstance(v, _JSON_TYPES) for v in value):
+                entry["type"] = "json"
+                entry["value"] = list(value) if isinstance(value, tuple) else value
+                yield entry, None
+            elif isinstance(value, np.generic):
+                entry["type"] = "scalar"
+                yield entry, np.asarray(value)
+            else:
+                entry["type"] = "ndarray"
+                yield entry, _to_array(value)
+
+
+def _snapshot(model, copy=False):
+    index = []
+    arrays = []
+    offset = 0
+    for entry, array in _entries(model):
+        if array is not None:
+            array = np.array(array, order="C", copy=True) if copy else np.ascontiguousarray(array)
+            assert array.dtype != object, \
+                "Attribute {} of {} can not be saved.".format(entry["name"], entry["model"])
+            entry.update(dtype=array.dtype.str, shape=list(array.shape), offset=offset)
+            arrays.append((offset, array))
+            offset = _align(offset + array.nbytes)
+        index.append(entry)
+    return index, arrays, offset
+
+
+def _header(snapshot):
+    index, arrays, size = snapshot
+    header = json.dumps({"version": VERSION, "alignment": ALIGNMENT, "entries": index}).encode("utf-8")
+    return header, _align(len(MAGIC) + 8 + len(header))
+
+
+def _write(filename, snapshot, fsync=False):
+    index, arrays, size = snapshot
+    header, blob_start = _header(snapshot)
+    with open(filename, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for pos, array in arrays:
+            f.seek(blob_start + pos)
+            f.write(array.data)
+        f.truncate(blob_start + size)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def save_checkpoint(model, filename):
+    """Saves parameters and ``SERIALIZED`` attributes of a model in the flat checkpoint format.
+
+    Args:
+        model (Model): Model to be saved.
+        filename (str): File name.
+    """
+    _write(filename, _snapshot(model))
+
+
+def is_checkpoint(filename):
+    """Returns True if the file is in the flat checkpoint format."""
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _parse_index(read, name):
+    # ``read(start, stop)`` returns the bytes of the checkpoint in the range.
+    assert read(0, len(MAGIC)) == MAGIC, "{} is not a checkpoint.".format(name)
+    length, = struct.unpack("<Q", read(len(MAGIC), len(MAGIC) + 8))
+    header = json.loads(read(len(MAGIC) + 8, len(MAGIC) + 8 + length).decode("utf-8"))
+    assert header["version"] <= VERSION, \
+        "Checkpoint version {} is not supported.".format(header["version"])
+    return header["entries"], _align(len(MAGIC) + 8 + length)
+
+
+def _read_index(filename):
+    with open(filename, "rb") as f:
+        def read(start, stop):
+            f.seek(start)
+            return f.read(stop - start)
+        return _parse_index(read, filename)
+
+
+def _view_node(cls, array):
+    # Node() always copies its value with astype, so the node is made as a view here.
+    ret = array.view(cls)
+    ret.attrs = GraphAttrs()
+    Node.__init__(ret)
+    return ret
+
+
+def _create_param(entry, array):
+    cls = Variable if entry["type"] == "renom.Variable" else Node
+    if array.dtype == precision:
+        ret = _view_node(cls, array)
+    else:
+        ret = cls(array)
+    if cls is Variable:
+        ret._auto_update = entry["auto_update"]
+        ret.weight_decay = entry["weight_decay"]
+    return ret
+
+
+def load_checkpoint(model, filename, mmap=False):
+    """Loads a checkpoint saved by :func:`save_checkpoint` to a model.
+
+    Args:
+        model (Model): Model to be loaded. It must have the same structure as the saved model.
+        filename (str): File name.
+        mmap (bool): If True, the data blob is memory mapped in copy-on-write mode
+            and the parameters are views into it. Parameters are paged in when
+            they are accessed, and updates of them are not written to the file.
+    """
+    entries, blob_start = _read_index(filename)
+    if mmap:
+        blob = _map_blob(filename, blob_start, "c")
+    else:
+        with open(filename, "rb") as f:
+            f.seek(blob_start)
+            blob = np.fromfile(f, dtype=np.uint8)
+    _load_entries(model, entries, blob)
+
+
+def _map_blob(filename, blob_start, mode):
+    if os.path.getsize(filename) == blob_start:
+        # An empty range can not be mapped.
+        return np.empty(0, dtype=np.uint8)
+    return np.memmap(filename, dtype=np.uint8, mode=mode, offset=blob_start)
+
+
+def _load_entries(model, entries, blob):
+    for entry in entries:
+        target = model
+        for name in entry["model"].split('.')[1:]:
+            target = getattr(target, name)
+
+        if entry["type"] == "json":
+            value = entry["value"]
+        else:
+            dtype = np.dtype(entry["dtype"])
+            shape = tuple(entry["shape"])
+            nbytes = dtype.itemsize * int(np.prod(shape))
+            array = blob[entry["offset"]:entry["offset"] + nbytes].view(dtype).reshape(shape)
+            if entry["type"] == "scalar":
+                value = array[()]
+            elif entry["type"] == "ndarray":
+                value = np.array(array)
+            else:
+                value = _create_param(entry, array)
+
+        if entry["name"].startswith('__dict__.'):
+            setattr(target, entry["name"].split('.', 1)[1], value)
+        else:
+            setattr(target.params, entry["name"], value)
+
+
+def _shared_directory():
+    # /dev/shm is a memory backed file system on Linux. Files there are never written to disk.
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+class SharedWeights(object):
+    """A file holding the parameters of a model, made by :func:`share_weights`.
+
+    The file is removed by :meth:`unlink`, or when the process which created it exits.
+    """
+
+    def __init__(self, filename):
+        self._filename = filename
+        atexit.register(self._remove)
+
+    @property
+    def name(self):
+        """Path of the file, given to :func:`attach_weights`."""
+        return self._filename
+
+    @property
+    def size(self):
+        """Size of the file in bytes."""
+        return os.path.getsize(self._filename)
+
+    def _remove(self):
+        if os.path.exists(self._filename):
+            os.remove(self._filename)
+
+    def unlink(self):
+        """Removes the file. Attached processes can use the weights until they exit."""
+        self._remove()
+
+
+def share_weights(model, name=None):
+    """Publishes the parameters and ``SERIALIZED`` attributes of a model for other processes.
+
+    They are written in the flat checkpoint format to a file in ``/dev/shm``, or in the
+    temporary directory where it does not exist. Other processes attach the file with
+    :func:`attach_weights`. It is mapped read-only, so all processes share one physical
+    copy of the weights in the page cache.
+
+    Args:
+        model (Model): Model to be published.
+        name (str): File name. A name which is not an absolute path is placed in the
+            directory above. If None, a unique name is generated.
+
+    Returns:
+        (SharedWeights): Handle of the file.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> from renom.utility.checkpoint import share_weights, attach_weights
+        >>> model = rm.Sequential([rm.Dense(3), rm.Dense(2)])
+        >>> _ = model(np.random.rand(1, 4))
+        >>> shared = share_weights(model)
+        >>> # In a worker process.
+        >>> worker = rm.Sequential([rm.Dense(3), rm.Dense(2)])
+        >>> attach_weights(worker, shared.name)
+        >>> np.allclose(worker(np.ones((1, 4))), model(np.ones((1, 4))))
+        True
+        >>> shared.unlink()
+    """
+    directory = _shared_directory()
+    if name is None:
+        fd, filename = tempfile.mkstemp(prefix="renom_", suffix=".ckpt", dir=directory)
+        os.close(fd)
+    else:
+        filename = os.path.join(directory, name)
+    # The file is renamed when complete, so attaching processes never see a partial file.
+    tmp = filename + ".tmp"
+    _write(tmp, _snapshot(model))
+    os.rename(tmp, filename)
+    return SharedWeights(filename)
+
+
+def attach_weights(model, name):
+    """Sets the parameters published by :func:`share_weights` to a model without copying them.
+
+    Parameters of the model become read-only views of the memory mapped file,
+    so the model can be used for inference only. Updating them raises an error.
+
+    Args:
+        model (Model): Model which has the same structure as the published model.
+        name (str): Path of the file given by :attr:`SharedWeights.name`.
+    """
+    entries, blob_start = _read_index(name)
+    _load_entries(model, entries, _map_blob(name, blob_start, "r"))
+
+
+class AsyncCheckpointWriter(object):
+    """Writes checkpoints on a background thread.
+
+    :meth:`save` copies the parameters and ``SERIALIZED`` attributes of a model
+    in memory and returns. A background thread writes the copy in the flat checkpoint
+    format to a temporary file, fsyncs it and renames it to the given name, so a
+    checkpoint file is either complete or absent. Only the last ``keep`` checkpoints
+    written by the writer are kept.
+
+    Args:
+        directory (str): Directory where checkpoints are written.
+        keep (int): Number of checkpoints to be kept. If None, all checkpoints are kept.
+        max_pending (int): Maximum number of snapshots waiting to be written.
+            :meth:`save` blocks while the queue is full, so at most ``max_pending``
+            copies of the parameters are held in memory.
+
+    Example:
+        >>> import os
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> from renom.utility.checkpoint import AsyncCheckpointWriter
+        >>> model = rm.Dense(2)
+        >>> _ = model(np.random.rand(1, 3))
+        >>> writer = AsyncCheckpointWriter("checkpoints", keep=2)
+        >>> for epoch in range(3):
+        ...     writer.save(model, "epoch%d.ckpt" % epoch)
+        >>> writer.close()
+        >>> sorted(os.listdir("checkpoints"))
+        ['epoch1.ckpt', 'epoch2.ckpt']
+    """
+
+    def __init__(self, directory, keep=3, max_pending=2):
+        assert keep is None or keep > 0, "Keep must be positive or None. Actual is {}".format(keep)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.keep = keep
+        self.written = []
+        self._error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write(self, filename, snapshot):
+        path = os.path.join(self.directory, filename)
+        tmp = path + ".tmp"
+        _write(tmp, snapshot, fsync=True)
+        os.replace(tmp, path)
+        if path in self.written:
+            self.written.remove(path)
+        self.written.append(path)
+        while self.keep is not None and len(self.written) > self.keep:
+            os.remove(self.written.pop(0))
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def save(self, model, filename):
+        """Copies the parameters of the model and queues them to be written.
+
+        Args:
+            model (Model): Model to be saved.
+            filename (str): File name relative to the directory.
+        """
+        self._raise_error()
+        assert self._thread.is_alive(), "The writer is closed."
+        self._queue.put((filename, _snapshot(model, copy=True)))
+
+    def wait(self):
+        """Blocks until all queued checkpoints are written."""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """Writes all queued checkpoints and stops the background thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
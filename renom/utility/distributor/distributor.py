@@ -6,6 +6,7 @@ import numpy as np
 from renom.core import Node
 from renom.cuda import has_cuda, is_cuda_active
 from renom.config import precision
+from renom.layers.function.packed_sequence import pack_sequence
 
 if has_cuda():
     import renom.cuda.base.cuda_base as cu
@@ -232,11 +233,82 @@ class GPUDistributor(Distributor):
         cu.freePinnedMemory()
 
 
+def _as_sequences(x):
+    # Variable length sequences are held in a 1d object array so that
+    # they can be indexed in the same way as other data.
+    if isinstance(x, np.ndarray) and x.dtype != object:
+        return x
+    ret = np.empty(len(x), dtype=object)
+    for i, s in enumerate(x):
+        ret[i] = np.asarray(s)
+    return ret
+
+
 class TimeSeriesDistributor(NdarrayDistributor):
 
+    '''
+    Derived class of Distributor which manages time series data.
+
+    Args:
+        x (ndarray, list): Input data of shape (N, T, D), or a list of N arrays
+            of shape (L_i, D) which have different lengths.
+        y (ndarray, list): Target data. Targets of every timestep can be given
+            as a list of N arrays of shape (L_i, K).
+
+    Example:
+        >>> import numpy as np
+        >>> from renom.utility.distributor import TimeSeriesDistributor
+        >>> x = [np.random.rand(np.random.randint(5, 500), 3) for _ in range(100)]
+        >>> y = np.random.rand(100, 1)
+        >>> dist = TimeSeriesDistributor(x, y)
+        >>> for packed_x, batch_y in dist.bucket_batch(16):
+        ...     packed_x.batch_sizes[0]
+    '''
+
     def __init__(self, x, y, **kwargs):
+        x = _as_sequences(x)
+        y = _as_sequences(y) if isinstance(y, (list, tuple)) else y
         super(TimeSeriesDistributor, self).__init__(x=x, y=y,
                                                     data_table=kwargs.get("data_table"))
-        assert x.ndim == 3
+        assert x.ndim == 3 or x.dtype == object
         assert len(x) == len(y)
         self._data_size = len(x)
+
+    @property
+    def lengths(self):
+        """Length of each sequence."""
+        if self._data_x.dtype == object:
+            return np.array([len(s) for s in self._data_x], dtype=np.int64)
+        return np.full(self._data_size, self._data_x.shape[1], dtype=np.int64)
+
+    def bucket_batch(self, batch_size, shuffle=True):
+        '''
+        This function returns minibatches of sequences which have similar lengths
+        as :class:`PackedSequence`, so that little computation is spent on padding.
+
+        Sequences are sorted by their lengths and split into batches. If shuffle
+        is True, sequences of the same length and the order of batches are shuffled.
+
+        Args:
+            batch_size (int): Size of batch.
+            shuffle (bool): If True is passed, batches are yielded in random order.
+
+        Yields:
+            (PackedSequence, ndarray): Packed input sequences and targets. Targets given
+            as a list of sequences are yielded as a PackedSequence too.
+        '''
+        lengths = self.lengths
+        if shuffle:
+            perm = np.random.permutation(self._data_size)
+            order = perm[np.argsort(lengths[perm], kind="mergesort")]
+        else:
+            order = np.argsort(lengths, kind="mergesort")
+        batches = [order[i:i + batch_size] for i in range(0, self._data_size, batch_size)]
+        if shuffle:
+            batches = [batches[i] for i in np.random.permutation(len(batches))]
+
+        for p in batches:
+            batch_y = self._data_y[p]
+            if batch_y.dtype == object:
+                batch_y = pack_sequence(list(batch_y))
+            yield pack_sequence(list(self._data_x[p])), batch_y
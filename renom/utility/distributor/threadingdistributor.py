@@ -4,6 +4,7 @@ import numpy as np
 
 from renom.utility.distributor.imageloader import ImageLoader
 from renom.utility.image.data_augmentation.resize import resize
+from renom.layers.function.utils import check_layout, transpose_layout, NCHW, NHWC
 from .utilities import make_ndarray
 
 
@@ -21,9 +22,11 @@ class ImageDistributor(object):
         imsize (tuple): Resize input image for converting batch ndarray.
         color (str): Color of Input Image. ["RGB", "GRAY"]
         augmentation (function): Augmentater for input Image.
+        layout (str): Layout of yielded image batches, 'NCHW' or 'NHWC'.
     """
 
-    def __init__(self, image_path_list, y_list=None, class_list=None, imsize=(32, 32), color="RGB", augmentation=None):
+    def __init__(self, image_path_list, y_list=None, class_list=None, imsize=(32, 32), color="RGB",
+                 augmentation=None, layout=NCHW):
         self._data_table = image_path_list
         self._data_size = len(image_path_list)
         self._data_y = y_list
@@ -31,10 +34,15 @@ class ImageDistributor(object):
         self._imsize = imsize
         self._color = color
         self._augmentation = augmentation
+        self._layout = check_layout(layout)
 
     def __len__(self):
         return self._data_size
 
+    def _to_layout(self, imgs):
+        # Loaded images are already channels-last.
+        return transpose_layout(np.array(imgs, dtype=np.float32), NHWC, self._layout)
+
 
 class ImageDetectionDistributor(ImageDistributor):
     """Distributor class for tasks of image detection.
@@ -49,6 +57,7 @@ class ImageDetectionDistributor(ImageDistributor):
         imsize (tuple): resize input image for converting batch ndarray
         color (str): color of Input Image. ["RGB", "GRAY"]
         augmentation (function): augmentater for Input Image
+        layout (str): layout of yielded image batches, 'NCHW' or 'NHWC'
 
     :Example:
         >>> from renom.utility.load.imageloader.threadingdistributor import ImageDetectionDistributor
@@ -71,10 +80,11 @@ class ImageDetectionDistributor(ImageDistributor):
     """
 
     def __init__(self, image_path_list, y_list=None, class_list=None, imsize=(360, 360),
-                 color='RGB', augmentation=None):
+                 color='RGB', augmentation=None, layout=NCHW):
         super(ImageDetectionDistributor, self).__init__(image_path_list, y_list=y_list,
                                                         class_list=class_list, imsize=imsize,
-                                                        color=color, augmentation=augmentation)
+                                                        color=color, augmentation=augmentation,
+                                                        layout=layout)
 
         if self._data_y is not None:
             self._data_y, _ = make_ndarray(self._data_y, len(self._class_list))
@@ -113,7 +123,7 @@ class ImageDetectionDistributor(ImageDistributor):
                 if self._augmentation is not None:
                     imgs, data_y = self._augmentation.create(
                         np.array(imgs, dtype=np.float32), labels=data_y, num_class=len(self._class_list))
-                imgs = np.array(imgs, dtype=np.float32).transpose((0, 3, 1, 2))
+                imgs = self._to_layout(imgs)
                 yield imgs, data_y
             # Case: we are only given images
             else:
@@ -125,7 +135,7 @@ class ImageDetectionDistributor(ImageDistributor):
                     imgs[index] = resize(img, size=self._imsize)[0]
                 if self._augmentation is not None:
                     imgs = self._augmentation.create(np.array(imgs, dtype=np.float32))
-                imgs = np.array(imgs, dtype=np.float32).transpose((0, 3, 1, 2))
+                imgs = self._to_layout(imgs)
                 yield imgs
 
 
@@ -140,6 +150,7 @@ class ImageClassificationDistributor(ImageDistributor):
         imsize (tuple): resize input image for converting batch ndarray
         color (str): color of Input Image. ["RGB", "GRAY"]
         augmentation: (function) augmentater for Input Image
+        layout (str): layout of yielded image batches, 'NCHW' or 'NHWC'
 
     Example:
         >>> from renom.utility.load.imageloader.threadingdistributor import ImageClassificationDistributor
@@ -162,10 +173,11 @@ class ImageClassificationDistributor(ImageDistributor):
     """
 
     def __init__(self, image_path_list, y_list=None, class_list=None,
-                 imsize=(360, 360), color='RGB', augmentation=None):
+                 imsize=(360, 360), color='RGB', augmentation=None, layout=NCHW):
         super(ImageClassificationDistributor, self).__init__(image_path_list, y_list=y_list,
                                                              class_list=class_list, imsize=imsize,
-                                                             color=color, augmentation=augmentation)
+                                                             color=color, augmentation=augmentation,
+                                                             layout=layout)
 
     def batch(self, batch_size, shuffle):
         """
@@ -196,7 +208,7 @@ class ImageClassificationDistributor(ImageDistributor):
             if self._augmentation is not None:
                 imgs = self._augmentation.create(np.array(imgs, dtype=np.float32))
             lbls = np.array(lbls)
-            imgs = np.array(imgs, dtype=np.float32).transpose(0, 3, 1, 2)
+            imgs = self._to_layout(imgs)
             if self._data_y is None:
                 yield imgs
             yield imgs, lbls
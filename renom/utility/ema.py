@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Exponential moving average of model parameters."""
+
+from __future__ import division
+import numpy as np
+from renom.core import Variable, to_value
+from renom.config import precision
+from renom.utility.checkpoint import _view_node
+
+
+def _assign(param, value):
+    # The host array becomes the value. A stale copy on GPU is dropped.
+    param.release_gpu()
+    param.copy_from(value)
+
+
+class ParameterEMA(object):
+    """Exponential moving average of the parameters of a model.
+
+    At every ``every``-th call of :meth:`update`, the shadow parameters are updated as
+
+    .. math::
+        \\theta_{ema} \\leftarrow decay \\cdot \\theta_{ema} + (1 - decay) \\cdot \\theta
+
+    Shadow parameters of the whole model are kept in one flat contiguous buffer,
+    so an update is a few in-place operations over the buffer instead of
+    allocating an array for each parameter.
+
+    If ``target`` is given, parameters of the target model become views of the buffer,
+    so the target follows the model without any copy. This is the soft update of target
+    networks of DDPG, and with decay 0 the hard update of DQN. Shadow parameters are
+    initialized with the parameters of the target, or of the model if the target
+    does not have them yet.
+
+    Parameters created or replaced after construction, for example when a model is
+    called first, are picked up at the next update.
+
+    Args:
+        model (Model): Model whose parameters are averaged.
+        decay (float): Decay rate of the average.
+        every (int): The average is updated at every ``every``-th call of :meth:`update`.
+        target (Model): Model which has the same structure as ``model`` and holds the average.
+
+    Example:
+        >>> import numpy as np
+        >>> import renom as rm
+        >>> from renom.utility.ema import ParameterEMA
+        >>> model = rm.Sequential([rm.Dense(3), rm.Dense(1)])
+        >>> x, y = np.random.rand(8, 4), np.random.rand(8, 1)
+        >>> _ = model(x)
+        >>> ema = ParameterEMA(model, decay=0.99)
+        >>> opt = rm.Sgd()
+        >>> for _ in range(10):
+        ...     with model.train():
+        ...         loss = rm.mean_squared_error(model(x), y)
+        ...     loss.grad().update(opt)
+        ...     ema.update()
+        ...
+        >>> with ema:
+        ...     # Evaluated with the averaged parameters.
+        ...     z = model(x)
+    """
+
+    def __init__(self, model, decay=0.999, every=1, target=None):
+        assert 0 <= decay <= 1, "decay must be in [0, 1]. Actual is {}".format(decay)
+        assert every > 0, "every must be positive. Actual is {}".format(every)
+        self._model = model
+        self._target = target
+        self.decay = decay
+        self._every = every
+        self._count = 0
+        self._registry = None
+        self._params = []
+        self._slices = {}
+        self._shadow = np.empty(0, dtype=precision)
+        self._scratch = np.empty(0, dtype=precision)
+        self._build()
+
+    @property
+    def shadow(self):
+        """The flat buffer of the averaged parameters."""
+        self._build()
+        return self._shadow
+
+    def named_shadows(self):
+        """Iterates over the averaged parameters.
+
+        Yields:
+            (str, ndarray): Dotted name of the parameter and a view of the buffer.
+        """
+        self._build()
+        return self._named_shadows()
+
+    def _named_shadows(self):
+        for name, p in self._params:
+            yield name, self._shadow[self._slices[name]].reshape(p.shape)
+
+    def _build(self):
+        # Lays out the buffer again if the parameters of the model have been replaced.
+        registry = self._model._registry()
+        if registry is self._registry:
+            return
+        self._registry = registry
+        params = [(name, p) for name, p in self._model.named_parameters() if p is not None]
+        if [(n, id(p)) for n, p in params] == [(n, id(p)) for n, p in self._params]:
+            return
+
+        previous = dict(self._named_shadows())
+        targets = dict(self._target.named_parameters()) if self._target is not None else {}
+        slices = {}
+        size = 0
+        for name, p in params:
+            slices[name] = slice(size, size + p.size)
+            size += p.size
+        shadow = np.empty(size, dtype=precision)
+        for name, p in params:
+            if name in previous and previous[name].shape == p.shape:
+                value = previous[name]
+            elif targets.get(name, None) is not None and targets[name].shape == p.shape:
+                value = to_value(targets[name])
+            else:
+                value = to_value(p)
+            shadow[slices[name]] = value.ravel()
+
+        self._params = params
+        self._slices = slices
+        self._shadow = shadow
+        self._scratch = np.empty(size, dtype=precision)
+        if self._target is not None:
+            self._bind_target(targets)
+
+    def _bind_target(self, targets):
+        # Parameters of the target become views of the buffer.
+        for name, p in self._params:
+            path = name.split(".")
+            owner = self._target
+            for attr in path[:-1]:
+                owner = getattr(owner, attr)
+            view = _view_node(Variable, self._shadow[self._slices[name]].reshape(p.shape))
+            source = targets.get(name, None)
+            source = source if isinstance(source, Variable) else p
+            view._auto_update = source._auto_update
+            view.weight_decay = source.weight_decay
+            owner.params[path[-1]] = view
+
+    def update(self):
+        """Updates the average with the current parameters of the model."""
+        self._build()
+        self._count += 1
+        if self._count % self._every:
+            return
+        scratch = self._scratch
+        for name, p in self._params:
+            np.multiply(to_value(p).reshape(-1), 1 - self.decay, out=scratch[self._slices[name]])
+        self._shadow *= self.decay
+        self._shadow += scratch
+        if self._target is not None:
+            for _, p in self._target.named_parameters():
+                p.release_gpu()
+                p._increment_version()
+
+    def swap(self):
+        """Exchanges the parameters of the model and the averaged parameters.
+
+        Calling it again restores the parameters.
+        """
+        self._build()
+        scratch = self._scratch
+        for name, p in self._params:
+            scratch[self._slices[name]] = to_value(p).reshape(-1)
+        for name, p in self._params:
+            _assign(p, self._shadow[self._slices[name]].reshape(p.shape))
+        self._shadow[...] = scratch
+        if self._target is not None:
+            for _, p in self._target.named_parameters():
+                p.release_gpu()
+                p._increment_version()
+
+    def __enter__(self):
+        self.swap()
+        return self
+
+    def __exit__(self, *args):
+        self.swap()
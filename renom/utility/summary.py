@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Summary of a model made by tracing one forward pass.
+
+Every call of a model is recorded through :meth:`Model.set_hook <renom.Model.set_hook>`,
+and every node created during the call through :meth:`Node.set_hook <renom.Node.set_hook>`.
+Nodes are attributed to the innermost model being called, so the numbers of a model
+do not include those of its child models.
+"""
+
+from __future__ import division, print_function
+import numpy as np
+from renom.core import Node, Variable
+from renom.config import precision
+from renom.layers.function.parameterized import Model, Sequential
+import renom.cuda
+
+if renom.cuda.has_cuda():
+    from renom.cuda.gpuvalue import GPUValue
+    _ARRAY_TYPES = (np.ndarray, GPUValue)
+else:
+    _ARRAY_TYPES = (np.ndarray, )
+
+
+# Nodes which only move or reshape data.
+_NO_FLOPS = {"Reshape", "Transpose", "Transpose2d", "GetItem", "GetSlice", "GetFgAry",
+             "GetIthAry", "GetNthAry", "flatten", "concat", "Pos", "Mark", "NodeMark", "ModelMark",
+             "EnterModel", "LeaveModel"}
+
+_CONVOLUTIONS = {"conv2d", "conv2d_nhwc", "group_conv2d", "group_conv2d_nhwc", "depthwise_conv2d", "convnd"}
+
+_DECONVOLUTIONS = {"deconv2d", "deconvnd"}
+
+
+def _nbytes(a):
+    return int(a.nbytes) if isinstance(a, _ARRAY_TYPES) else 0
+
+
+def _flops(node):
+    # Estimated forward and backward FLOPs of a node. A multiply-add counts as 2 FLOPs.
+    name = type(node).__name__
+    attrs = node.attrs
+    if name in _NO_FLOPS:
+        return 0, 0
+    elif name == "dot" and attrs.get("_lhs") is not None:
+        forward = 2 * node.size * attrs._lhs.shape[-1]
+        return forward, 2 * forward
+    elif name in _CONVOLUTIONS and attrs.get("_w") is not None:
+        forward = 2 * node.size * int(np.prod(attrs._w.shape[1:]))
+        return forward, 2 * forward
+    elif name in _DECONVOLUTIONS and attrs.get("_w") is not None:
+        forward = 2 * int(np.prod(attrs._x.shape)) * int(np.prod(attrs._w.shape[1:]))
+        return forward, 2 * forward
+    elif name == "attention" and attrs.get("_Q") is not None:
+        N, H, Tq, D = attrs._Q.shape
+        pairs = N * H * Tq * attrs._K.shape[2]
+        Dv = attrs._V.shape[3]
+        # The backward recomputes the scores.
+        return 2 * pairs * (D + Dv), 2 * pairs * (3 * D + 2 * Dv)
+    elif name == "embedding":
+        return 0, node.size
+    return node.size, node.size
+
+
+class _Frame(object):
+
+    def __init__(self, name, layer, x, depth):
+        self.name = name
+        self.layer = layer
+        self.depth = depth
+        self.input_shape = tuple(x.shape) if hasattr(x, "shape") else None
+        self.output_shape = None
+        self.nodes = []
+
+
+class _SummaryHook(object):
+    # Records calls of models and nodes created in them.
+
+    def __init__(self, model):
+        self.names = {id(m): ".".join(name[1:]) or "root" for name, m in model._named_models()}
+        self.frames = []
+        self.stack = []
+
+    def _enter(self, name, layer, x):
+        frame = _Frame(name, layer, x, len(self.stack))
+        self.frames.append(frame)
+        self.stack.append(frame)
+        return frame
+
+    def _leave(self, ret):
+        frame = self.stack.pop()
+        frame.output_shape = tuple(ret.shape) if hasattr(ret, "shape") else None
+
+    def call_enter(self, model, x, args, kwargs):
+        self._enter(self.names.get(id(model), "?"), model, x)
+        return x, args, kwargs
+
+    def call_leave(self, model, ret, x, args, kwargs):
+        self._leave(ret)
+        return ret
+
+    def on_forward(self, model, forward, x, args, kwargs):
+        if type(model).forward is not Sequential.forward:
+            return forward(x, *args, **kwargs)
+        # Layers of a Sequential which are not models, such as activations and pooling,
+        # get their own rows.
+        t = x
+        for i, layer in enumerate(model._layers):
+            if isinstance(layer, Model):
+                t = layer(t)
+            else:
+                parent = self.stack[-1].name
+                self._enter("l%d" % i if parent == "root" else parent + ".l%d" % i, layer, t)
+                t = layer(t)
+                self._leave(t)
+        return t
+
+    def leave_create(self, nodecls, ret):
+        if self.stack and not isinstance(ret, Variable):
+            self.stack[-1].nodes.append(ret)
+        return ret
+
+
+def _retained(outputs, exclude):
+    # Arrays reachable from the outputs through the graph, which are kept until backward.
+    seen = set(id(a) for a in exclude)
+    arrays = {}
+    stack = list(outputs)
+    while stack:
+        a = stack.pop()
+        if id(a) in seen:
+            continue
+        seen.add(id(a))
+        if isinstance(a, Variable):
+            continue
+        elif isinstance(a, Node):
+            arrays[id(a)] = a
+            stack.extend(a._args)
+            if a.attrs is not None:
+                stack.extend(a.attrs.get_attrs())
+        elif isinstance(a, _ARRAY_TYPES):
+            arrays[id(a)] = a
+        elif isinstance(a, (list, tuple)):
+            stack.extend(a)
+    return arrays
+
+
+class ModelSummary(object):
+    """Result of :meth:`Model.summary <renom.Model.summary>`.
+
+    Attributes:
+        layers (list): A dict for each call of a model or a layer of Sequential, in calling order.
+            'name' is the dotted name of the model, 'type' is its class name, 'depth' is
+            the nesting level, and 'input_shape' and 'output_shape' include the batch axis.
+            'params' and 'param_bytes' are the number and the size of the parameters of the
+            model itself. 'activation_bytes' is the size of the arrays created by the model
+            and kept by the computational graph for backward, such as the output, the col
+            array of conv2d and the gates of lstm. 'forward_flops' and 'backward_flops'
+            are estimates of floating point operations, where a multiply-add counts as 2.
+        total (dict): Sums of 'params', 'param_bytes', 'activation_bytes', 'forward_flops'
+            and 'backward_flops'. Parameters of a model called more than once are counted once.
+    """
+
+    _COLUMNS = (("Layer", "{name}"), ("Type", "{type}"), ("Output shape", "{output_shape}"),
+                ("Params", "{params:,}"), ("Param bytes", "{param_bytes:,}"),
+                ("Activation bytes", "{activation_bytes:,}"),
+                ("Forward FLOPs", "{forward_flops:,}"), ("Backward FLOPs", "{backward_flops:,}"))
+
+    def __init__(self, layers, total):
+        self.layers = layers
+        self.total = total
+
+    def __str__(self):
+        rows = [[title for title, _ in self._COLUMNS]]
+        for layer in self.layers:
+            layer = dict(layer, name="  " * layer["depth"] + layer["name"])
+            rows.append([fmt.format(**layer) for _, fmt in self._COLUMNS])
+        total = dict(self.total, name="Total", type="", output_shape="")
+        rows.append([fmt.format(**total) for _, fmt in self._COLUMNS])
+        widths = [max(len(row[i]) for row in rows) for i in range(len(self._COLUMNS))]
+
+        def line(row):
+            cells = [c.ljust(w) if i < 3 else c.rjust(w) for i, (c, w) in enumerate(zip(row, widths))]
+            return "  ".join(cells).rstrip()
+        rule = "-" * len(line(rows[0]))
+        return "\n".join([line(rows[0]), rule] + [line(r) for r in rows[1:-1]] + [rule, line(rows[-1])])
+
+
+def _extrapolate(v2, v4, batch_size):
+    # Values traced with batches of 2 and 4, which are affine in the batch size.
+    return v2 + (v4 - v2) // 2 * (batch_size - 2)
+
+
+def summarize(model, input_shape, batch_size=1):
+    """Traces one forward pass of a model and returns a :class:`ModelSummary`.
+
+    See :meth:`Model.summary <renom.Model.summary>`.
+    """
+    if batch_size >= 2:
+        return _summarize(model, input_shape, batch_size)
+
+    # Layers such as BatchNormalize do not accept a batch of 1 in training mode, so
+    # batches of 2 and 4 are traced and the numbers are extrapolated to the batch size.
+    s2 = _summarize(model, input_shape, 2)
+    s4 = _summarize(model, input_shape, 4)
+
+    def shape(a, b):
+        if a is None:
+            return None
+        return tuple(_extrapolate(i, j, batch_size) for i, j in zip(a, b))
+
+    layers = []
+    for l2, l4 in zip(s2.layers, s4.layers):
+        row = dict(l2)
+        row["input_shape"] = shape(l2["input_shape"], l4["input_shape"])
+        row["output_shape"] = shape(l2["output_shape"], l4["output_shape"])
+        for key in ("activation_bytes", "forward_flops", "backward_flops"):
+            row[key] = _extrapolate(l2[key], l4[key], batch_size)
+        layers.append(row)
+    total = dict(s2.total)
+    for key in ("activation_bytes", "forward_flops", "backward_flops"):
+        total[key] = sum(row[key] for row in layers)
+    return ModelSummary(layers, total)
+
+
+def _summarize(model, input_shape, batch_size):
+    x = np.random.rand(batch_size, *input_shape).astype(precision)
+    models = list(model.iter_models())
+    # Restores attributes, such as moving averages of BatchNormalize, replaced while tracing.
+    states = [(m, dict((k, v) for k, v in m.__dict__.items() if k != "_parameters")) for m in models]
+    hook = _SummaryHook(model)
+    prev_model_hook, prev_node_hook = Model._model_hook, Node._node_hook
+    Model.set_hook(hook)
+    Node.set_hook(hook)
+    try:
+        with model.train():
+            ret = model(x)
+    finally:
+        Model.set_hook(prev_model_hook)
+        Node.set_hook(prev_node_hook)
+        for m, state in states:
+            m.__dict__.update(state)
+
+    retained = _retained(ret if isinstance(ret, (list, tuple)) else [ret], [x])
+    layers = []
+    seen_params = set()
+    counted = set()
+    total = dict.fromkeys(("params", "param_bytes", "activation_bytes", "forward_flops", "backward_flops"), 0)
+    for frame in hook.frames:
+        params = list(frame.layer.params.values()) if isinstance(frame.layer, Model) else []
+        activations = {}
+        forward = backward = 0
+        for node in frame.nodes:
+            f, b = _flops(node)
+            forward += f
+            backward += 0 if node._no_backward else b
+            if id(node) not in retained:
+                continue
+            # Nodes in attributes are counted by the model which created them.
+            arrays = [node] + [a for a in node.attrs.get_attrs() if not isinstance(a, Node)]
+            for a in arrays:
+                if id(a) in retained and id(a) not in counted:
+                    counted.add(id(a))
+                    activations[id(a)] = a
+        row = {
+            "name": frame.name,
+            "type": type(frame.layer).__name__,
+            "depth": frame.depth,
+            "input_shape": frame.input_shape,
+            "output_shape": frame.output_shape,
+            "params": sum(int(p.size) for p in params if p is not None),
+            "param_bytes": sum(_nbytes(p) for p in params),
+            "activation_bytes": sum(_nbytes(a) for a in activations.values()),
+            "forward_flops": int(forward),
+            "backward_flops": int(backward),
+        }
+        layers.append(row)
+        for p in params:
+            if p is not None and id(p) not in seen_params:
+                seen_params.add(id(p))
+                total["params"] += int(p.size)
+                total["param_bytes"] += _nbytes(p)
+        for key in ("activation_bytes", "forward_flops", "backward_flops"):
+            total[key] += row[key]
+    return ModelSummary(layers, total)
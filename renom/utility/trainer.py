@@ -113,6 +113,12 @@ class Trainer(object):
         optimizer (Optimizer): Gradient descent algorithm.
         shuffle (bool): If it's true, mini batch is created randomly.
         events (dict): Dictionary of function.
+        checkpoint_every (int): If given with checkpoint_dir, the model is saved every
+            ``checkpoint_every`` epochs by :class:`AsyncCheckpointWriter
+            <renom.utility.checkpoint.AsyncCheckpointWriter>`. Parameters are copied
+            in memory at the end of the epoch and written on a background thread.
+        checkpoint_dir (str): Directory where checkpoints are written as 'epoch{n}.ckpt'.
+        checkpoint_keep (int): Number of the latest checkpoints to be kept.
 
     Example:
         >>> import numpy as np
@@ -138,7 +144,8 @@ class Trainer(object):
     """
 
     def __init__(self, model, num_epoch, loss_func, batch_size,
-                 optimizer=None, shuffle=True, events=None, num_gpu=1, regularization=None):
+                 optimizer=None, shuffle=True, events=None, num_gpu=1, regularization=None,
+                 checkpoint_every=None, checkpoint_dir=None, checkpoint_keep=3):
 
         self.model = model
         self.num_epoch = num_epoch
@@ -150,6 +157,10 @@ class Trainer(object):
         self.num_gpu = num_gpu
         self.train_loss_list = []
         self.test_loss_list = []
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_keep = checkpoint_keep
+        self.checkpoint_writer = None
 
         if events:
             self._events = events.copy()
@@ -187,6 +198,10 @@ class Trainer(object):
             for n in range(self.num_gpu):
                 models[n].set_gpu(n)
 
+        if self.checkpoint_every and self.checkpoint_dir:
+            from renom.utility.checkpoint import AsyncCheckpointWriter
+            self.checkpoint_writer = AsyncCheckpointWriter(self.checkpoint_dir, keep=self.checkpoint_keep)
+
         while self.epoch < self.num_epoch:
             self.on_event('start_epoch')
             self.nth = 0
@@ -260,6 +275,8 @@ class Trainer(object):
                 self.nth += 1
 
             self.on_event('end_epoch')
+            if self.checkpoint_writer is not None and (self.epoch + 1) % self.checkpoint_every == 0:
+                self.checkpoint_writer.save(self.model, "epoch%d.ckpt" % self.epoch)
             self.epoch += 1
 
             # release objects
@@ -267,6 +284,9 @@ class Trainer(object):
             self.outputs = self.losses = self.grads = None
             self.avg_train_loss = None
 
+        if self.checkpoint_writer is not None:
+            self.checkpoint_writer.close()
+
     def test(self, data):
         """Test method.
         This method executes forward propagation for given data.
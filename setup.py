@@ -129,7 +129,8 @@ class build_ext(orig_build_ext):
 
 
 requires = [
-    "numpy", "scikit-image", "scikit-learn", "Cython>=0.24.0", "Pillow", "future"
+    "numpy", "scikit-image", "scikit-learn", "Cython>=0.24.0", "Pillow", "future",
+    'futures; python_version < "3"'
 ]
 
 
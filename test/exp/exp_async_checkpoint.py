@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+from renom.utility.checkpoint import AsyncCheckpointWriter, _snapshot, _write
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    model = rm.Sequential([rm.Dense(4096) for _ in range(8)])
+    x = np.random.rand(64, 4096).astype(np.float32)
+    model(x)
+    opt = rm.Sgd(0.01)
+
+    def step():
+        with model.train():
+            loss = rm.sum(model(x))
+        loss.grad().update(opt)
+
+    step()
+    start = time.time()
+    for _ in range(5):
+        step()
+    print("train step: {:.3f} sec".format((time.time() - start) / 5))
+
+    d = tempfile.mkdtemp()
+    for fmt in ("hdf5", "flat"):
+        start = time.time()
+        model.save(os.path.join(d, "model." + fmt), format=fmt)
+        print("blocking save {:5s}: {:.3f} sec".format(fmt, time.time() - start))
+    start = time.time()
+    _write(os.path.join(d, "model.fsync"), _snapshot(model), fsync=True)
+    print("blocking save flat + fsync: {:.3f} sec".format(time.time() - start))
+
+    writer = AsyncCheckpointWriter(os.path.join(d, "async"), keep=2)
+    stalls = []
+    start = time.time()
+    for i in range(5):
+        step()
+        t = time.time()
+        writer.save(model, "step%d.ckpt" % i)
+        stalls.append(time.time() - t)
+    writer.close()
+    print("async save: {:.3f} sec per save call (max {:.3f}), 5 steps + 5 saves {:.3f} sec, kept {}".format(
+        np.mean(stalls), np.max(stalls), time.time() - start, sorted(os.listdir(os.path.join(d, "async")))))
+    shutil.rmtree(d)
+
+
+if __name__ == '__main__':
+    main()
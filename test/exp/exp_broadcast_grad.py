@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import tracemalloc
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def reduction_loss(x, b):
+    # Large reductions at the end of a loss.
+    return rm.sum(x + b) + rm.mean(x)
+
+
+def bench(func, *args, loop=5):
+    func(*args).grad()
+    tracemalloc.start()
+    start = time.time()
+    for _ in range(loop):
+        loss = func(*args)
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        loss.grad()
+        peak = tracemalloc.get_traced_memory()[1] - base
+    elapsed = (time.time() - start) / loop
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    x = rm.Variable(np.random.rand(256, 512, 64).astype(np.float32))
+    b = rm.Variable(np.random.rand(64).astype(np.float32))
+    t, m = bench(reduction_loss, x, b)
+    print("sum(x + b) + mean(x): {:.4f} sec/iter, backward peak {:.1f} MB (x is {:.1f} MB)".format(
+        t, m, x.nbytes / 2**20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import subprocess
+import tempfile
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+UNITS = 4096
+LAYERS = 8
+
+
+def build():
+    return rm.Sequential([rm.Dense(UNITS) for _ in range(LAYERS)])
+
+
+def max_rss():
+    # ru_maxrss of a child starts at the value of the parent on linux, VmHWM is reset by exec.
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+
+
+def load(fname, mmap):
+    # Runs in a child process to measure the peak memory of a single load.
+    set_cuda_active(False)
+    model = build()
+    before = max_rss()
+    start = time.time()
+    model.load(fname, mmap=mmap)
+    loaded = time.time() - start
+    loaded_rss = max_rss() - before
+    w = model[0].params.w
+    w.as_ndarray()[0].sum()
+    first = time.time() - start
+    total = sum(float(m.params.w.as_ndarray().sum()) for m in model.iter_models() if m.params)
+    touched = time.time() - start
+    print("{:.4f} {:.1f} {:.4f} {:.4f} {:.1f} {}".format(
+        loaded, loaded_rss, first, touched, max_rss() - before, total))
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    model = build()
+    model(np.random.rand(1, UNITS).astype(np.float32))
+    size = sum(m.params.w.nbytes + m.params.b.nbytes for m in model.iter_models() if m.params)
+    print("{} x Dense({}), {:.0f} MB of parameters".format(LAYERS, UNITS, size / 2**20))
+
+    d = tempfile.mkdtemp()
+    for fmt in ("hdf5", "flat"):
+        fname = os.path.join(d, "model." + fmt)
+        start = time.time()
+        model.save(fname, format=fmt)
+        print("save {:5s}: {:.3f} sec".format(fmt, time.time() - start))
+
+    for fmt, mmap in (("hdf5", False), ("flat", False), ("flat", True)):
+        fname = os.path.join(d, "model." + fmt)
+        out = subprocess.check_output([sys.executable, __file__, fname, str(int(mmap))])
+        loaded, loaded_rss, first, touched, rss, _ = out.decode().split()
+        print("load {:5s} mmap={:d}: load {} sec (peak RSS +{} MB), first weight {} sec, "
+              "all weights {} sec (peak RSS +{} MB)".format(fmt, mmap, loaded, loaded_rss, first, touched, rss))
+    for fmt in ("hdf5", "flat"):
+        os.remove(os.path.join(d, "model." + fmt))
+    os.rmdir(d)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        load(sys.argv[1], bool(int(sys.argv[2])))
+    else:
+        main()
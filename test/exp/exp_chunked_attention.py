@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import tracemalloc
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def naive_attention(q, k, v):
+    # Attention built from dot, softmax and concat for each head.
+    N, T, H, D = q.shape
+    heads = []
+    for h in range(H):
+        qh, kh, vh = (a[0, :, h, :] for a in (q, k, v))
+        s = rm.dot(qh, kh.T) * (1 / np.sqrt(D))
+        heads.append(rm.dot(rm.softmax(s), vh))
+    return rm.concat(*heads).reshape(N, T, H, D)
+
+
+def bench(func, q, k, v):
+    tracemalloc.start()
+    start = time.time()
+    z = func(q, k, v)
+    rm.sum(z * z).grad()
+    elapsed = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return z.as_ndarray(), elapsed, peak / 2**20
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    H, D = 4, 64
+    for T in (1024, 2048, 4096):
+        q, k, v = (rm.Variable(np.random.randn(1, T, H, D).astype(rm.precision)) for _ in range(3))
+        z, t, m = bench(lambda q, k, v: rm.attention(q, k, v, chunk_size=256), q, k, v)
+        line = "T={:5d}: chunked {:.3f} sec, peak {:7.1f} MB".format(T, t, m)
+        if T <= 2048:
+            zn, tn, mn = bench(naive_attention, q, k, v)
+            line += " | naive {:.3f} sec, peak {:7.1f} MB, max diff {:.1e}".format(
+                tn, mn, np.abs(z - zn).max())
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
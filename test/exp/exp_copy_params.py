@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def build():
+    backbone = rm.Sequential([rm.Dense(2048) for _ in range(6)])
+    head = rm.Sequential([rm.Dense(256), rm.Dense(10)])
+    return rm.Sequential([backbone, head])
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    x = np.random.rand(8, 2048).astype(np.float32)
+    primary, replica = build(), build()
+    primary(x)
+    replica(x)
+    opt = rm.Sgd(0.01)
+
+    def step():
+        with primary.train():
+            loss = rm.sum(primary(x))
+        with primary[0].prevent_update():
+            loss.grad().update(opt)
+
+    start = time.time()
+    replica.copy_params(primary)
+    print("first copy (all parameters): {:.2f} ms".format((time.time() - start) * 1e3))
+
+    elapsed = []
+    for _ in range(10):
+        step()
+        start = time.time()
+        replica.copy_params(primary)
+        elapsed.append(time.time() - start)
+    print("copy after a step with frozen backbone: {:.2f} ms".format(np.mean(elapsed) * 1e3))
+
+    for name, p in replica.named_parameters():
+        assert np.allclose(p, dict(primary.named_parameters())[name])
+
+
+if __name__ == '__main__':
+    main()
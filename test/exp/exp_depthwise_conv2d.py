@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+from renom.layers.function.group_conv2d import group_conv2d, group_conv2d_nhwc
+
+
+def bench(func, x, loop=3):
+    rm.sum(func(x)).grad()
+    start = time.time()
+    for _ in range(loop):
+        func(x)
+    forward = (time.time() - start) / loop
+    start = time.time()
+    for _ in range(loop):
+        rm.sum(func(x)).grad()
+    return forward, (time.time() - start) / loop
+
+
+def generic(layer):
+    op = group_conv2d_nhwc if layer._layout == "NHWC" else group_conv2d
+
+    def func(x):
+        return op(x, layer.params.w, layer.params.b, layer._kernel, layer._stride,
+                  layer._padding, layer._dilation, layer._groups)
+    return func
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    # Depthwise layers of MobileNet at batch size 16.
+    cases = [(32, 112, 1), (64, 112, 2), (128, 56, 1), (256, 28, 1), (512, 14, 1), (512, 14, 2)]
+    for layout in ("NCHW", "NHWC"):
+        total = [0., 0.]
+        for channel, size, stride in cases:
+            x = rm.Variable(np.random.rand(16, channel, size, size).astype(rm.precision))
+            layer = rm.GroupConv2d(channel, filter=3, padding=1, stride=stride, groups=channel)
+            layer(x)
+            if layout == "NHWC":
+                layer.set_layout(layout)
+                x = rm.Variable(x.as_ndarray().transpose(0, 2, 3, 1).copy())
+            assert np.allclose(layer(x).as_ndarray(), generic(layer)(x).as_ndarray(), atol=1e-4)
+            gf, gt = bench(generic(layer), x)
+            df, dt = bench(layer, x)
+            total[0] += gt
+            total[1] += dt
+            print("{} C={:3d} {:3d}x{:3d} stride {}: forward {:.3f} -> {:.3f} sec, "
+                  "forward+backward {:.3f} -> {:.3f} sec".format(
+                      layout, channel, size, size, stride, gf, df, gt, dt))
+        print("{} total forward+backward: {:.3f} -> {:.3f} sec, {:.1f}x".format(
+            layout, total[0], total[1], total[0] / total[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def kept_bytes(z):
+    return sum(getattr(v, "nbytes", 0) for k, v in z.attrs.v__attrs.items() if k != "_x")
+
+
+def bench(layer, x, loop=5):
+    rm.sum(layer(x)).grad()
+    start = time.time()
+    for _ in range(loop):
+        z = layer(x)
+    forward = (time.time() - start) / loop
+
+    start = time.time()
+    for _ in range(loop):
+        rm.sum(layer(x)).grad()
+    total = (time.time() - start) / loop
+    return forward, total, kept_bytes(z)
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    x = rm.Variable(np.random.rand(256, 16384).astype(rm.precision))
+    print("input {:.1f} MB".format(x.nbytes / 2**20))
+    for mode in ("float", "packed", "seed"):
+        layer = rm.Dropout(0.5, mask_mode=mode)
+        z = layer(x)
+        grad = rm.sum(z).grad().get(x)
+        assert np.array_equal(grad != 0, z.as_ndarray() != 0)
+        f, t, kept = bench(layer, x)
+        print("{:<6s}: forward {:.4f} sec, forward+backward {:.4f} sec, mask {:.2f} MB, "
+              "dropped {:.3f}".format(mode, f, t, kept / 2**20, np.mean(z.as_ndarray() == 0)))
+
+
+if __name__ == '__main__':
+    main()
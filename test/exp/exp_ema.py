@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+from renom.utility.ema import ParameterEMA
+
+REPEAT = 50
+TAU = 0.01
+
+
+def build(units, layers):
+    return rm.Sequential([rm.Dense(units) for _ in range(layers)])
+
+
+def measure(func):
+    func()
+    start = time.time()
+    for _ in range(REPEAT):
+        func()
+    return (time.time() - start) / REPEAT * 1000
+
+
+def soft_update_loop(model, target):
+    # The update DDPG used, a new node for each parameter.
+    for m, t in zip(model.iter_models(), target.iter_models()):
+        for k in m.params.keys():
+            t.params[k] = (1 - TAU) * t.params[k] + TAU * m.params[k]
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    for units, layers in ((64, 32), (512, 8), (2048, 4)):
+        model, target, ema_target = build(units, layers), build(units, layers), build(units, layers)
+        x = np.random.rand(1, units).astype(np.float32)
+        for m in (model, target, ema_target):
+            m(x)
+        size = sum(p.size for _, p in model.named_parameters())
+        ema = ParameterEMA(model, decay=1 - TAU, target=ema_target)
+        print("{} x Dense({}), {} parameters: loop {:.2f} ms, ParameterEMA {:.2f} ms".format(
+            layers, units, size, measure(lambda: soft_update_loop(model, target)), measure(ema.update)))
+
+
+if __name__ == '__main__':
+    main()
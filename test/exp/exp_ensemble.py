@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+REPEAT = 10
+
+
+def mlp():
+    return rm.Sequential([rm.Dense(256), rm.Relu(), rm.Dense(256), rm.Relu(), rm.Dense(10)])
+
+
+def cnn():
+    return rm.Sequential([rm.Conv2d(16, filter=3, padding=1), rm.Relu(), rm.MaxPool2d(filter=2, stride=2),
+                          rm.Conv2d(32, filter=3, padding=1), rm.Relu(), rm.MaxPool2d(filter=2, stride=2),
+                          rm.Flatten(), rm.Dense(10)])
+
+
+def measure(func):
+    func()
+    start = time.time()
+    for _ in range(REPEAT):
+        func()
+    return (time.time() - start) / REPEAT * 1000
+
+
+def train_step(model, x, y, opt):
+    with model.train():
+        loss = rm.sum((model(x) - y) ** 2)
+    loss.grad().update(opt)
+
+
+def run(name, build, x, num):
+    models = [build() for _ in range(num)]
+    for m in models:
+        m(x)
+    ensemble = rm.Ensemble(models)
+    y = np.random.rand(*ensemble(x).shape).astype(np.float32)
+
+    def loop_inference():
+        for m in models:
+            m(x)
+
+    opts = [rm.Sgd(0.01) for _ in range(num + 2)]
+
+    def loop_train():
+        for i, m in enumerate(models):
+            train_step(m, x, y[i], opts[i])
+
+    single = build()
+    single(x)
+    print("{} x {} N={}: inference loop {:.1f} ms, ensemble {:.1f} ms (one model {:.1f} ms), "
+          "train loop {:.1f} ms, ensemble {:.1f} ms (one model {:.1f} ms)".format(
+              num, name, x.shape[0], measure(loop_inference), measure(lambda: ensemble(x)),
+              measure(lambda: single(x)), measure(loop_train), measure(lambda: train_step(ensemble, x, y, opts[-2])),
+              measure(lambda: train_step(single, x, y[0], opts[-1]))))
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    for num in (8, 16):
+        run("mlp", mlp, np.random.rand(16, 128).astype(np.float32), num)
+        run("cnn", cnn, np.random.rand(16, 3, 16, 16).astype(np.float32), num)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import tracemalloc
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def bench(f, x, loop=50):
+    f(x)
+    start = time.time()
+    for _ in range(loop):
+        f(x)
+    elapsed = (time.time() - start) / loop
+    tracemalloc.start()
+    f(x)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    models = {
+        "mlp": (rm.Sequential([rm.Dense(512), rm.Relu(), rm.Dense(512), rm.Relu(), rm.Dense(10), rm.Softmax()]),
+                (784, )),
+        "cnn": (rm.Sequential([
+            rm.Conv2d(16, padding=1), rm.BatchNormalize(mode="feature"), rm.Relu(), rm.MaxPool2d(2, stride=2),
+            rm.Conv2d(32, padding=1), rm.BatchNormalize(mode="feature"), rm.Relu(), rm.MaxPool2d(2, stride=2),
+            rm.Flatten(), rm.Dense(128), rm.Relu(), rm.Dropout(), rm.Dense(10), rm.Softmax()]),
+                (3, 32, 32)),
+    }
+    for name, (model, shape) in models.items():
+        model(np.random.rand(2, *shape).astype(np.float32))
+        model.set_models(inference=True)
+        for batch in (1, 8, 64):
+            x = np.random.rand(batch, *shape).astype(np.float32)
+            frozen = rm.freeze(model, x.shape)
+            err = np.abs(frozen(x) - model(x).as_ndarray()).max()
+            t_model, m_model = bench(lambda a: model(a).as_ndarray(), x)
+            t_frozen, m_frozen = bench(frozen, x)
+            print("{} batch {:3d}: model {:.3f} ms (peak {:7.1f} KB) | frozen {:.3f} ms (peak {:5.1f} KB, "
+                  "arena {:7.1f} KB) | {:.1f}x, max error {:.1e}".format(
+                      name, batch, t_model * 1e3, m_model / 1024, t_frozen * 1e3, m_frozen / 1024,
+                      frozen.plan(x.shape) / 1024, t_model / t_frozen, err))
+
+
+if __name__ == '__main__':
+    main()
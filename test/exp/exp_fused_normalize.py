@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import tracemalloc
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def bench(layer, x, loop=5):
+    rm.sum(layer(x)).grad()
+    tracemalloc.start()
+    start = time.time()
+    for _ in range(loop):
+        rm.sum(layer(x)).grad()
+    elapsed = (time.time() - start) / loop
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    image = rm.Variable(np.random.rand(64, 64, 32, 32).astype(rm.precision))
+    dense = rm.Variable(np.random.rand(256, 4096).astype(rm.precision))
+    cases = [
+        ("BatchNormalize(feature)", rm.BatchNormalize(mode="feature"), image),
+        ("BatchNormalize(activation)", rm.BatchNormalize(), dense),
+        ("LayerNormalize", rm.LayerNormalize(), image),
+        ("L2Norm", rm.L2Norm(), image),
+        ("WeightNormalize", rm.WeightNormalize(1024), dense),
+    ]
+    print("input: image {:.1f} MB, dense {:.1f} MB".format(
+        image.nbytes / 2**20, dense.nbytes / 2**20))
+    for name, layer, x in cases:
+        t, m = bench(layer, x)
+        print("{:<28s} {:.4f} sec/iter, peak {:.1f} MB".format(name, t, m))
+
+
+if __name__ == '__main__':
+    main()
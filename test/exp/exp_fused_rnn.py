@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def step_wise(layer, x):
+    loss = 0
+    for t in range(x.shape[0]):
+        loss += rm.sum(layer(x[t]))
+    layer.truncate()
+    return loss
+
+
+def fused(layer, x):
+    loss = rm.sum(layer(x))
+    layer.truncate()
+    return loss
+
+
+def bench(func, layer, x, loop=5):
+    func(layer, x).grad()
+    start = time.time()
+    for _ in range(loop):
+        func(layer, x).grad()
+    return (time.time() - start) / loop
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    T, N, D, H = 100, 64, 64, 128
+    x = rm.Variable(np.random.rand(T, N, D).astype(np.float32))
+
+    for step_class, fused_class in [(rm.Lstm, rm.FusedLstm),
+                                    (rm.Gru, rm.FusedGru),
+                                    (rm.PeepholeLstm, rm.FusedPeepholeLstm)]:
+        t_step = bench(step_wise, step_class(H), x)
+        t_fused = bench(fused, fused_class(H), x)
+        print("{:>14}: step-wise {:.4f} sec/iter, fused {:.4f} sec/iter, speed up {:.2f}x".format(
+            step_class.__name__, t_step, t_fused, t_step / t_fused))
+
+
+if __name__ == '__main__':
+    main()
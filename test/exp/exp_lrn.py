@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import tracemalloc
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def bench(layer, x, loop=5):
+    rm.sum(layer(x)).grad()
+    start = time.time()
+    for _ in range(loop):
+        layer(x)
+    forward = (time.time() - start) / loop
+
+    start = time.time()
+    for _ in range(loop):
+        rm.sum(layer(x)).grad()
+    total = (time.time() - start) / loop
+
+    tracemalloc.start()
+    z = layer(x)
+    kept = tracemalloc.get_traced_memory()[0]
+    rm.sum(z).grad()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return forward, total, kept / 2**20, peak / 2**20
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    x = rm.Variable(np.random.rand(64, 96, 27, 27).astype(rm.precision))
+    print("input {:.1f} MB".format(x.nbytes / 2**20))
+    for n in (3, 5, 9):
+        f, t, kept, peak = bench(rm.Lrn(n=n), x)
+        print("n={}: forward {:.4f} sec, forward+backward {:.4f} sec, "
+              "graph {:.1f} MB, peak {:.1f} MB".format(n, f, t, kept, peak))
+
+
+if __name__ == '__main__':
+    main()
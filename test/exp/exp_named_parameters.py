@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def bench(f, loop=200):
+    f()
+    start = time.time()
+    for _ in range(loop):
+        f()
+    return (time.time() - start) / loop
+
+
+def main():
+    set_cuda_active(False)
+    for depth in (10, 50, 200):
+        model = rm.Sequential([rm.Sequential([rm.Dense(8), rm.BatchNormalize(), rm.Relu()])
+                               for _ in range(depth)])
+        model(np.random.rand(2, 8))
+        other = rm.Sequential([rm.Sequential([rm.Dense(8), rm.BatchNormalize(), rm.Relu()])
+                               for _ in range(depth)])
+        other(np.random.rand(2, 8))
+
+        walk = bench(lambda: model.values())
+        named = bench(lambda: list(model.named_parameters()))
+        copy = bench(lambda: other.copy_params(model))
+        print("{:4d} blocks: values() walk {:.3f} ms, named_parameters {:.4f} ms, copy_params {:.3f} ms".format(
+            depth, walk * 1e3, named * 1e3, copy * 1e3))
+
+
+if __name__ == '__main__':
+    main()
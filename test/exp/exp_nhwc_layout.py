@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def build():
+    return rm.Sequential([
+        rm.Conv2d(32, filter=3, padding=1),
+        rm.BatchNormalize(mode="feature"),
+        rm.Relu(),
+        rm.MaxPool2d(filter=2, stride=2),
+        rm.GroupConv2d(64, filter=3, padding=1, groups=4),
+        rm.Relu(),
+        rm.AveragePool2d(filter=2, stride=2),
+        rm.Flatten(),
+        rm.Dense(10),
+    ])
+
+
+def bench(model, batches, to_input, loop=10):
+    with model.train():
+        model(to_input(batches[0]))
+    start = time.time()
+    for i in range(loop):
+        with model.train():
+            loss = rm.sum(model(to_input(batches[i % len(batches)])))
+        loss.grad()
+    return (time.time() - start) / loop
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    # Images are loaded as channels-last (N, H, W, C).
+    batches = [np.random.rand(64, 32, 32, 3).astype(np.float32) for _ in range(4)]
+
+    model = build()
+    nchw = bench(model, batches, lambda x: x.transpose(0, 3, 1, 2))
+    model.set_layout("NHWC")
+    nhwc = bench(model, batches, lambda x: x)
+
+    print("NCHW: {:.4f} sec/iter".format(nchw))
+    print("NHWC: {:.4f} sec/iter".format(nhwc))
+    print("speed up: {:.2f}x".format(nchw / nhwc))
+
+
+if __name__ == '__main__':
+    main()
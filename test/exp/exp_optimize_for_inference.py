@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def build():
+    layers = []
+    for ch in (32, 64, 64):
+        layers += [rm.Conv2d(ch, padding=1), rm.BatchNormalize(mode="feature"), rm.Relu(),
+                   rm.MaxPool2d(filter=2, stride=2)]
+    layers += [rm.Flatten(), rm.Dense(256), rm.BatchNormalize(), rm.Relu(), rm.Dropout(),
+               rm.Dense(10)]
+    return rm.Sequential(layers)
+
+
+def bench(model, x, loop=10):
+    model(x)
+    start = time.time()
+    for _ in range(loop):
+        model(x)
+    return (time.time() - start) / loop
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    x = np.random.rand(64, 3, 32, 32).astype(rm.precision)
+    model = build()
+    for _ in range(3):
+        model(x)
+    model.set_models(inference=True)
+    expected = model(x).as_ndarray()
+    t_before = bench(model, x)
+
+    rm.optimize_for_inference(model)
+    t_after = bench(model, x)
+    diff = np.abs(model(x).as_ndarray() - expected).max() / np.abs(expected).max()
+    print("unfused: {:.4f} sec/batch".format(t_before))
+    print("folded:  {:.4f} sec/batch".format(t_after))
+    print("max relative difference: {:.2e}".format(diff))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+from renom.utility.distributor import TimeSeriesDistributor
+
+
+def padded_epoch(layer, dist, batch_size):
+    # Random batches padded to the longest sequence of each batch.
+    for x, y in dist.batch(batch_size, shuffle=True):
+        lengths = [len(s) for s in x]
+        padded = rm.pad_packed(rm.pack_sequence(list(x)))
+        h = layer(padded)
+        loss = rm.sum(h * rm.sequence_mask(lengths)[:, :, None])
+        layer.truncate()
+        loss.grad()
+
+
+def packed_epoch(layer, dist, batch_size):
+    # Batches of similar lengths without padding.
+    for x, y in dist.bucket_batch(batch_size, shuffle=True):
+        loss = rm.sum(layer(x).data)
+        loss.grad()
+
+
+def bench(func, layer, dist, batch_size):
+    start = time.time()
+    func(layer, dist, batch_size)
+    return time.time() - start
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    N, D, H = 512, 32, 64
+    x = [np.random.rand(np.random.randint(5, 501), D).astype(np.float32) for _ in range(N)]
+    y = np.random.rand(N, 1).astype(np.float32)
+    dist = TimeSeriesDistributor(x, y)
+
+    t_padded = bench(padded_epoch, rm.FusedLstm(H), dist, 32)
+    t_packed = bench(packed_epoch, rm.FusedLstm(H), dist, 32)
+    print("padded: {:.4f} sec/epoch".format(t_padded))
+    print("packed: {:.4f} sec/epoch".format(t_packed))
+    print("speed up: {:.2f}x".format(t_padded / t_packed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def bench(model, x, loop=10):
+    model(x)
+    start = time.time()
+    for _ in range(loop):
+        model(x)
+    return (time.time() - start) / loop
+
+
+def weight_bytes(model):
+    total = 0
+    for m in model.iter_models():
+        total += sum(v.nbytes for k, v in m.params.items() if k == "w")
+        w = getattr(m, "_w", None)
+        if w is not None:
+            total += w.data.nbytes + w.indices.nbytes + w.indptr.nbytes
+    return total
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+
+    x = np.random.randn(128, 4096).astype(np.float32)
+    model = rm.Sequential([rm.Dense(4096), rm.Relu(), rm.Dense(4096)])
+    model(x[:1])
+    dense = {b: bench(model, x[:b]) for b in (1, 32, 128)}
+    print("dense: weight {:.1f} MB, {}".format(
+        weight_bytes(model) / 2**20,
+        ", ".join("batch {} {:.4f} sec".format(b, t) for b, t in dense.items())))
+
+    for sparsity in (0.5, 0.8, 0.9, 0.95, 0.99):
+        rm.prune(model, sparsity)
+        sparse = rm.sparsify(model, min_sparsity=0)
+        err = np.abs(sparse(x).as_ndarray() - model(x).as_ndarray()).max()
+        print("sparsity {:.2f}: weight {:.1f} MB, max error {:.1e}".format(
+            sparsity, weight_bytes(sparse) / 2**20, err))
+        for b, t in dense.items():
+            ts = bench(sparse, x[:b])
+            print("  batch {:4d}: csr {:.4f} sec, {:.2f}x".format(b, ts, t / ts))
+
+
+if __name__ == '__main__':
+    main()
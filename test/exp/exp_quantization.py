@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def bench(model, x, loop=10):
+    model(x)
+    start = time.time()
+    for _ in range(loop):
+        model(x)
+    return (time.time() - start) / loop
+
+
+def weight_bytes(model):
+    total = 0
+    for m in model.iter_models():
+        total += sum(v.nbytes for k, v in m.params.items() if k == "w")
+        total += getattr(m, "_wq", np.empty(0, dtype=np.int8)).nbytes
+    return total
+
+
+def report(name, model, qmodel, dist, batches):
+    print("{}: weight {:.1f} MB -> {:.1f} MB".format(
+        name, weight_bytes(model) / 2**20, weight_bytes(qmodel) / 2**20))
+    for batch_size in batches:
+        x = dist.x[:batch_size]
+        t, tq = bench(model, x), bench(qmodel, x)
+        print("  batch {:4d}: float32 {:.4f} sec, int8 {:.4f} sec, {:.2f}x".format(
+            batch_size, t, tq, t / tq))
+    print("  accuracy delta: {}".format(rm.quantization_report(model, qmodel, dist)))
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+
+    x = np.random.randn(512, 4096).astype(np.float32)
+    mlp = rm.Sequential([rm.Dense(4096), rm.Relu(), rm.Dense(4096), rm.Relu(), rm.Dense(10)])
+    mlp(x[:1])
+    dist = rm.NdarrayDistributor(x, np.zeros((len(x), 1)))
+    report("mlp", mlp, rm.quantize(mlp, dist, steps=2), dist, (1, 16, 128))
+
+    x = np.random.rand(256, 3, 32, 32).astype(np.float32)
+    cnn = rm.Sequential([rm.Conv2d(64, padding=1), rm.Relu(), rm.MaxPool2d(filter=2, stride=2),
+                         rm.Conv2d(128, padding=1), rm.Relu(), rm.MaxPool2d(filter=2, stride=2),
+                         rm.Flatten(), rm.Dense(10)])
+    cnn(x[:1])
+    dist = rm.NdarrayDistributor(x, np.zeros((len(x), 1)))
+    report("cnn", cnn, rm.quantize(cnn, dist, steps=2), dist, (1, 64))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def random_rois(n_rois, n_images, height, width):
+    x1 = np.random.uniform(0, width * 0.8, n_rois)
+    y1 = np.random.uniform(0, height * 0.8, n_rois)
+    x2 = np.minimum(x1 + np.random.uniform(16, width * 0.5, n_rois), width - 1)
+    y2 = np.minimum(y1 + np.random.uniform(16, height * 0.5, n_rois), height - 1)
+    return np.stack([np.random.randint(0, n_images, n_rois), x1, y1, x2, y2], axis=1)
+
+
+def bench(layer, x, rois, loop=3):
+    start = time.time()
+    for _ in range(loop):
+        rm.sum(layer(x, rois)).grad()
+    return (time.time() - start) / loop
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    # Feature map of VGG16 conv5 for 2 images of 600 x 1000.
+    x = rm.Variable(np.random.rand(2, 512, 38, 63).astype(np.float32))
+    n_rois = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rois = random_rois(n_rois, 2, 600, 1000)
+
+    for layer in [rm.RoiPool2d(7, 7, 1 / 16.), rm.RoiAlign2d(7, 7, 1 / 16.)]:
+        print("{}: {} rois, forward + backward {:.4f} sec/iter".format(
+            layer.__class__.__name__, n_rois, bench(layer, x, rois)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+from renom.serving import BatchingPredictor
+
+CLIENTS = 32
+REQUESTS = 50
+
+
+def load_test(predict):
+    latencies = []
+    lock = threading.Lock()
+    x = np.random.rand(784).astype(np.float32)
+
+    def client():
+        for _ in range(REQUESTS):
+            start = time.time()
+            predict(x)
+            with lock:
+                latencies.append(time.time() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(CLIENTS)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+    p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+    return CLIENTS * REQUESTS / elapsed, p50, p99
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    model = rm.Sequential([rm.Dense(1024), rm.Relu(), rm.Dense(1024), rm.Relu(), rm.Dense(10)])
+    model(np.random.rand(1, 784).astype(np.float32))
+    model.set_models(inference=True)
+
+    lock = threading.Lock()
+
+    def direct(x):
+        # Model objects are not thread safe, so requests are served one by one.
+        with lock:
+            return model(x[None]).as_ndarray()[0]
+
+    print("{} clients x {} requests".format(CLIENTS, REQUESTS))
+    rps, p50, p99 = load_test(direct)
+    print("model(x) per request:      {:7.0f} req/s, p50 {:6.2f} ms, p99 {:6.2f} ms".format(rps, p50, p99))
+
+    for max_batch, max_wait_ms in ((8, 1), (32, 2), (32, 5)):
+        with BatchingPredictor(model, max_batch=max_batch, max_wait_ms=max_wait_ms) as predictor:
+            rps, p50, p99 = load_test(predictor.predict)
+            metrics = predictor.metrics()
+        mean_batch = metrics["requests"] / metrics["batches"]
+        print("batching max_batch={:2d} max_wait={}ms: {:7.0f} req/s, p50 {:6.2f} ms, p99 {:6.2f} ms, "
+              "mean batch {:.1f}".format(max_batch, max_wait_ms, rps, p50, p99, mean_batch))
+
+
+if __name__ == '__main__':
+    main()
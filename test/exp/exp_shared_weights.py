@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import subprocess
+import tempfile
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+from renom.utility.checkpoint import share_weights, attach_weights
+
+UNITS = 4096
+LAYERS = 8
+WORKERS = 4
+
+
+def build():
+    return rm.Sequential([rm.Dense(UNITS) for _ in range(LAYERS)])
+
+
+def pss(pid):
+    # Proportional set size counts a page shared by n processes as 1/n.
+    with open("/proc/{}/smaps_rollup".format(pid)) as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1]) / 1024
+
+
+def worker(mode, source):
+    # Loads the weights, touches all of them and waits until the parent has measured the memory.
+    set_cuda_active(False)
+    model = build()
+    start = time.time()
+    if mode == "shared":
+        attach_weights(model, source)
+    else:
+        model.load(source)
+    elapsed = time.time() - start
+    total = sum(float(m.params.w.as_ndarray().sum()) for m in model.iter_models() if m.params)
+    print("{:.4f} {}".format(elapsed, total))
+    sys.stdout.flush()
+    sys.stdin.read()
+
+
+def run(mode, source):
+    procs = [subprocess.Popen([sys.executable, __file__, mode, source],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE) for _ in range(WORKERS)]
+    times = [float(p.stdout.readline().split()[0]) for p in procs]
+    memory = [pss(p.pid) for p in procs]
+    for p in procs:
+        p.communicate(b"")
+    print("{:6s}: load {:.1f} ms on average, PSS {:.0f} MB per worker, {:.0f} MB in total".format(
+        mode, np.mean(times) * 1000, np.mean(memory), np.sum(memory)))
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    model = build()
+    model(np.random.rand(1, UNITS).astype(np.float32))
+    size = sum(m.params.w.nbytes + m.params.b.nbytes for m in model.iter_models() if m.params)
+    print("{} x Dense({}), {:.0f} MB of parameters, {} workers".format(
+        LAYERS, UNITS, size / 2**20, WORKERS))
+
+    d = tempfile.mkdtemp()
+    fname = os.path.join(d, "model.h5")
+    model.save(fname)
+    run("hdf5", fname)
+    os.remove(fname)
+    os.rmdir(d)
+
+    shared = share_weights(model)
+    try:
+        run("shared", shared.name)
+    finally:
+        shared.unlink()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        worker(sys.argv[1], sys.argv[2])
+    else:
+        main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import tracemalloc
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def per_timestep(x, w):
+    # Slices x[:, t] for each timestep as a step-wise RNN does.
+    loss = 0
+    for t in range(x.shape[1]):
+        loss += rm.sum(rm.dot(x[:, t], w))
+    return loss
+
+
+def embedding(table, ids):
+    # Looks up rows of a table with many duplicated indices.
+    return rm.sum(table[ids])
+
+
+def bench(func, *args, loop=5):
+    func(*args).grad()
+    tracemalloc.start()
+    start = time.time()
+    for _ in range(loop):
+        func(*args).grad()
+    elapsed = (time.time() - start) / loop
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    x = rm.Variable(np.random.rand(32, 200, 64).astype(np.float32))
+    w = rm.Variable(np.random.rand(64, 64).astype(np.float32))
+    t, m = bench(per_timestep, x, w)
+    print("per timestep slicing: {:.4f} sec/iter, peak {:.1f} MB (x is {:.1f} MB)".format(
+        t, m, x.nbytes / 2**20))
+
+    table = rm.Variable(np.random.rand(10000, 64).astype(np.float32))
+    ids = np.random.randint(0, 1000, size=(64, 100))
+    t, m = bench(embedding, table, ids)
+    print("embedding lookup: {:.4f} sec/iter, peak {:.1f} MB".format(t, m))
+
+
+if __name__ == '__main__':
+    main()
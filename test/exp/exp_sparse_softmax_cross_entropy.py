@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import tracemalloc
+import numpy as np
+import renom as rm
+from renom.cuda import set_cuda_active
+
+
+def bench(func, loop=3):
+    func()
+    start = time.time()
+    for _ in range(loop):
+        func()
+    elapsed = (time.time() - start) / loop
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main():
+    set_cuda_active(False)
+    np.random.seed(10)
+    N, K = 256, 50000
+    x = rm.Variable(np.random.randn(N, K).astype(rm.precision))
+    y = np.random.randint(K, size=N)
+    print("logits {:.1f} MB".format(x.nbytes / 2**20))
+
+    def onehot():
+        t = np.zeros((N, K), dtype=rm.precision)
+        t[np.arange(N), y] = 1
+        return t
+
+    def dense():
+        rm.softmax_cross_entropy(x, onehot()).grad()
+
+    def sparse():
+        rm.sparse_softmax_cross_entropy(x, y).grad()
+
+    a = rm.softmax_cross_entropy(x, onehot())
+    b = rm.sparse_softmax_cross_entropy(x, y)
+    print("loss: one-hot {:.6f}, indices {:.6f}".format(float(a), float(b)))
+    for name, func in (("one-hot", dense), ("indices", sparse)):
+        t, m = bench(func)
+        print("{:<8s} forward+backward {:.4f} sec, peak {:.1f} MB".format(name, t, m))
+
+
+if __name__ == '__main__':
+    main()
@@ -24,7 +24,7 @@ from renom.layers.activation.relu import relu
 from renom.layers.activation.maxout import maxout
 from renom.layers.function.dense import Dense
 from renom.layers.function.conv2d import Conv2d
-from renom.layers.function.group_conv2d import GroupConv2d
+from renom.layers.function.group_conv2d import GroupConv2d, group_conv2d
 from renom.layers.function.convnd import ConvNd, Conv3d
 from renom.layers.function.deconv2d import Deconv2d
 from renom.layers.function.deconvnd import DeconvNd
@@ -32,7 +32,7 @@ from renom.layers.function.pool2d import MaxPool2d, AveragePool2d
 from renom.layers.function.unpool2d import MaxUnPool2d, AverageUnPool2d
 from renom.layers.function.unpoolnd import MaxUnPoolNd, AverageUnPoolNd
 from renom.layers.function.poolnd import MaxPoolNd, AveragePoolNd
-from renom.layers.function.roi_pool2d import RoiPool2d
+from renom.layers.function.roi_pool2d import RoiPool2d, RoiAlign2d
 from renom.layers.function.dropout import Dropout, SpatialDropout
 from renom.layers.function.lstm import Lstm
 from renom.layers.function.l2_norm import L2Norm
@@ -42,6 +42,7 @@ from renom.layers.function.batch_normalize import BatchNormalize,\
     BATCH_NORMALIZE_FEATUREMAP
 from renom.layers.function.layer_normalize import LayerNormalize
 from renom.layers.function.lrn import Lrn
+from renom.layers.function.packed_sequence import _forward_padded
 from test_utility import auto_diff, numeric_diff
 
 from renom.cuda import is_cuda_active, set_cuda_active, curand_generator, has_cuda
@@ -526,6 +527,27 @@ def test_layer_normalize(node, use_gpu):
     assert False
 
 
+@pytest.mark.parametrize("layer, shape", [
+    [LayerNormalize(), (3, 5)],
+    [LayerNormalize(), (2, 3, 2, 2)],
+    [WeightNormalize(4), (3, 5)],
+    [L2Norm(20), (2, 3, 2, 2)],
+])
+def test_normalize_non_uniform_gain(layer, shape):
+    node = Variable(rand(shape))
+    assert_cuda_active(False)
+
+    layer(node)
+    for k, v in layer.params.items():
+        layer.params[k] = Variable(v * (rand(v.shape) + 0.5))
+
+    def func(node):
+        return sum(layer(node) ** 2)
+    compare(func, node, node)
+    for v in layer.params.values():
+        compare(func, v, node)
+
+
 @pytest.mark.parametrize("node", [
     Variable(rand((2, 2, 3, 3))),
     Variable(rand((2, 3, 4, 5))),
@@ -541,6 +563,19 @@ def test_lrn(node, use_gpu):
     compare(func, node, node)
 
 
+@pytest.mark.parametrize("n", [1, 2, 3, 5, 9])
+@pytest.mark.parametrize("b", [0, 0.75])
+def test_lrn_window(n, b, use_gpu):
+    node = Variable(rand((2, 6, 3, 3)))
+    assert_cuda_active(use_gpu)
+
+    layer = Lrn(n=n, a=0.5, b=b)
+
+    def func(node):
+        return sum(layer(node) ** 2)
+    compare(func, node, node)
+
+
 @pytest.mark.parametrize("node", [
     Variable(rand((2, 2, 3, 3))),
     Variable(rand((2, 3, 4, 5))),
@@ -599,6 +634,120 @@ def test_group_conv2d(node, use_gpu, ignore_bias):
         assert ignore_bias
 
 
+@pytest.mark.parametrize("node, kwargs", [
+    [Variable(rand((2, 3, 3, 2))), {}],
+    [Variable(rand((2, 4, 5, 3))), {"padding": 1, "stride": 2}],
+    [Variable(rand((2, 5, 6, 2))), {"dilation": 2}],
+])
+def test_conv2d_nhwc(node, kwargs, ignore_bias):
+    node = Variable(node)
+    assert_cuda_active(False)
+
+    layer = Conv2d(channel=3, ignore_bias=ignore_bias, layout="NHWC", **kwargs)
+    ref = Conv2d(channel=3, ignore_bias=ignore_bias, **kwargs)
+
+    def func(node):
+        return sum(layer(node))
+    compare(func, node, node)
+    compare(func, layer.params["w"], node)
+    try:
+        compare(func, layer.params["b"], node)
+    except Exception:
+        assert ignore_bias
+
+    ref(node.transpose(0, 3, 1, 2))
+    ref.params = {k: Variable(v.as_ndarray().transpose(0, 3, 1, 2) if v.ndim == 4 else v)
+                  for k, v in layer.params.items()}
+    assert np.allclose(layer(node).as_ndarray(),
+                       ref(node.as_ndarray().transpose(0, 3, 1, 2)).as_ndarray().transpose(0, 2, 3, 1))
+
+
+@pytest.mark.parametrize("node", [
+    Variable(rand((2, 3, 3, 8))),
+    Variable(rand((2, 4, 5, 16))),
+])
+def test_group_conv2d_nhwc(node, ignore_bias):
+    node = Variable(node)
+    assert_cuda_active(False)
+
+    layer = GroupConv2d(channel=8, ignore_bias=ignore_bias, groups=4, layout="NHWC")
+
+    def func(node):
+        return sum(layer(node))
+    compare(func, node, node)
+    compare(func, layer.params["w"], node)
+    try:
+        compare(func, layer.params["b"], node)
+    except Exception:
+        assert ignore_bias
+
+
+@pytest.mark.parametrize("layout", ["NCHW", "NHWC"])
+@pytest.mark.parametrize("channel, kwargs", [
+    [4, {}],
+    [4, {"padding": 1, "stride": 2}],
+    [8, {"filter": (3, 2), "padding": 2, "dilation": 2}],
+])
+def test_depthwise_conv2d(layout, channel, kwargs, ignore_bias):
+    node = Variable(rand((2, 4, 5, 6)))
+    assert_cuda_active(False)
+
+    layer = GroupConv2d(channel=channel, groups=4, ignore_bias=ignore_bias, **kwargs)
+    layer(node)
+    layer.params = {k: Variable(v * (rand(v.shape) + 0.5)) for k, v in layer.params.items()}
+    # The generic grouped convolution is the reference.
+    expected = group_conv2d(node, layer.params.w, layer.params.get("b", None), layer._kernel,
+                            layer._stride, layer._padding, layer._dilation, 4).as_ndarray()
+    if layout == "NHWC":
+        layer.set_layout(layout)
+        node = Variable(node.as_ndarray().transpose(0, 2, 3, 1))
+        expected = expected.transpose(0, 2, 3, 1)
+    assert np.allclose(layer(node).as_ndarray(), expected)
+
+    def func(node):
+        return sum(layer(node) ** 2)
+    compare(func, node, node)
+    compare(func, layer.params["w"], node)
+    if not ignore_bias:
+        compare(func, layer.params["b"], node)
+
+
+@pytest.mark.parametrize("node", [
+    Variable(rand((2, 3, 3, 3))),
+    Variable(rand((2, 4, 5, 3))),
+])
+def test_pool2d_nhwc(node):
+    node = Variable(node)
+    assert_cuda_active(False)
+
+    for layer, ref in [(MaxPool2d(filter=2, padding=1, stride=2, layout="NHWC"),
+                        MaxPool2d(filter=2, padding=1, stride=2)),
+                       (AveragePool2d(filter=2, padding=1, stride=2, layout="NHWC"),
+                        AveragePool2d(filter=2, padding=1, stride=2))]:
+        def func(node):
+            return sum(layer(node))
+        compare(func, node, node)
+        assert np.allclose(layer(node).as_ndarray(),
+                           ref(node.as_ndarray().transpose(0, 3, 1, 2)).as_ndarray().transpose(0, 2, 3, 1))
+
+
+@pytest.mark.parametrize("node", [
+    Variable(rand((2, 3, 3, 2))),
+    Variable(rand((2, 4, 5, 3))),
+])
+def test_batch_normalize_featurewise_nhwc(node):
+    node = Variable(node)
+    assert_cuda_active(False)
+
+    layer = BatchNormalize(mode=BATCH_NORMALIZE_FEATUREMAP, layout="NHWC")
+
+    def func(node):
+        return sum(layer(node) * node)
+    compare(func, node, node)
+    compare(func, layer.params["w"], node)
+    compare(func, layer.params["b"], node)
+
+
 @pytest.mark.parametrize("node, size, raise_error", [
     [Variable(rand((2, 2, 5, 6))), 2, False],
     [Variable(rand((2, 2, 7, 8))), 3, False],
@@ -891,6 +1040,32 @@ def test_roi_pool2d(node, rois, use_gpu):
 
     def func(node, rois):
         return sum(layer(node, rois))
+    # Numerical gradient changes the argmax of nearly equal values.
+    for trial in range(3):
+        try:
+            compare(func, node, node, rois)
+            return
+        except AssertionError:
+            node = Variable(rand(node.shape) * 10)
+    raise AssertionError("Failed all attempts.")
+
+
+@pytest.mark.parametrize("node, rois", [
+    [Variable(rand((3, 3, 8, 13)) * 10), Variable(np.array([
+        [0, 1, 1, 6, 6],
+        [2, 6, 2, 7, 11],
+        [1, 3, 1, 5, 10],
+        [0, 3, 3, 3, 3],
+        [1, -4, 2, 30, 20],
+    ], dtype=np.float64))]
+])
+def test_roi_align2d(node, rois, use_gpu):
+    assert_cuda_active(use_gpu)
+    node = Variable(node)
+    layer = RoiAlign2d(outh=3, outw=4, spatial_scale=0.6, sampling_ratio=2)
+
+    def func(node, rois):
+        return sum(layer(node, rois) ** 2)
     compare(func, node, node, rois)
 
 
@@ -943,11 +1118,12 @@ def test_average_poolnd(node, use_gpu):
     [Variable(rand((2, 2))), 1],
     [Variable(rand((2, 5))), 2],
 ])
-def test_dropout(node, seed, use_gpu):
+@pytest.mark.parametrize("mask_mode", ["float", "packed", "seed"])
+def test_dropout(node, seed, mask_mode, use_gpu):
     node = Variable(node)
     assert_cuda_active(use_gpu)
 
-    layer = Dropout()
+    layer = Dropout(mask_mode=mask_mode)
 
     def func(node):
         if is_cuda_active():
@@ -964,11 +1140,12 @@ def test_dropout(node, seed, use_gpu):
     [Variable(rand((2, 5, 1, 1))), 2],
     [Variable(rand((2, 2, 3, 3))), 3]
 ])
-def test_spatial_dropout(node, seed, use_gpu):
+@pytest.mark.parametrize("mask_mode", ["float", "packed", "seed"])
+def test_spatial_dropout(node, seed, mask_mode, use_gpu):
     node = Variable(node)
     assert_cuda_active(use_gpu)
 
-    layer = SpatialDropout()
+    layer = SpatialDropout(mask_mode=mask_mode)
 
     def func(node):
         if is_cuda_active():
@@ -1030,6 +1207,195 @@ def test_gru(node, use_gpu):
             assert ignore_bias
 
 
+def naive_attention(q, k, v, causal):
+    # (N, T, H, D) arrays. einsum keeps the reference independent of BLAS.
+    s = np.einsum("nqhd,nkhd->nhqk", q, k) / np.sqrt(q.shape[-1])
+    if causal:
+        s = np.where(np.tril(np.ones(s.shape[-2:])) > 0, s, -np.inf)
+    p = np.exp(s - s.max(axis=-1, keepdims=True))
+    p /= p.sum(axis=-1, keepdims=True)
+    return np.einsum("nhqk,nkhd->nqhd", p, v)
+
+
+@pytest.mark.parametrize("causal, shapes, chunk_size", [
+    [False, [(2, 5, 2, 3), (2, 5, 2, 3), (2, 5, 2, 4)], 2],
+    [False, [(1, 4, 1, 2), (1, 7, 1, 2), (1, 7, 1, 3)], 3],
+    [True, [(2, 6, 2, 2), (2, 6, 2, 2), (2, 6, 2, 2)], 4],
+    [True, [(1, 5, 1, 3), (1, 5, 1, 3), (1, 5, 1, 3)], 2],
+])
+def test_attention(causal, shapes, chunk_size):
+    assert_cuda_active(False)
+    q, k, v = [Variable(rand(shape)) for shape in shapes]
+
+    def func(q, k, v):
+        return sum(rm.attention(q, k, v, causal, chunk_size) ** 2)
+    for node in (q, k, v):
+        compare(func, node, q, k, v)
+    expected = naive_attention(*[a.as_ndarray() for a in (q, k, v)], causal=causal)
+    assert np.allclose(rm.attention(q, k, v, causal, chunk_size), expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("a_shape, b_shape", [
+    [(3, 4, 2), (3, 2, 5)],
+    [(4, 2), (3, 2, 5)],
+    [(3, 4, 2), (1, 2, 5)],
+])
+def test_batched_dot(a_shape, b_shape):
+    assert_cuda_active(False)
+    a, b = Variable(rand(a_shape)), Variable(rand(b_shape))
+
+    def func(a, b):
+        return sum(rm.batched_dot(a, b) ** 2)
+    compare(func, a, a, b)
+    compare(func, b, a, b)
+    expected = np.einsum("...ij,...jk->...ik", a.as_ndarray(), b.as_ndarray())
+    assert np.allclose(rm.batched_dot(a, b), expected)
+
+
+@pytest.mark.parametrize("causal", [False, True])
+def test_multi_head_attention(causal, ignore_bias):
+    node = Variable(rand((2, 5, 4)))
+    assert_cuda_active(False)
+
+    layer = rm.MultiHeadAttention(num_heads=2, causal=causal, chunk_size=2, ignore_bias=ignore_bias)
+
+    def func(node):
+        return sum(layer(node) ** 2)
+    compare(func, node, node)
+    for k in layer.params.keys():
+        compare(func, layer.params[k], node)
+
+    memory = Variable(rand((2, 3, 4)))
+    if not causal:
+        compare(lambda memory: sum(layer(node, memory) ** 2), memory, memory)
+
+
+@pytest.mark.parametrize("node", [
+    Variable(rand((3, 2, 2))),
+    Variable(rand((4, 1, 3))),
+])
+@pytest.mark.parametrize("layer_class", [
+    rm.FusedLstm,
+    rm.FusedGru,
+    rm.FusedPeepholeLstm,
+])
+def test_fused_rnn(node, layer_class):
+    node = Variable(node)
+    assert_cuda_active(False)
+
+    layer1 = layer_class(output_size=4)
+
+    def func(node):
+        loss = sum(layer1(node) ** 2)
+        layer1.truncate()
+        return loss
+
+    compare(func, node, node)
+    for k in layer1.params.keys():
+        compare(func, layer1.params[k], node)
+
+
+@pytest.mark.parametrize("fused_class, step_class", [
+    [rm.FusedLstm, Lstm],
+    [rm.FusedGru, Gru],
+    [rm.FusedPeepholeLstm, rm.PeepholeLstm],
+])
+def test_fused_rnn_vs_step(fused_class, step_class):
+    node = Variable(rand((4, 3, 2)))
+    assert_cuda_active(False)
+
+    layer1 = fused_class(output_size=5)
+    layer2 = step_class(output_size=5)
+    ret1 = layer1(node)
+    layer2.params = layer1.params
+    ret2 = [layer2(node[t]) for t in range(node.shape[0])]
+    assert np.allclose(ret1, np.stack([r.as_ndarray() for r in ret2]))
+
+    grad1 = sum(ret1 ** 2).grad()
+    loss = 0
+    for r in ret2:
+        loss += sum(r ** 2)
+    grad2 = loss.grad()
+    assert np.allclose(grad1.get(node), grad2.get(node))
+    for k in layer1.params.keys():
+        assert np.allclose(grad1.get(layer1.params[k]),
+                           grad2.get(layer1.params[k]).reshape(layer1.params[k].shape))
+
+    # State is carried over to the next call until truncate is called.
+    ret1 = layer1(node)
+    ret2 = [layer2(node[t]) for t in range(node.shape[0])]
+    assert np.allclose(ret1, np.stack([r.as_ndarray() for r in ret2]))
+    layer1.truncate()
+    layer2.truncate()
+    assert np.allclose(layer1(node)[0], layer2(node[0]))
+
+
+@pytest.mark.parametrize("layer_class", [
+    rm.FusedLstm,
+    rm.FusedGru,
+    rm.FusedPeepholeLstm,
+])
+def test_fused_rnn_truncate_steps(layer_class):
+    node = Variable(rand((6, 2, 3)))
+    assert_cuda_active(False)
+
+    # Truncating every 2 steps is same as feeding chunks of 2 steps.
+    layer1 = layer_class(output_size=4, truncate_steps=2)
+    layer2 = layer_class(output_size=4)
+    ret1 = layer1(node)
+    layer2.params = layer1.params
+    ret2 = [layer2(node[t:t + 2]) for t in range(0, node.shape[0], 2)]
+    assert np.allclose(ret1, np.concatenate([r.as_ndarray() for r in ret2]))
+
+    grad1 = sum(ret1 ** 2).grad()
+    loss = 0
+    for r in ret2:
+        loss += sum(r ** 2)
+    grad2 = loss.grad()
+    assert np.allclose(grad1.get(node), grad2.get(node))
+    for k in layer1.params.keys():
+        assert np.allclose(grad1.get(layer1.params[k]), grad2.get(layer1.params[k]))
+
+
+@pytest.mark.parametrize("layer_class", [
+    rm.FusedLstm,
+    rm.FusedGru,
+    rm.FusedPeepholeLstm,
+])
+def test_fused_rnn_packed(layer_class):
+    lengths = [2, 4, 1]
+    seqs = [Variable(rand((l, 3))) for l in lengths]
+    assert_cuda_active(False)
+
+    # Packed batch is same as running each sequence separately.
+    layer = layer_class(output_size=4)
+    packed = rm.pack_sequence(seqs)
+    ret1 = layer(packed)
+    padded = rm.pad_packed(ret1)
+    assert padded.shape == (4, 3, 4)
+    ret2 = []
+    for i, s in enumerate(seqs):
+        layer.truncate()
+        ret2.append(layer(s.as_ndarray()[:, None])[:, 0])
+        assert np.allclose(padded[:lengths[i], i], ret2[-1])
+        assert np.allclose(padded[lengths[i]:, i], 0)
+    assert np.allclose(ret1.last_step(), np.stack([r[-1] for r in ret2]))
+
+    # The padded path used on gpu also starts from zero state and keeps the carried state.
+    carried = layer._z
+    ret3 = _forward_padded(layer, packed)
+    assert np.allclose(rm.pad_packed(ret3), padded)
+    assert layer._z is carried
+
+    def func(node):
+        layer.truncate()
+        return sum(layer(rm.pack_padded(node, lengths)).last_step() ** 2)
+    node = Variable(rm.pad_packed(packed))
+    compare(func, node, node)
+    for k in layer.params.keys():
+        compare(func, layer.params[k], node)
+
+
 @pytest.mark.parametrize("node", [
     Variable(rand((2, 2))),
     Variable(rand((2, 1))),
@@ -1132,6 +1498,50 @@ def test_softmax_cross_entropy_no_reduce(node, x, use_gpu):
     compare(func, node, node, x)
 
 
+@pytest.mark.parametrize("node, x", [
+    [Variable(rand((4, 3))), onehot((4, 3))],
+    [Variable(rand((4, 2, 3, 3))), onehot((4, 2, 3, 3))],
+])
+def test_softmax_cross_entropy_mask(node, x, use_gpu):
+    node = Variable(node)
+    mask = np.array([1, 0, 1, 0], dtype=precision)
+    assert_cuda_active(use_gpu)
+
+    def func(node, x):
+        return rm.softmax_cross_entropy(node, x, mask=mask)
+    compare(func, node, node, x)
+    assert np.allclose(func(node, x), rm.softmax_cross_entropy(node[::2], x[::2]))
+
+
+@pytest.mark.parametrize("node, x", [
+    [Variable(rand((2, 3))), np.array([0, 2])],
+    [Variable(rand((4, 5)) * 100), np.array([4, 0, 1, 4])],
+    [Variable(rand((2, 3, 2, 2))), np.random.randint(3, size=(2, 2, 2))],
+])
+@pytest.mark.parametrize("reduce_sum", [True, False])
+@pytest.mark.parametrize("use_mask", [False, True])
+def test_sparse_softmax_cross_entropy(node, x, reduce_sum, use_mask, use_gpu):
+    node = Variable(node)
+    mask = np.arange(len(x)) % 2 == 0 if use_mask else None
+    assert_cuda_active(use_gpu)
+
+    def func(node, x):
+        return sum(rm.sparse_softmax_cross_entropy(node, x, reduce_sum=reduce_sum, mask=mask))
+    compare(func, node, node, x)
+
+    # Large inputs make softmax underflow, so log-sum-exp is evaluated in float64.
+    value = node.as_ndarray().astype(np.float64)
+    peak = value.max(axis=1, keepdims=True)
+    lse = np.log(np.sum(np.exp(value - peak), axis=1)) + peak[:, 0]
+    expected = lse - np.take_along_axis(value, x[:, None], axis=1)[:, 0]
+    weight = np.ones(len(x)) if mask is None else mask.astype(np.float64)
+    expected = expected * weight.reshape((-1, ) + (1, ) * (x.ndim - 1)) / max(weight.sum(), 1)
+    if reduce_sum:
+        expected = expected.sum()
+    assert np.allclose(rm.sparse_softmax_cross_entropy(node, x, reduce_sum=reduce_sum, mask=mask),
+                       expected, rtol=1e-4)
+
+
 @pytest.mark.parametrize("node, x", [
     [Variable(rand((1, 1))), Variable(randInteger((1, 1)))],
     [Variable(rand((2, 1))), Variable(randInteger((2, 1)))],
@@ -1179,6 +1589,21 @@ def test_mean_squared_error(node, x, use_gpu):
     assert False
 
 
+@pytest.mark.parametrize("node, x", [
+    [Variable(rand((4, 1))), rand((4, 1))],
+    [Variable(rand((4, 1, 1, 2))), rand((4, 1, 1, 2))],
+])
+def test_mean_squared_error_mask(node, x, use_gpu):
+    node = Variable(node)
+    mask = np.array([1, 0, 1, 0], dtype=precision)
+    assert_cuda_active(use_gpu)
+
+    def func(node, x):
+        return rm.mean_squared_error(node, x, mask=mask)
+    compare(func, node, node, x)
+    assert np.allclose(func(node, x), rm.mean_squared_error(node[::2], x[::2]))
+
+
 @pytest.mark.parametrize("node, x", [
     [Variable(rand((1, 1))), rand((1, 1))],
     [Variable(rand((2, 1))), rand((2, 1))],
@@ -1309,6 +1734,26 @@ def test_sum(node, axis, use_gpu):
     compare(func, node, node, False)
 
 
+def test_broadcast_lazy_grad(use_gpu):
+    node = Variable(rand((3, 4)))
+    bias = Variable(rand((4, )))
+    scale = Variable(rand((3, 1)))
+    assert_cuda_active(use_gpu)
+
+    # Broadcast gradients of reductions are summed up with dense gradients.
+    def func(node, bias, scale):
+        return sum(node * scale + bias) + sum(rm.mean(node, axis=0) * bias) + sum(node * node)
+    compare(func, node, node, bias, scale)
+    compare(func, bias, node, bias, scale)
+    compare(func, scale, node, bias, scale)
+
+    if not use_gpu:
+        # Gradient of a reduction is not expanded to the input size.
+        grad = sum(node).grad()
+        assert 0 in grad.get(node).strides
+        assert np.allclose(grad.get(node), 1)
+
+
 @pytest.mark.parametrize("node", [
     Variable(rand((2, 2))),
     Variable(rand((2, 2, 1, 1))),
@@ -1548,6 +1993,8 @@ def test_min(node, axis, use_gpu, keep_dimensions):
     [Variable(rand((2, 2, 2))), (slice(0, 2), 0, [1, 1]), False],
     [Variable(rand((2, 2, 2))), ([np.array([0, 0]), [1, 1]]), False],
     [Variable(rand((2, 2, 4))), ([[0, 0], [1, 1]], slice(0, 1, 2)), False],
+    [Variable(rand((3, 2))), np.array([[0, 2], [2, -1]]), False],
+    [Variable(rand((3, 2, 2))), (np.array([0, 0, 2]), 1), False],
 ])
 def test_getitem(node, index, error, use_gpu):
     node = Variable(node)
@@ -1567,6 +2014,19 @@ def test_getitem(node, index, error, use_gpu):
         compare(func, node, node)
 
 
+def test_getitem_accumulate(use_gpu):
+    node = Variable(rand((2, 4, 3)))
+    assert_cuda_active(use_gpu)
+
+    # Gradients of slices, advanced indexing and dense ops are summed up.
+    def func(node):
+        loss = sum(node * node)
+        for t in range(node.shape[1]):
+            loss += sum(node[:, t] * (t + 1))
+        return loss + sum(node[np.array([1, 1, 0])] ** 2)
+    compare(func, node, node)
+
+
 @pytest.mark.parametrize("node, x, delta", [
     [Variable(rand((1, 1))), rand((1, 1)), 1],
     [Variable(rand((1, 1))), rand((1, 1)), 3],
@@ -1625,3 +2085,14 @@ def test_mean(node, axis, use_gpu):
         return sum(rm.mean(node, axis=axis, keepdims=keepdims))
     compare(func, node, node, True)
     compare(func, node, node, False)
+
+
+@pytest.mark.parametrize("axis", [(1, 2), (0, -1), (3, 0, 1)])
+@pytest.mark.parametrize("reduction", [sum, rm.mean])
+def test_reduction_tuple_axis(reduction, axis):
+    node = Variable(rand((2, 3, 4, 5)))
+    assert_cuda_active(False)
+
+    def func(node):
+        return sum(reduction(node, axis=axis) ** 2)
+    compare(func, node, node)
@@ -36,3 +36,29 @@ def test_gpu_distributor(data_shape):
             result = result.as_ndarray()
             assert np.allclose(result, test_result), "\n{}".format(np.isclose(result, test_result))
             i += 1
+
+
+def test_time_series_bucket_batch():
+    from renom.utility.distributor.distributor import TimeSeriesDistributor
+    set_cuda_active(False)
+    lengths = np.random.randint(1, 20, size=(50, ))
+    X = [np.random.rand(l, 3).astype(precision) for l in lengths]
+    Y = [np.random.rand(l, 2).astype(precision) for l in lengths]
+    data_distributor = TimeSeriesDistributor(x=X, y=Y)
+    assert np.all(data_distributor.lengths == lengths)
+
+    batch_size = 8
+    count = 0
+    longest = []
+    for batch_x, batch_y in data_distributor.bucket_batch(batch_size):
+        assert len(batch_x) <= batch_size
+        assert np.all(batch_x.lengths == batch_y.lengths)
+        assert batch_x.data.shape == (np.sum(batch_x.lengths), 3)
+        longest.append(np.max(batch_x.lengths))
+        count += len(batch_x)
+    assert count == len(X)
+
+    # Without shuffling, batches are yielded from the shortest sequences.
+    batches = list(data_distributor.bucket_batch(batch_size, shuffle=False))
+    assert np.all(np.diff([np.max(x.lengths) for x, _ in batches]) >= 0)
+    assert sorted(longest) == [np.max(x.lengths) for x, _ in batches]
@@ -154,6 +154,237 @@ def test_save(tmpdir_factory):
     assert nn2.AAA == 9999
 
 
+@pytest.mark.parametrize("mmap", [False, True])
+def test_save_flat(tmpdir_factory, mmap):
+    set_cuda_active(False)
+
+    class NN2(rm.Model):
+        SERIALIZED = ('AAA', 'BBB')
+
+        def __init__(self):
+            super(NN2, self).__init__()
+            self.layer1 = rm.Dense(output_size=3)
+            self.bn = rm.BatchNormalize()
+            self.layer2 = rm.Dense(output_size=2)
+            self.AAA = 0
+            self.BBB = None
+
+        def forward(self, x):
+            return self.layer2(self.bn(rm.relu(self.layer1(x))))
+
+    x = np.random.rand(4, 5)
+    nn = NN2()
+    with nn.train():
+        nn(x)
+    nn.layer1.params.b._auto_update = False
+    nn.layer2.params.w.weight_decay = 0.5
+    nn.AAA = 9999
+    nn.BBB = np.float32(1.5)
+    nn.set_models(inference=True)
+    expected = nn(x).as_ndarray()
+
+    fname = os.path.join(str(tmpdir_factory.mktemp('flat')), 'aaa')
+    nn.save(fname, format="flat")
+    with open(fname, "rb") as f:
+        saved = f.read()
+
+    nn2 = NN2()
+    nn2.load(fname, mmap=mmap)
+    for l1, l2 in zip(nn.iter_models(), nn2.iter_models()):
+        for k, v in l1.params.items():
+            assert type(l2.params[k]) is type(v)
+            assert np.allclose(v, l2.params[k])
+    assert nn2.layer1.params.w._auto_update
+    assert not nn2.layer1.params.b._auto_update
+    assert nn2.layer2.params.w.weight_decay == 0.5
+    assert nn2.AAA == 9999
+    assert nn2.BBB == np.float32(1.5) and nn2.BBB.dtype == np.float32
+    assert np.allclose(nn.bn._mov_mean, nn2.bn._mov_mean)
+    assert nn2.bn._mode == nn.bn._mode
+
+    nn2.set_models(inference=True)
+    assert np.allclose(expected, nn2(x).as_ndarray())
+
+    # Loaded parameters can be trained, and the file is not modified.
+    nn2.set_models(inference=False)
+    with nn2.train():
+        loss = rm.sum(nn2(x))
+    loss.grad().update(rm.Sgd(0.1))
+    assert not np.allclose(nn.layer2.params.b, nn2.layer2.params.b)
+    with open(fname, "rb") as f:
+        assert f.read() == saved
+
+
+def test_async_checkpoint_writer(tmpdir):
+    from renom.utility.checkpoint import AsyncCheckpointWriter
+    set_cuda_active(False)
+    model = rm.Dense(3)
+    model(np.random.rand(2, 4))
+    writer = AsyncCheckpointWriter(str(tmpdir), keep=2)
+    expected = []
+    for i in range(4):
+        expected.append(model.params.w.as_ndarray().copy())
+        writer.save(model, "ckpt%d" % i)
+        # Updates after save do not change the snapshot.
+        model.params.w = rm.Variable(model.params.w.as_ndarray() + 1)
+    writer.close()
+    assert sorted(os.listdir(str(tmpdir))) == ["ckpt2", "ckpt3"]
+    for i in (2, 3):
+        loaded = rm.Dense(3)
+        loaded.load(os.path.join(str(tmpdir), "ckpt%d" % i))
+        assert np.allclose(loaded.params.w, expected[i])
+
+
+def test_shared_weights():
+    import subprocess
+    import sys
+    from renom.utility.checkpoint import share_weights, attach_weights
+    set_cuda_active(False)
+
+    x = np.random.rand(4, 2)
+    nn = rm.Sequential([rm.Dense(3), rm.BatchNormalize()])
+    nn(x)
+    shared = share_weights(nn)
+    try:
+        nn2 = rm.Sequential([rm.Dense(3), rm.BatchNormalize()])
+        attach_weights(nn2, shared.name)
+        nn.set_models(inference=True)
+        nn2.set_models(inference=True)
+        assert np.allclose(nn(x), nn2(x))
+        assert np.allclose(nn2[0].params.w.as_ndarray(), nn[0].params.w)
+        with pytest.raises(ValueError):
+            nn2[0].params.w[...] = 0
+
+        # Attaching in other processes does not remove the file when they exit.
+        code = "\n".join([
+            "import renom as rm",
+            "from renom.utility.checkpoint import attach_weights",
+            "model = rm.Sequential([rm.Dense(3), rm.BatchNormalize()])",
+            "attach_weights(model, '{}')".format(shared.name),
+            "print(float(model[0].params.w.sum()))",
+        ])
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(rm.__file__)))
+        for _ in range(2):
+            out = subprocess.check_output([sys.executable, "-c", code], env=env)
+            assert np.allclose(float(out.decode().split()[-1]), nn[0].params.w.sum())
+    finally:
+        shared.unlink()
+    assert not os.path.exists(shared.name)
+
+
+def test_summary(capsys):
+    set_cuda_active(False)
+    model = rm.Sequential([rm.Conv2d(8, filter=3), rm.BatchNormalize(mode="feature"), rm.Relu(),
+                           rm.Flatten(), rm.Dense(10)])
+    model(np.random.rand(2, 3, 6, 6))
+    mov_mean = model[1]._mov_mean
+    summary = model.summary((3, 6, 6), batch_size=4)
+    assert "Total" in capsys.readouterr().out
+    assert model[1]._mov_mean is mov_mean
+
+    assert [(layer["name"], layer["type"]) for layer in summary.layers] == [
+        ("root", "Sequential"), ("l0", "Conv2d"), ("l1", "BatchNormalize"), ("l2", "Relu"),
+        ("l3", "Flatten"), ("l4", "Dense")]
+    assert summary.layers[1]["output_shape"] == (4, 8, 4, 4)
+    assert summary.layers[4]["params"] == 0
+    assert summary.total["params"] == sum(p.size for _, p in model.named_parameters())
+    assert summary.total["param_bytes"] == sum(p.nbytes for _, p in model.named_parameters())
+
+    conv = summary.layers[1]
+    assert conv["forward_flops"] == 2 * 4 * 8 * 4 * 4 * 3 * 3 * 3
+    # The col array and the output are kept for backward.
+    itemsize = np.dtype(rm.precision).itemsize
+    assert conv["activation_bytes"] == (4 * 3 * 3 * 3 * 4 * 4 + 4 * 8 * 4 * 4) * itemsize
+    assert summary.total["forward_flops"] == sum(layer["forward_flops"] for layer in summary.layers)
+
+    # A batch of 1 is extrapolated, since BatchNormalize needs more than one sample.
+    single = model.summary((3, 6, 6), verbose=False)
+    assert single.layers[1]["output_shape"] == (1, 8, 4, 4)
+    assert single.layers[-1]["output_shape"] == (1, 10)
+    assert single.layers[1]["forward_flops"] * 4 == conv["forward_flops"]
+    assert single.layers[1]["activation_bytes"] * 4 == conv["activation_bytes"]
+    assert single.total["params"] == summary.total["params"]
+
+
+def test_ensemble():
+    set_cuda_active(False)
+
+    def build():
+        return rm.Sequential([rm.Conv2d(4, filter=3, padding=1), rm.Relu(), rm.Conv2d(3, filter=3),
+                              rm.BatchNormalize(mode="feature"), rm.MaxPool2d(filter=2, stride=2),
+                              rm.Flatten(), rm.Dense(5), rm.Tanh(), rm.Dense(2)])
+
+    x = np.random.rand(4, 2, 6, 6)
+    y = np.random.rand(3, 4, 2)
+    models = [build() for _ in range(3)]
+    for m in models:
+        m(x)
+    ensemble = rm.Ensemble(models)
+    assert len(ensemble) == 3
+    # BatchNormalize is called for each member.
+    assert [type(ly).__name__ for ly in ensemble._layers].count("_PerMember") == 1
+
+    z = ensemble(x)
+    assert z.shape == (3, 4, 2)
+    for i, m in enumerate(models):
+        assert np.allclose(z[i], m(x), atol=1e-5)
+
+    expected = []
+    for i, m in enumerate(models):
+        with m.train():
+            loss = rm.sum((m(x) - y[i]) ** 2)
+        member_grad = loss.grad()
+        expected.append([p.as_ndarray() - 0.1 * member_grad.get(p) for _, p in m.named_parameters()])
+
+    with ensemble.train():
+        loss = rm.sum((ensemble(x) - y) ** 2)
+    loss.grad().update(rm.Sgd(0.1, momentum=0))
+    ensemble.unstack()
+    for m, values in zip(models, expected):
+        for (name, p), value in zip(m.named_parameters(), values):
+            assert np.allclose(p.as_ndarray(), value, atol=1e-5), name
+
+
+def test_parameter_ema():
+    from renom.utility.ema import ParameterEMA
+    set_cuda_active(False)
+    x, y = np.random.rand(4, 3), np.random.rand(4, 2)
+    model = rm.Sequential([rm.Dense(5), rm.Relu(), rm.Dense(2)])
+    target = rm.Sequential([rm.Dense(5), rm.Relu(), rm.Dense(2)])
+    # Parameters are created at the first call.
+    ema = ParameterEMA(model, decay=0.9, every=2)
+    target_ema = ParameterEMA(model, decay=0.5, target=target)
+    model(x)
+
+    opt = rm.Sgd(0.1)
+    expected, expected_target = None, None
+    for i in range(6):
+        with model.train():
+            loss = rm.mean_squared_error(model(x), y)
+        loss.grad().update(opt)
+        current = dict((name, p.as_ndarray().copy()) for name, p in model.named_parameters())
+        if expected is None:
+            expected, expected_target = dict(current), dict(current)
+        if i % 2:
+            expected = dict((k, 0.9 * expected[k] + 0.1 * current[k]) for k in current)
+        expected_target = dict((k, 0.5 * expected_target[k] + 0.5 * current[k]) for k in current)
+        ema.update()
+        target_ema.update()
+
+    for name, value in ema.named_shadows():
+        assert np.allclose(value, expected[name])
+    # The target holds the average without copies.
+    for name, p in target.named_parameters():
+        assert np.allclose(p, expected_target[name])
+        assert np.shares_memory(p, target_ema.shadow)
+
+    with ema:
+        for name, p in model.named_parameters():
+            assert np.allclose(p, expected[name])
+    for name, p in model.named_parameters():
+        assert np.allclose(p, current[name])
+
+
 def test_weight_decay():
     set_cuda_active(False)
 
@@ -207,6 +438,295 @@ def test_update():
     assert np.allclose(cur.as_ndarray() - grad.get(nn.params.w), nn.params.w.as_ndarray())
 
 
+def test_set_layout():
+    set_cuda_active(False)
+
+    class NN2(rm.Model):
+        def __init__(self):
+            super(NN2, self).__init__()
+            self.conv = rm.GroupConv2d(4, groups=2, padding=1)
+            self.seq = rm.Sequential([
+                rm.Conv2d(4, padding=1),
+                rm.BatchNormalize(mode="feature"),
+                rm.MaxPool2d(filter=2, stride=2),
+                rm.AveragePool2d(filter=2, stride=1),
+                rm.Flatten(),
+                rm.Dense(3),
+            ])
+
+        def forward(self, x):
+            return self.seq(rm.relu(self.conv(x)))
+
+    nn = NN2()
+    x = np.random.rand(2, 2, 6, 6)
+    with nn.train():
+        nn(x)
+    with nn.prevent_update():
+        with nn.train():
+            expected = nn(x).as_ndarray()
+    nn.set_models(inference=True)
+    expected_inference = nn(x).as_ndarray()
+    nn.set_models(inference=False)
+
+    nn.set_layout("NHWC")
+    nn.set_models(inference=True)
+    assert np.allclose(nn(x.transpose(0, 2, 3, 1)).as_ndarray(), expected_inference)
+    nn.set_models(inference=False)
+    with nn.prevent_update():
+        with nn.train():
+            ret = nn(x.transpose(0, 2, 3, 1))
+    assert np.allclose(ret.as_ndarray(), expected)
+
+    nn.set_layout("NCHW")
+    with nn.prevent_update():
+        with nn.train():
+            ret = nn(x)
+    assert np.allclose(ret.as_ndarray(), expected)
+
+
+@pytest.mark.parametrize("layout", ["NCHW", "NHWC"])
+def test_optimize_for_inference(layout):
+    set_cuda_active(False)
+
+    class NN3(rm.Model):
+        def __init__(self):
+            super(NN3, self).__init__()
+            self.dropout = rm.Dropout()
+            self.seq = rm.Sequential([
+                rm.Conv2d(4, padding=1, ignore_bias=True),
+                rm.BatchNormalize(mode="feature"),
+                rm.Relu(),
+                rm.SpatialDropout(),
+                rm.GroupConv2d(4, groups=2),
+                rm.BatchNormalize(mode="feature", ignore_bias=True),
+                rm.Flatten(),
+                rm.Dense(5),
+                rm.BatchNormalize(),
+                rm.Dropout(),
+                rm.Dense(3),
+            ])
+
+        def forward(self, x):
+            return self.dropout(self.seq(x))
+
+    nn = NN3()
+    x = np.random.rand(4, 2, 6, 6)
+    if layout == "NHWC":
+        nn.set_layout(layout)
+        x = x.transpose(0, 2, 3, 1)
+    for _ in range(5):
+        nn(x)
+    nn.set_models(inference=True)
+    expected = nn(x).as_ndarray()
+
+    assert rm.optimize_for_inference(nn) is nn
+    layers = [type(l) for l in nn.seq._layers]
+    assert layers == [rm.Conv2d, rm.Relu, rm.GroupConv2d, rm.Flatten, rm.Dense, rm.Dense]
+    assert "b" in nn.seq[0].params
+    assert np.allclose(nn(x).as_ndarray(), expected, rtol=1e-4)
+
+
+def test_freeze():
+    set_cuda_active(False)
+    model = rm.Sequential([
+        rm.Conv2d(6, padding=1),
+        rm.BatchNormalize(mode="feature"),
+        rm.Relu(),
+        rm.MaxPool2d(filter=2, stride=2),
+        rm.Conv2d(4, filter=3, stride=2, padding=2),
+        rm.LeakyRelu(0.1),
+        rm.AveragePool2d(filter=3, padding=1, stride=1),
+        rm.Dropout(),
+        rm.Flatten(),
+        rm.Sequential([rm.Dense(8), rm.BatchNormalize(), rm.Sigmoid()]),
+        rm.Dense(6),
+        rm.Tanh(),
+        rm.Dense(3),
+        rm.Softmax(),
+    ])
+    x = np.random.rand(4, 2, 10, 10)
+    for _ in range(3):
+        model(x)
+    model.set_models(inference=True)
+
+    frozen = rm.freeze(model, x.shape)
+    for data in (x, x[:1], x):
+        assert np.allclose(frozen(data), model(data).as_ndarray(), atol=1e-5)
+
+    # Buffers are reused across calls.
+    z = frozen(x)
+    assert frozen(x * 2) is z
+    assert np.allclose(z, model(x * 2).as_ndarray(), atol=1e-5)
+
+    with pytest.raises(ValueError):
+        rm.freeze(rm.Sequential([rm.Elu()]), (1, 2))
+
+
+@pytest.mark.parametrize("layout", ["NCHW", "NHWC"])
+def test_quantize(layout):
+    set_cuda_active(False)
+    model = rm.Sequential([
+        rm.Conv2d(4, padding=1),
+        rm.Relu(),
+        rm.Conv2d(4, stride=2, ignore_bias=True),
+        rm.Flatten(),
+        rm.Dense(3),
+    ])
+    x = np.random.rand(20, 2, 6, 6)
+    if layout == "NHWC":
+        model.set_layout(layout)
+        x = x.transpose(0, 2, 3, 1)
+    model(x)
+    dist = rm.NdarrayDistributor(x, np.zeros((len(x), 1)))
+
+    qmodel = rm.quantize(model, dist, batch_size=8)
+    assert [type(l) for l in qmodel._layers] == [rm.QuantizedConv2d, rm.Relu, rm.QuantizedConv2d,
+                                                 rm.Flatten, rm.QuantizedDense]
+    assert [type(l) for l in model._layers][0] is rm.Conv2d
+    assert qmodel[0]._wq.dtype == np.int8
+    assert qmodel[0]._wq.size == model[0].params.w.size
+
+    report = rm.quantization_report(model, qmodel, dist)
+    assert report["relative_error"] < 0.05
+    assert np.allclose(qmodel(x).as_ndarray(), model(x).as_ndarray(), atol=0.1)
+
+
+@pytest.mark.parametrize("scope", ["global", "layer"])
+def test_prune(scope):
+    set_cuda_active(False)
+    model = rm.Sequential([rm.Dense(20), rm.Relu(), rm.Dense(5)])
+    x = np.random.rand(10, 8)
+    y = np.random.rand(10, 5)
+    model(x)
+
+    rm.prune(model, 0.5, scope=scope)
+    total = sum(l.params.w.size for l in (model[0], model[2]))
+    zeros = sum(np.sum(l.params.w.as_ndarray() == 0) for l in (model[0], model[2]))
+    assert zeros == total // 2 if scope == "global" else zeros == 160 // 2 + 100 // 2
+    masks = [l.params.w.as_ndarray() != 0 for l in (model[0], model[2])]
+
+    opt = rm.Sgd(lr=0.1, momentum=0.5)
+    for _ in range(3):
+        with model.train():
+            loss = rm.mse(model(x), y)
+        loss.grad().update(opt)
+    for l, mask in zip((model[0], model[2]), masks):
+        assert np.all(l.params.w.as_ndarray()[~mask] == 0)
+
+    # Masks also apply after an update by a callable.
+    w = model[0].params.w
+
+    def update(dy):
+        w[...] -= dy
+    w._auto_update = update
+    with model.train():
+        loss = rm.mse(model(x), y)
+        loss.grad().update()
+    w._auto_update = True
+    assert np.all(w.as_ndarray()[~masks[0]] == 0)
+
+    sparse = rm.sparsify(model, min_sparsity=0.4)
+    assert [type(l) for l in sparse._layers] == [rm.SparseDense, rm.Relu, rm.SparseDense]
+    assert type(model[0]) is rm.Dense
+    assert np.allclose(sparse(x).as_ndarray(), model(x).as_ndarray())
+
+    rm.remove_pruning(model)
+    with model.train():
+        loss = rm.mse(model(x), y)
+    loss.grad().update(opt)
+    assert np.any(model[0].params.w.as_ndarray()[~masks[0]] != 0)
+
+
+def test_named_parameters():
+    set_cuda_active(False)
+
+    class NN2(rm.Model):
+        def __init__(self):
+            super(NN2, self).__init__()
+            self.layer1 = rm.Dense(output_size=3)
+            self.seq = rm.Sequential([rm.Dense(3), rm.Dense(2)])
+
+        def forward(self, x):
+            return self.seq(rm.relu(self.layer1(x)))
+
+    nn = NN2()
+    assert list(nn.named_parameters()) == []
+    x = np.random.rand(4, 2)
+    nn(x)
+    names = ['layer1.w', 'layer1.b', 'seq.l0.w', 'seq.l0.b', 'seq.l1.w', 'seq.l1.b']
+    assert sorted(name for name, p in nn.named_parameters()) == sorted(names)
+    assert dict(nn.named_parameters())['seq.l1.w'] is nn.seq.l1.params.w
+
+    # Replaced parameters and models are found.
+    nn.seq.l1.params.w = rm.Variable(np.ones((3, 2)))
+    assert dict(nn.named_parameters())['seq.l1.w'] is nn.seq.l1.params.w
+    nn.seq.append(rm.Dense(1))
+    nn(x)
+    assert {'seq.l2.w', 'seq.l2.b'} < set(dict(nn.named_parameters()))
+    del nn.layer1
+    nn.layer1 = rm.Dense(output_size=3)
+    assert 'layer1.w' not in dict(nn.named_parameters())
+
+    nn2 = NN2()
+    nn2.seq.append(rm.Dense(1))
+    nn2(x)
+    nn(x)
+    nn2.copy_params(nn)
+    for name, p in nn2.named_parameters():
+        assert np.allclose(p, dict(nn.named_parameters())[name])
+
+    # Gradients are merged by parameter name.
+    with nn.train(), nn2.train():
+        g1 = rm.sum(nn(x)).grad()
+        g2 = rm.sum(nn2(x * 2)).grad()
+    expected = g1.get(nn.seq.l0.params.w) + g2.get(nn2.seq.l0.params.w)
+    nn.join_grads(g1, [(nn2, g2)])
+    assert np.allclose(g1.get(nn.seq.l0.params.w), expected)
+
+
+def test_copy_params_version():
+    set_cuda_active(False)
+    x = np.random.rand(4, 3)
+    src = rm.Sequential([rm.Dense(3), rm.Dense(2)])
+    dst = rm.Sequential([rm.Dense(3), rm.Dense(2)])
+    src(x)
+    dst.copy_params(src)
+    for (name, p), (_, q) in zip(src.named_parameters(), dst.named_parameters()):
+        assert np.allclose(p, q)
+
+    # Writes which do not change the version are not copied.
+    w0 = src[0].params.w.as_ndarray()
+    src[0].params.w.setflags(write=True)
+    src[0].params.w[...] = 0
+    dst.copy_params(src)
+    assert np.allclose(dst[0].params.w, w0)
+
+    # Only the updated layer is copied.
+    w1 = src[1].params.w
+    with src.train():
+        loss = rm.sum(src(x))
+    with src[0].prevent_update():
+        loss.grad().update(rm.Sgd(0.1))
+    assert src[1].params.w is w1
+    dst.copy_params(src)
+    assert np.allclose(dst[0].params.w, w0)
+    assert np.allclose(dst[1].params.w, src[1].params.w)
+
+    # Replaced parameters are copied.
+    src[0].params.w = rm.Variable(np.ones((3, 3)))
+    dst.copy_params(src)
+    assert np.allclose(dst[0].params.w, 1)
+
+    # Parameters updated in the destination are copied again.
+    with dst.train():
+        loss = rm.sum(dst(x))
+    loss.grad().update(rm.Sgd(0.1))
+    assert not np.allclose(dst[1].params.w, src[1].params.w)
+    dst.copy_params(src)
+    for (name, p), (_, q) in zip(src.named_parameters(), dst.named_parameters()):
+        assert np.allclose(p, q)
+
+
 @test_utility.skipgpu
 def test_multi_gpu():
     from renom.cuda import cuGetDeviceCount
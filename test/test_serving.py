@@ -0,0 +1,62 @@
+import threading
+
+import numpy as np
+import pytest
+import renom as rm
+from renom.cuda import set_cuda_active
+from renom.serving import BatchingPredictor
+
+
+def test_batching_predictor():
+    set_cuda_active(False)
+    model = rm.Sequential([rm.Dense(4), rm.Relu(), rm.Dense(3)])
+    x = np.random.rand(40, 5)
+    model(x)
+    model.set_models(inference=True)
+    expected = model(x).as_ndarray()
+
+    results = [None] * len(x)
+    with BatchingPredictor(model, max_batch=8, max_wait_ms=20) as predictor:
+        def client(indices):
+            for i in indices:
+                results[i] = predictor.predict(x[i])
+        threads = [threading.Thread(target=client, args=(range(j, len(x), 10), )) for j in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        metrics = predictor.metrics()
+
+    assert np.allclose(np.array(results), expected)
+    assert metrics["requests"] == len(x)
+    assert sum(k * v for k, v in metrics["batch_sizes"].items()) == len(x)
+    assert max(metrics["batch_sizes"]) <= 8
+    assert metrics["batches"] < len(x)
+    assert metrics["latency_p50_ms"] <= metrics["latency_p99_ms"]
+    assert metrics["queue_depth"] == 0
+
+
+def test_batching_predictor_error():
+    set_cuda_active(False)
+    model = rm.Sequential([rm.Dense(3)])
+    model(np.random.rand(1, 5))
+    with BatchingPredictor(model, max_batch=4, max_wait_ms=1) as predictor:
+        good = predictor.submit(np.random.rand(5))
+        bad = predictor.submit(np.random.rand(6))
+        assert good.result().shape == (3, )
+        with pytest.raises(Exception):
+            bad.result()
+
+
+def test_batching_predictor_close():
+    set_cuda_active(False)
+    model = rm.Sequential([rm.Dense(3)])
+    model(np.random.rand(1, 5))
+    predictor = BatchingPredictor(model, max_batch=4, max_wait_ms=50)
+    futures = [predictor.submit(np.random.rand(5)) for _ in range(6)]
+    predictor.close()
+    # Requests queued before close are served.
+    assert all(f.done() for f in futures)
+    with pytest.raises(AssertionError):
+        predictor.submit(np.random.rand(5))
+    predictor.close()
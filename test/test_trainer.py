@@ -52,3 +52,20 @@ def test_trainer():
 
     trainer.train(distributor)
     assert l == set(['start', 'start_epoch', 'forward', 'backward', 'updated', 'end_epoch'])
+
+
+def test_trainer_checkpoint(tmpdir):
+    x = np.random.rand(20, 4)
+    y = np.random.rand(20, 2)
+    model = rm.Dense(2)
+    trainer = Trainer(model, num_epoch=5, loss_func=rm.mean_squared_error,
+                      batch_size=10, optimizer=rm.Sgd(0.1), events={},
+                      checkpoint_every=2, checkpoint_dir=str(tmpdir), checkpoint_keep=1)
+    trainer.train(NdarrayDistributor(x, y))
+    assert sorted(os.listdir(str(tmpdir))) == ['epoch3.ckpt']
+
+    loaded = rm.Dense(2)
+    loaded.load(os.path.join(str(tmpdir), 'epoch3.ckpt'))
+    # Parameters were updated in the last epoch after the checkpoint.
+    assert loaded.params.w.shape == model.params.w.shape
+    assert not np.allclose(loaded.params.w, model.params.w)